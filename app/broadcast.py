@@ -0,0 +1,359 @@
+# -*- coding: utf-8 -*-
+# app/broadcast.py
+"""
+Tarqatma mexanizmi: umumiy token bucket + cheklangan worker lar.
+
+Oldin adm_submit foydalanuvchilarga ketma-ket, har biridan keyin
+`asyncio.sleep(0.05)` bilan yuborardi (~20 xabar/s, so‘rov kechikishi bilan
+undan ham kam) va 429 (TelegramRetryAfter) ni umuman ko‘rmasdi. Endi:
+
+    from ..broadcast import Broadcaster
+
+    stats = await Broadcaster().run(iter_audience(adb), lambda uid: bot.send_message(uid, text))
+    # stats.ok / stats.blocked / stats.failed / stats.retried
+
+- Tezlik: jarayon bo‘yicha bitta `global_bucket` (BROADCAST_RATE, standart 25/s —
+  Telegram ning ~30/s umumiy limitidan pastroq). Bir vaqtda ikkita tarqatma
+  bo‘lsa ham limitni birga bo‘lishadi.
+- Parallellik: BROADCAST_WORKERS ta worker — so‘rov kechikishi tezlikni
+  pasaytirmaydi; navbat cheklangan. Auditoriya iter_audience() dan oqim
+  sifatida keladi (faqat user_id, keyset bo‘laklar) — ro‘yxat to‘liq yuklanmaydi.
+- 429: bucket retry_after ga to‘xtatiladi (barcha worker lar uchun), tezlik
+  ikki baravar kamayadi va muvaffaqiyatli yuborishlar bilan asta tiklanadi (AIMD);
+  o‘sha foydalanuvchiga qayta yuboriladi.
+- Tarmoq / 5xx / timeout: eksponensial kutish bilan BROADCAST_MAX_RETRIES marta.
+- 403 (bloklagan) va 400 (chat topilmadi va h.k.) qayta urinilmaydi; 403 va
+  "chat not found" — STATUS_BLOCKED (users.blocked_at ga yoziladi, keyingi
+  tarqatmalarda auditoriyaga kirmaydi).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Union
+
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from loguru import logger
+
+from .storage.cache import TTLCache
+from .storage.segments import Segment
+
+try:
+    from .config import settings
+except Exception:
+    settings = None  # type: ignore
+
+# Yetkazish holatlari
+STATUS_OK = "ok"
+STATUS_BLOCKED = "blocked"    # 403 yoki "chat not found": bot bloklangan / foydalanuvchi o‘chirilgan
+STATUS_FAILED = "failed"      # 400 yoki qayta urinishlar tugadi
+
+_TRANSIENT = (TelegramNetworkError, TelegramServerError, asyncio.TimeoutError, OSError)
+# 400 lar ichida "chat yo‘q" — qayta urinish ham, keyingi tarqatmalar ham befoyda
+_UNREACHABLE_400 = ("chat not found", "user is deactivated", "peer_id_invalid")
+
+
+# ---------------- Token bucket ----------------
+class TokenBucket:
+    """
+    `rate` token/soniya, `capacity` gacha yig‘iladi (standart rate/10 — deyarli
+    tekis oqim, Telegram keskin to‘lqinlarni yoqtirmaydi; 1 dan katta bo‘lishi
+    sleep() kechikishlarida yo‘qolgan tokenlarni saqlaydi). 429 da throttle(), muvaffaqiyatda
+    recover() — tezlik [min_rate, max_rate] oralig‘ida moslashadi.
+    """
+
+    def __init__(self, rate: float, *, capacity: Optional[float] = None, min_rate: float = 1.0, recover_step: float = 0.05):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min(float(min_rate), self.max_rate)
+        self.recover_step = recover_step
+        self.capacity = max(1.0, float(capacity) if capacity else self.max_rate / 10)
+        self._tokens = self.capacity
+        self._ts = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float) -> None:
+        if now > self._ts:
+            self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+            self._ts = now
+
+    async def acquire(self) -> None:
+        # Lock — navbat adolatli bo‘lsin (FIFO), tokenlarni bir vaqtda ikki worker olmasin
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._ts:           # pause() davri
+                    await asyncio.sleep(self._ts - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hamma uchun `seconds` davomida token berilmaydi (to‘plangani ham kuyadi)."""
+        self._tokens = 0.0
+        self._ts = max(self._ts, time.monotonic() + max(0.0, float(seconds)))
+
+    def throttle(self) -> None:
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def retry_after(self, seconds: float) -> None:
+        """429: to‘xtatish + tezlikni kamaytirish (bir to‘lqindagi bir nechta 429 — bir marta)."""
+        if self._ts <= time.monotonic():
+            self.throttle()
+        self.pause(seconds)
+
+    def recover(self) -> None:
+        if self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + self.recover_step)
+
+
+# ---------------- Natijalar ----------------
+@dataclass
+class Delivery:
+    user_id: int
+    status: str
+    error: Optional[str] = None
+    attempts: int = 1
+    code: Optional[int] = None      # Telegram xato kodi (403, 400, 429, 5xx; tarmoq — 0)
+
+
+@dataclass
+class BroadcastStats:
+    total: int = 0
+    ok: int = 0
+    blocked: int = 0
+    failed: int = 0
+    retried: int = 0
+    started: float = field(default_factory=time.monotonic)
+    finished: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self) -> float:
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def add(self, d: Delivery) -> None:
+        self.total += 1
+        self.retried += d.attempts - 1
+        if d.status == STATUS_OK:
+            self.ok += 1
+        elif d.status == STATUS_BLOCKED:
+            self.blocked += 1
+        else:
+            self.failed += 1
+
+
+def _error_text(e: BaseException) -> str:
+    msg = getattr(e, "message", None) or str(e)
+    return f"{type(e).__name__}: {msg}"[:200]
+
+
+def _error_code(e: BaseException) -> int:
+    if isinstance(e, TelegramForbiddenError):
+        return 403
+    if isinstance(e, TelegramBadRequest):
+        return 400
+    if isinstance(e, TelegramRetryAfter):
+        return 429
+    if isinstance(e, TelegramServerError):
+        return 500
+    return 0
+
+
+def _failed(uid: int, status: str, e: BaseException, attempt: int) -> Delivery:
+    return Delivery(uid, status, _error_text(e), attempt, _error_code(e))
+
+
+SendFn = Callable[[int], Awaitable[Any]]
+ResultHook = Callable[[Delivery], Any]
+Targets = Union[Iterable[int], AsyncIterable[int]]
+
+
+# ---------------- Auditoriya ----------------
+AUDIENCE_CHUNK = 1_000
+
+
+async def iter_audience(
+    db: Any,
+    *,
+    after: int = 0,
+    chunk_size: int = AUDIENCE_CHUNK,
+    segment: Optional[Segment] = None,
+    include_blocked: bool = False,
+) -> AsyncIterator[int]:
+    """
+    Foydalanuvchilar user_id lari, keyset kursor bilan bo‘laklab (db.audience_chunk);
+    standart — botni bloklaganlarsiz (users.blocked_at), `segment` — qo‘shimcha filtrlar.
+    Keyingi bo‘lak joriy bo‘lak yuborilayotganda oldindan o‘qiladi; xotirada
+    eng ko‘pi bilan ikki bo‘lak int — auditoriya hajmidan qat’i nazar.
+    """
+    def fetch(after_id: int) -> "asyncio.Future[List[int]]":
+        return asyncio.ensure_future(db.audience_chunk(
+            after_id, chunk_size, segment=segment, include_blocked=include_blocked,
+        ))
+
+    nxt = fetch(after)
+    try:
+        while True:
+            ids = await nxt
+            if not ids:
+                return
+            if len(ids) < chunk_size:
+                nxt = None
+            else:
+                nxt = fetch(ids[-1])
+            for uid in ids:
+                yield uid
+            if nxt is None:
+                return
+    finally:
+        if nxt is not None and not nxt.done():
+            nxt.cancel()
+
+
+# Segment -> qabul qiluvchilar soni: admin filtrlarni almashtirganda har bosishda COUNT(*) qilmaymiz
+_count_cache = TTLCache(maxsize=256, ttl=float(getattr(settings, "BROADCAST_COUNT_TTL", 60) or 60))
+
+
+async def audience_count(db: Any, segment: Optional[Segment] = None) -> int:
+    """Segment (yoki butun auditoriya) hajmi, BROADCAST_COUNT_TTL soniya keshlanadi."""
+    key = (segment or Segment()).key
+    hit, n = _count_cache.lookup(key)
+    if hit and n is not None:
+        return int(n)
+    n = int(await db.count_audience(segment=segment))
+    _count_cache.put(key, n)
+    return n
+
+
+# ---------------- Broadcaster ----------------
+class Broadcaster:
+    def __init__(
+        self,
+        *,
+        bucket: Optional[TokenBucket] = None,
+        workers: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        backoff: float = 1.0,
+    ):
+        self.bucket = bucket or global_bucket
+        self.workers = max(1, int(workers or getattr(settings, "BROADCAST_WORKERS", 16) or 16))
+        self.max_retries = int(
+            max_retries if max_retries is not None else getattr(settings, "BROADCAST_MAX_RETRIES", 3)
+        )
+        self.backoff = backoff
+        self._stopped = asyncio.Event()
+
+    def stop(self) -> None:
+        """Yangi yuborishlar boshlanmaydi; yo‘ldagilari tugaydi, run() qaytadi."""
+        self._stopped.set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    async def deliver(self, uid: int, send: SendFn) -> Delivery:
+        """Bitta foydalanuvchi: token -> send, 429/vaqtinchalik xatoda qayta urinish."""
+        attempt = 0
+        while True:
+            attempt += 1
+            await self.bucket.acquire()
+            try:
+                await send(uid)
+            except TelegramRetryAfter as e:
+                self.bucket.retry_after(e.retry_after)
+                logger.warning(f"📣 429 retry_after={e.retry_after}s, rate -> {self.bucket.rate:.1f}/s")
+                if attempt > self.max_retries:
+                    return _failed(uid, STATUS_FAILED, e, attempt)
+            except TelegramForbiddenError as e:
+                return _failed(uid, STATUS_BLOCKED, e, attempt)
+            except TelegramBadRequest as e:
+                unreachable = any(m in (e.message or "").lower() for m in _UNREACHABLE_400)
+                return _failed(uid, STATUS_BLOCKED if unreachable else STATUS_FAILED, e, attempt)
+            except _TRANSIENT as e:
+                if attempt > self.max_retries:
+                    return _failed(uid, STATUS_FAILED, e, attempt)
+                delay = self.backoff * 2 ** (attempt - 1)
+                await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            except Exception as e:
+                return _failed(uid, STATUS_FAILED, e, attempt)
+            else:
+                self.bucket.recover()
+                return Delivery(uid, STATUS_OK, None, attempt)
+
+    async def run(
+        self,
+        targets: Targets,
+        send: SendFn,
+        *,
+        on_result: Optional[ResultHook] = None,
+    ) -> BroadcastStats:
+        stats = BroadcastStats()
+        queue: "asyncio.Queue[Optional[int]]" = asyncio.Queue(maxsize=self.workers * 4)
+
+        async def produce() -> None:
+            try:
+                if hasattr(targets, "__aiter__"):
+                    async for uid in targets:  # type: ignore[union-attr]
+                        if self.stopped:
+                            break
+                        await queue.put(int(uid))
+                else:
+                    for uid in targets:  # type: ignore[union-attr]
+                        if self.stopped:
+                            break
+                        await queue.put(int(uid))
+            finally:
+                for _ in range(self.workers):
+                    await queue.put(None)
+
+        async def work() -> None:
+            while True:
+                uid = await queue.get()
+                if uid is None:
+                    return
+                if self.stopped:
+                    continue      # navbatni bo‘shatamiz, producer to‘xtab qolmasin
+                d = await self.deliver(uid, send)
+                stats.add(d)
+                if on_result is not None:
+                    try:
+                        res = on_result(d)
+                        if inspect.isawaitable(res):
+                            await res
+                    except Exception as e:
+                        logger.error(f"Broadcast on_result hook failed for {uid}: {e}")
+
+        producer = asyncio.create_task(produce())
+        try:
+            await asyncio.gather(*(work() for _ in range(self.workers)))
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+            stats.finished = time.monotonic()
+        logger.info(
+            f"📣 Broadcast: {stats.total} in {stats.elapsed:.1f}s ({stats.rate:.1f}/s) — "
+            f"ok={stats.ok} blocked={stats.blocked} failed={stats.failed} retried={stats.retried}"
+        )
+        return stats
+
+
+# Jarayon bo‘yicha umumiy limit (barcha tarqatmalar uchun)
+global_bucket = TokenBucket(float(getattr(settings, "BROADCAST_RATE", 25.0) or 25.0))
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+# app/broadcast_jobs.py
+"""
+Saqlanadigan, davom ettiriladigan tarqatma ishlari (storage/broadcasts.py ustida).
+
+Oldin tarqatma adm_submit ichidagi coroutine edi: jarayon qayta ishga tushsa
+kimga yetgani noma’lum, qayta yuborish esa takror xabar degani. Endi:
+
+    from ..broadcast_jobs import runner
+
+    jid = await runner.submit(bot, admin_id=..., chat_id=..., payload={"copy": {"chat_id": ..., "message_id": ...}})
+    # payload["segment"] = Segment(lang="ru").to_dict() — faqat segmentga
+    await runner.pause(jid) / await runner.resume(bot, jid) / await runner.cancel(jid)
+
+- Natijalar buferda yig‘iladi va har FLUSH_EVERY soniyada (yoki FLUSH_ROWS
+  to‘lganda) bitta checkpoint bilan yoziladi: jurnal qatorlari + last_user_id
+  (undan oldingi hamma ishlangan) + ijara uzaytirish.
+- Davom ettirish: audience `last_user_id` dan, checkpoint dan keyin jurnalda
+  bor foydalanuvchilar o‘tkazib yuboriladi — yetib borganlarga qayta yuborilmaydi.
+  (Kafolat chegarasi: jarayon keskin o‘lsa, oxirgi flush dan keyingi ~1 soniyadagi
+  yuborishlar jurnalga tushmay qolishi mumkin.)
+- Pauza/bekor — bazadagi holat; ishni bajarayotgan jarayon (boshqasi bo‘lsa ham)
+  buni keyingi checkpoint da ko‘rib to‘xtaydi.
+- To‘xtatishda (stop) ijara bo‘shatiladi; ishga tushganda va har RESUME_EVERY
+  soniyada ijarasi tugagan running ishlar olinadi (scheduler orqali).
+- Bloklaganlar (STATUS_BLOCKED) checkpoint bilan birga users.blocked_at ga
+  yoziladi. BROADCAST_REPROBE_DAYS > 0 bo‘lsa, kuniga bir marta eng eski
+  bloklanganlar sendChatAction bilan tekshiriladi. Xabar qolmaydi, lekin botni
+  blokdan chiqargan foydalanuvchi bir necha soniya "yozmoqda…" ni ko‘radi
+  (getChat bloklanganni ajratmaydi) — shuning uchun har foydalanuvchi N kunda
+  ko‘pi bilan bir marta va past parallellik bilan tekshiriladi.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Set, Tuple
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import (
+    InputMediaAudio,
+    InputMediaDocument,
+    InputMediaPhoto,
+    InputMediaVideo,
+    MessageEntity,
+)
+from loguru import logger
+
+from .broadcast import (
+    STATUS_BLOCKED,
+    STATUS_FAILED,
+    STATUS_OK,
+    Broadcaster,
+    Delivery,
+    iter_audience,
+)
+from .locales import L
+from .scheduler import scheduler
+from .storage.broadcasts import (
+    BC_CANCELED,
+    BC_PAUSED,
+    BC_RUNNING,
+    LOG_BLOCKED,
+    LOG_FAILED,
+    LOG_OK,
+    BroadcastRepository,
+    LogRow,
+    broadcasts,
+)
+from .storage.db import adb
+from .storage.memory import get_lang
+from .storage.segments import Segment
+
+try:
+    from .config import settings
+except Exception:
+    settings = None  # type: ignore
+
+FLUSH_EVERY = 1.0        # soniya
+FLUSH_ROWS = 500
+LEASE = 60               # ijara (soniya); checkpoint har FLUSH_EVERY da uzaytiradi
+RESUME_EVERY = 60
+
+_RESUME_REF = "broadcast:resume"
+_REPROBE_REF = "users:reprobe"
+_REPROBE_EVERY = 86_400
+_REPROBE_WORKERS = 2     # umumiy token bucket ning asosiy qismi tarqatmalarga qolsin
+_LOG_STATUS = {STATUS_OK: LOG_OK, STATUS_BLOCKED: LOG_BLOCKED}
+
+
+# Albom elementi turi -> InputMedia (send_media_group)
+_INPUT_MEDIA = {
+    "photo": InputMediaPhoto,
+    "video": InputMediaVideo,
+    "document": InputMediaDocument,
+    "audio": InputMediaAudio,
+}
+
+
+def input_media(album: List[Dict[str, Any]]) -> List[Any]:
+    """
+    payload["album"] -> InputMedia ro‘yxati. Element: {"type", "media" (file_id),
+    "caption"?, "caption_entities"? (MessageEntity.model_dump)} — formatlash
+    entity lar bilan saqlanadi, shuning uchun parse_mode (standart HTML) o‘chiriladi.
+    """
+    res = []
+    for item in album:
+        entities = [MessageEntity.model_validate(e) for e in item.get("caption_entities") or []]
+        res.append(_INPUT_MEDIA[item["type"]](
+            media=item["media"],
+            caption=item.get("caption") or None,
+            caption_entities=entities or None,
+            parse_mode=None,
+        ))
+    return res
+
+
+# copy_message manbasi o‘chirilgan (admin preview ni o‘chirgan / chatni tozalagan)
+_SOURCE_GONE = "message to copy not found"
+# (chat_id, message_id) — manbasi yo‘qligi aniqlangan preview lar: qolganlarga darhol zaxira nusxa
+_gone: Set[Tuple[int, int]] = set()
+
+
+def source_gone(error: Optional[str]) -> bool:
+    return _SOURCE_GONE in (error or "").lower()
+
+
+async def send_content(bot: Any, uid: int, content: Dict[str, Any]) -> None:
+    """
+    payload["content"] — preview ning zaxira nusxasi: {"type": "text" | "photo" | "video" |
+    "animation" | "document" | "audio" | "voice", "file_id"?, "text", "entities"}.
+    """
+    entities = [MessageEntity.model_validate(e) for e in content.get("entities") or []]
+    fmt: Dict[str, Any] = {"parse_mode": None} if entities else {}
+    text = content.get("text") or None
+    if content["type"] == "text":
+        await bot.send_message(uid, text or " ", entities=entities or None, **fmt)
+        return
+    send = getattr(bot, f"send_{content['type']}")
+    await send(uid, content["file_id"], caption=text, caption_entities=entities or None, **fmt)
+
+
+async def send_payload(bot: Any, uid: int, payload: Dict[str, Any]) -> None:
+    """
+    Ish payload i bo‘yicha bitta foydalanuvchiga yuborish — har doim bitta API so‘rov:
+      - {"copy": {"chat_id", "message_id"}, "content"?: {...}} — admin tasdiqlagan
+        preview xabaridan copy_message (matn formatlash, hujjat va istalgan tur
+        o‘zgarishsiz). Preview o‘chirilgan bo‘lsa — "content" dan send_* bilan;
+      - {"album": [...]} — bitta send_media_group;
+      - {"media", "text"} — eski ishlar (oldin yaratilgan, bazada qolgan) uchun.
+    """
+    copy = payload.get("copy")
+    if copy:
+        src = (int(copy["chat_id"]), int(copy["message_id"]))
+        content = payload.get("content")
+        if not content or src not in _gone:
+            try:
+                await bot.copy_message(uid, *src)
+                return
+            except TelegramBadRequest as e:
+                if not content or not source_gone(str(e)):
+                    raise
+                if src not in _gone:
+                    _gone.add(src)
+                    logger.warning(f"📣 Broadcast source {src} is gone — sending the saved content instead")
+        await send_content(bot, uid, content)
+        return
+    album = payload.get("album")
+    if album:
+        await bot.send_media_group(uid, media=input_media(album))
+        return
+    media = payload.get("media")
+    text = payload.get("text") or ""
+    if media:
+        if media["type"] == "photo":
+            await bot.send_photo(uid, media["file_id"], caption=text or None)
+        else:
+            await bot.send_video(uid, media["file_id"], caption=text or None)
+    else:
+        await bot.send_message(uid, text or " ")
+
+
+class _Progress:
+    """Bitta ishning xotiradagi holati: bufer va checkpoint (watermark)."""
+
+    def __init__(self, after: int):
+        self.watermark = after
+        self.rows: List[LogRow] = []
+        self.unreachable: List[Tuple[int, Optional[str]]] = []   # -> users.blocked_at
+        self._order: Deque[int] = deque()     # navbatga berilgan, hali tugamaganlar (o‘sish tartibida)
+        self._done: Set[int] = set()
+
+    def dispatched(self, uid: int) -> None:
+        self._order.append(uid)
+
+    def finished(self, d: Delivery) -> None:
+        self.rows.append((d.user_id, _LOG_STATUS.get(d.status, LOG_FAILED), d.code))
+        if d.status == STATUS_BLOCKED:
+            self.unreachable.append((d.user_id, d.error))
+        self._done.add(d.user_id)
+        # Eng kichik tugamagan user_id gacha — hammasi tayyor
+        while self._order and self._order[0] in self._done:
+            self._done.discard(self._order[0])
+            self.watermark = self._order.popleft()
+
+    def take(self) -> Tuple[List[LogRow], List[Tuple[int, Optional[str]]]]:
+        rows, self.rows = self.rows, []
+        unreachable, self.unreachable = self.unreachable, []
+        return rows, unreachable
+
+
+class BroadcastRunner:
+    def __init__(self, repo: BroadcastRepository, db: Any):
+        self.repo = repo
+        self.db = db
+        # Jarayon identifikatori (ijara egasi)
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._running: Dict[int, Broadcaster] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        # To‘xtatilayotgan paytda resume bosilgan ishlar (tugashi bilan qayta boshlanadi)
+        self._restart: Set[int] = set()
+        self._closing = False
+
+    # ---------------- Public API ----------------
+    async def submit(self, bot: Any, *, admin_id: int, chat_id: int, payload: Dict[str, Any]) -> int:
+        # payload["segment"] — filtrlar (storage/segments.py); yo‘q bo‘lsa butun auditoriya
+        total = await self.db.count_audience(segment=Segment.from_dict(payload.get("segment")))
+        jid = await self.repo.create(admin_id=admin_id, chat_id=chat_id, payload=payload, total=total)
+        await self._start(bot, jid)
+        logger.info(f"📣 Broadcast job #{jid} created by {admin_id} (~{total} recipients)")
+        return jid
+
+    async def pause(self, job_id: int) -> bool:
+        ok = await self.repo.set_status(job_id, BC_PAUSED, expect=[BC_RUNNING])
+        if ok:
+            self._stop_local(job_id)
+        return ok
+
+    async def resume(self, bot: Any, job_id: int) -> bool:
+        if not await self.repo.set_status(job_id, BC_RUNNING, expect=[BC_PAUSED]):
+            return False
+        if self.is_local(job_id):
+            self._restart.add(int(job_id))
+        else:
+            await self._start(bot, job_id)
+        return True
+
+    async def cancel(self, job_id: int) -> bool:
+        ok = await self.repo.set_status(job_id, BC_CANCELED, expect=[BC_RUNNING, BC_PAUSED])
+        if ok:
+            self._stop_local(job_id)
+        return ok
+
+    def is_local(self, job_id: int) -> bool:
+        return int(job_id) in self._running
+
+    async def resume_stale(self, bot: Any) -> int:
+        """Ijarasi tugagan running ishlarni oladi (qayta ishga tushish / o‘lgan jarayon)."""
+        n = 0
+        for jid in await self.repo.stale():
+            if await self._start(bot, jid):
+                n += 1
+        return n
+
+    async def stop(self) -> None:
+        """Jarayon to‘xtashida: yuborishlarni to‘xtatib, checkpoint yozib, ijarani bo‘shatadi."""
+        self._closing = True
+        for b in self._running.values():
+            b.stop()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    # ---------------- Internal ----------------
+    def _stop_local(self, job_id: int) -> None:
+        b = self._running.get(int(job_id))
+        if b is not None:
+            b.stop()
+
+    async def _start(self, bot: Any, job_id: int) -> bool:
+        jid = int(job_id)
+        if self._closing or jid in self._running:
+            return False
+        # await lardan oldin band qilamiz: parallel _start (resume + davriy tekshiruv) ikki marta ishga tushirmasin
+        b = self._running[jid] = Broadcaster()
+        try:
+            job = await self.repo.get(jid) if await self.repo.claim(jid, self.owner, LEASE) else None
+        except Exception:
+            self._running.pop(jid, None)
+            raise
+        if not job:
+            self._running.pop(jid, None)
+            return False
+        task = asyncio.create_task(self._run(bot, job, b), name=f"broadcast:{jid}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, bot: Any, job: Dict[str, Any], b: Broadcaster) -> None:
+        jid = int(job["id"])
+        after = int(job["last_user_id"] or 0)
+        payload = job["payload"]
+        segment = Segment.from_dict(payload.get("segment"))
+        lock = asyncio.Lock()
+        try:
+            skip = await self.repo.logged_after(jid, after)
+            progress = _Progress(after)
+            if after or skip:
+                logger.info(f"📣 Broadcast #{jid} resumed after user {after} ({len(skip)} already logged)")
+
+            async def source() -> AsyncIterator[int]:
+                async for uid in iter_audience(self.db, after=after, segment=segment):
+                    if uid in skip:
+                        continue
+                    progress.dispatched(uid)
+                    yield uid
+
+            async def checkpoint() -> None:
+                async with lock:
+                    rows, unreachable = progress.take()
+                    try:
+                        alive = await self.repo.checkpoint(
+                            jid, self.owner, last_user_id=progress.watermark, rows=rows, lease=LEASE,
+                        )
+                    except Exception as e:
+                        logger.error(f"Broadcast #{jid} checkpoint failed: {e}")
+                        progress.rows[:0] = rows     # keyingi safar qayta yozamiz
+                        progress.unreachable[:0] = unreachable
+                        return
+                    try:
+                        # Keyingi tarqatmalar bularni o‘tkazib yuboradi (idx_users_reachable)
+                        await self.db.mark_unreachable(unreachable)
+                    except Exception as e:
+                        logger.warning(f"Broadcast #{jid}: blocked users not recorded: {e}")
+                    if not alive and not b.stopped:
+                        logger.info(f"📣 Broadcast #{jid} paused/canceled elsewhere — stopping")
+                        b.stop()
+
+            async def flusher() -> None:
+                while True:
+                    await asyncio.sleep(FLUSH_EVERY)
+                    await checkpoint()
+
+            def on_result(d: Delivery) -> Optional[asyncio.Future]:
+                progress.finished(d)
+                if d.status == STATUS_FAILED and source_gone(d.error) and not b.stopped:
+                    # Preview o‘chirilgan, zaxira nusxa yo‘q — qolgan auditoriyani xatoga sarflamaymiz
+                    logger.warning(f"📣 Broadcast #{jid}: source message is gone — pausing")
+                    b.stop()
+                    return asyncio.ensure_future(self._source_lost(bot, jid))
+                if len(progress.rows) >= FLUSH_ROWS and not lock.locked():
+                    return asyncio.ensure_future(checkpoint())
+                return None
+
+            flush_task = asyncio.create_task(flusher())
+            try:
+                await b.run(source(), lambda uid: send_payload(bot, uid, payload), on_result=on_result)
+            finally:
+                flush_task.cancel()
+                await asyncio.gather(flush_task, return_exceptions=True)
+                await checkpoint()
+
+            if b.stopped:
+                await self.repo.release(jid, self.owner)
+                # To‘xtash paytida boshqa jarayonda resume bosilgan bo‘lsa — u ijarani ololmagan
+                if not self._closing:
+                    job = await self.repo.get(jid)
+                    if job and job["status"] == BC_RUNNING:
+                        self._restart.add(jid)
+                return
+            if await self.repo.finish(jid, self.owner):
+                await self._report(bot, jid)
+        except Exception as e:
+            logger.exception(f"Broadcast #{jid} crashed: {e}")
+            try:
+                await self.repo.release(jid, self.owner)
+            except Exception:
+                pass
+        finally:
+            self._running.pop(jid, None)
+            if jid in self._restart:
+                self._restart.discard(jid)
+                await self._start(bot, jid)
+
+    async def _source_lost(self, bot: Any, job_id: int) -> None:
+        if await self.repo.set_status(job_id, BC_PAUSED, expect=[BC_RUNNING]):
+            await self._report(
+                bot, job_id,
+                key="adm_bc_source_gone",
+                default="Tarqatma to‘xtatildi: preview xabari o‘chirilgan. Yangisini yuboring.",
+            )
+
+    async def _report(
+        self,
+        bot: Any,
+        job_id: int,
+        *,
+        key: str = "adm_broadcast_done",
+        default: str = "Tarqatma yakunlandi. ✅: {ok}, ❌: {fail}",
+    ) -> None:
+        job = await self.repo.get(job_id)
+        if not job:
+            return
+        lang = await get_lang(int(job["admin_id"]), getattr(settings, "DEFAULT_LANG", "uz"))
+        t = L.get(lang) or L.get("uz") or {}
+        text = t.get(key, default)
+        try:
+            await bot.send_message(
+                int(job["chat_id"]),
+                f"#{job_id} " + text.format(ok=job["ok"], fail=int(job["blocked"]) + int(job["failed"])),
+            )
+        except Exception as e:
+            logger.warning(f"Broadcast #{job_id} summary not delivered: {e}")
+
+
+runner = BroadcastRunner(broadcasts, adb)
+
+
+async def schedule_resume(bot: Any) -> None:
+    """Ishga tushishda: to‘xtab qolgan ishlarni darhol oladi va davriy tekshiruvni rejalashtiradi."""
+    n = await runner.resume_stale(bot)
+    if n:
+        logger.info(f"📣 Resumed {n} broadcast job(s)")
+    await scheduler.cancel(_RESUME_REF)
+    await scheduler.schedule("broadcast_resume", int(time.time()) + RESUME_EVERY, ref=_RESUME_REF)
+
+
+@scheduler.handler("broadcast_resume")
+async def _resume_stale(bot, payload: dict) -> None:
+    try:
+        await runner.resume_stale(bot)
+    except Exception as e:
+        logger.warning(f"Broadcast resume check failed: {e}")
+    await scheduler.schedule("broadcast_resume", int(time.time()) + RESUME_EVERY, ref=_RESUME_REF)
+
+
+async def reprobe(bot: Any, *, older_than_days: int, limit: int = 500) -> Tuple[int, int]:
+    """
+    `older_than_days` dan oldin bloklanganlarni tekshiradi (sendChatAction — umumiy
+    token bucket orqali, _REPROBE_WORKERS parallel). Blokdan chiqqanlar chatida
+    qisqa "yozmoqda…" ko‘rinadi. (qaytganlar, hali ham bloklaganlar).
+    """
+    ids = await adb.unreachable_before(int(time.time()) - older_than_days * 86_400, limit)
+    if not ids:
+        return 0, 0
+    results: List[Delivery] = []
+    await Broadcaster(workers=_REPROBE_WORKERS).run(
+        ids, lambda uid: bot.send_chat_action(uid, "typing"), on_result=results.append,
+    )
+    back = [d.user_id for d in results if d.status == STATUS_OK]
+    # Hali ham bloklagan — blocked_at yangilanadi, keyingi tekshiruv yana N kundan keyin
+    still = [(d.user_id, d.error) for d in results if d.status == STATUS_BLOCKED]
+    await adb.clear_unreachable(back)
+    await adb.mark_unreachable(still)
+    return len(back), len(still)
+
+
+def _reprobe_days() -> int:
+    return int(getattr(settings, "BROADCAST_REPROBE_DAYS", 0) or 0)
+
+
+async def schedule_reprobe() -> None:
+    """Ishga tushishda: BROADCAST_REPROBE_DAYS > 0 bo‘lsa kunlik qayta tekshiruv zanjiri."""
+    await scheduler.cancel(_REPROBE_REF)
+    if _reprobe_days() > 0:
+        await scheduler.schedule("users_reprobe", int(time.time()) + 600, ref=_REPROBE_REF)
+
+
+@scheduler.handler("users_reprobe")
+async def _reprobe(bot, payload: dict) -> None:
+    days = _reprobe_days()
+    if days <= 0:
+        return
+    try:
+        back, still = await reprobe(
+            bot, older_than_days=days, limit=int(getattr(settings, "BROADCAST_REPROBE_BATCH", 500) or 500),
+        )
+        if back or still:
+            logger.info(f"🔁 Reprobe: {back} reachable again, {still} still blocked")
+    except Exception as e:
+        logger.warning(f"Reprobe failed: {e}")
+    await scheduler.schedule("users_reprobe", int(time.time()) + _REPROBE_EVERY, ref=_REPROBE_REF)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+# app/fanout.py
+"""
+Bir nechta chatga (admin guruhlari, FAQ guruhlari, adminlar) parallel yuborish.
+
+Ketma-ket `await bot.send_message(...)` da foydalanuvchi barcha so‘rovlar
+yig‘indisini kutadi. Bu yerda yuborishlar semafor bilan cheklangan holda
+bir vaqtda ketadi va har bir target uchun natija (FanoutResult) yig‘iladi:
+
+    from ..fanout import fanout, fanout_first
+
+    results = await fanout(group_ids, lambda gid: bot.send_message(gid, text))
+    first = await fanout_first(group_ids, send, on_result=_link)   # birinchi muvaffaqiyatda qaytadi
+
+fanout_first birinchi target xabarni olishi bilan qaytadi, qolganlari fon
+task larda tugaydi (on_result ular uchun ham chaqiriladi). Jarayon to‘xtashida
+`await drain()` — fon yuborishlarini kutib olish uchun.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Set
+
+from loguru import logger
+
+# Bir vaqtda nechta so‘rov (Telegram chat-lar bo‘yicha limitlardan ancha past)
+DEFAULT_LIMIT = 8
+
+
+@dataclass
+class FanoutResult:
+    target: int
+    ok: bool
+    message: Any = None                     # send() qaytargan qiymat (masalan, Message)
+    error: Optional[BaseException] = None
+
+
+SendFn = Callable[[int], Awaitable[Any]]
+ResultHook = Callable[[FanoutResult], Any]
+
+# fanout_first dan keyin davom etayotgan yuborishlar (GC yutib yubormasligi uchun)
+_BACKGROUND: Set[asyncio.Task] = set()
+
+
+def _targets(targets: Iterable[int]) -> List[int]:
+    # Bo‘sh/0 qiymatlarni tashlab, tartibni saqlagan holda takrorlarni olib tashlaymiz
+    return list(dict.fromkeys(t for t in targets if t))
+
+
+async def _send_one(
+    sem: asyncio.Semaphore, target: int, send: SendFn, on_result: Optional[ResultHook],
+) -> FanoutResult:
+    async with sem:
+        try:
+            res = FanoutResult(target, True, message=await send(target))
+        except Exception as e:
+            res = FanoutResult(target, False, error=e)
+    if on_result is not None:
+        try:
+            r = on_result(res)
+            if inspect.isawaitable(r):
+                await r
+        except Exception as e:
+            logger.exception(f"Fanout hook failed for {target}: {e}")
+    return res
+
+
+async def fanout(
+    targets: Iterable[int],
+    send: SendFn,
+    *,
+    limit: int = DEFAULT_LIMIT,
+    on_result: Optional[ResultHook] = None,
+) -> List[FanoutResult]:
+    """Hamma targetga yuboradi va natijalarni targetlar tartibida qaytaradi."""
+    sem = asyncio.Semaphore(max(1, limit))
+    return list(await asyncio.gather(*(_send_one(sem, t, send, on_result) for t in _targets(targets))))
+
+
+async def fanout_first(
+    targets: Iterable[int],
+    send: SendFn,
+    *,
+    limit: int = DEFAULT_LIMIT,
+    on_result: Optional[ResultHook] = None,
+) -> Optional[FanoutResult]:
+    """
+    Birinchi muvaffaqiyatli yuborish natijasini qaytaradi (hech biri bo‘lmasa — None).
+    Qolgan yuborishlar fonda davom etadi; ularning natijasi faqat on_result orqali.
+    """
+    sem = asyncio.Semaphore(max(1, limit))
+    pending = {asyncio.ensure_future(_send_one(sem, t, send, on_result)) for t in _targets(targets)}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            res = task.result()
+            if res.ok:
+                for rest in pending:
+                    _BACKGROUND.add(rest)
+                    rest.add_done_callback(_BACKGROUND.discard)
+                return res
+    return None
+
+
+async def drain(timeout: float = 10.0) -> None:
+    """Fonda qolgan yuborishlarni kutadi (shutdown da)."""
+    if not _BACKGROUND:
+        return
+    done, pending = await asyncio.wait(set(_BACKGROUND), timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Fanout: {len(pending)} background send(s) canceled on shutdown")
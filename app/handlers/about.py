@@ -77,14 +77,14 @@ async def _send_about_root(message: Message, lang: str):
 # ——— Entry: Reply tugmadan
 @router.message(F.text.in_(ABOUT_BTNS))
 async def about_entry(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     await _send_about_root(message, lang)
 
 
 # ——— Entry: Welcome inline tugmadan
 @router.callback_query(F.data == "nav:about")
 async def nav_about(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     await cb.answer()
     await _send_about_root(cb.message, lang)
 
@@ -92,6 +92,6 @@ async def nav_about(cb: CallbackQuery):
 # ——— Orqaga: Asosiy menyuga qaytish
 @router.callback_query(F.data == "about:back")
 async def about_back(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     await cb.answer()
     await main_menu_handlers.show_main_menu(cb.message, lang)
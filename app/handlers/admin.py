@@ -3,6 +3,8 @@
 
 from __future__ import annotations
 import asyncio
+import json
+from dataclasses import replace
 from typing import List, Optional
 
 from loguru import logger
@@ -14,21 +16,27 @@ from aiogram.types import (
 )
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from aiogram.exceptions import TelegramForbiddenError, TelegramBadRequest
+from aiogram.exceptions import TelegramBadRequest
 
+from ..broadcast import STATUS_BLOCKED, STATUS_OK, Broadcaster, audience_count
+from ..broadcast_jobs import input_media, runner, send_payload
 from ..config import settings
 from ..locales import L
+from ..storage.broadcasts import broadcasts
+from ..storage.kv import kv
 from ..storage.memory import get_lang
+from ..storage.segments import Segment
 
-# --- Optional: Audit booking holati (bo'lmasa ham ishlaydi)
+# --- Optional: Audit bronlari (bo'lmasa ham ishlaydi)
 try:
-    from .audit import BOOKINGS  # type: ignore
+    from ..storage.bookings import bookings, STATUS_APPROVED  # type: ignore
 except Exception:
-    BOOKINGS = {}  # type: ignore
+    bookings = None  # type: ignore
+    STATUS_APPROVED = "approved"
 
 # --- DB (bo'lmasa ham ishlaydi)
 try:
-    from ..storage.db import db  # type: ignore
+    from ..storage.db import adb as db  # type: ignore
 except Exception:
     db = None  # type: ignore
 
@@ -77,18 +85,17 @@ def _split_text_blocks(text: str, max_len: int = 3800) -> list[str]:
         parts.append(cur)
     return parts
 
-def _user_has_approved_booking(user_id: int) -> bool:
+async def _users_with_approved_booking(user_ids: List[int]) -> set:
+    """Sahifadagi foydalanuvchilar uchun bitta so‘rov."""
+    if bookings is None:
+        return set()
     try:
-        for b in BOOKINGS.values():
-            prof = b.get("profile") or {}
-            uid = prof.get("user_id") or b.get("user_id")
-            if uid == user_id and b.get("status") == "approved":
-                return True
-    except Exception:
-        pass
-    return False
-
-def _user_card(u: dict) -> str:
+        return await bookings.users_with_status(user_ids, STATUS_APPROVED)
+    except Exception as e:
+        logger.warning(f"Booking badge lookup failed: {e}")
+        return set()
+
+def _user_card(u: dict, booked_ids: set = frozenset()) -> str:
     uid = u.get("user_id") or u.get("id")
     username = u.get("username") or "-"
     name = u.get("name") or u.get("full_name") or "-"
@@ -96,7 +103,7 @@ def _user_card(u: dict) -> str:
     lang = u.get("lang") or "-"
     onboard = "✅" if u.get("onboarded") else "—"
     feature = u.get("last_feature") or "-"
-    booked = "✅" if _user_has_approved_booking(int(uid or 0)) else "—"
+    booked = "✅" if int(uid or 0) in booked_ids else "—"
     return (
         f"🆔 <code>{uid}</code>\n"
         f"👤 {name}\n"
@@ -113,19 +120,20 @@ def _admin_menu_kb(lang: str) -> InlineKeyboardMarkup:
     t = _t(lang)
     return _ikb([
         _row(_btn("📣 " + _g(t, "adm_send_msg", "Xabar yuborish"), "adm:send")),
+        _row(_btn("📊 " + _g(t, "adm_bc_list_btn", "Tarqatmalar"), "adm:bc:list")),
         _row(_btn("👥 " + _g(t, "adm_users_list", "Foydalanuvchilar ro‘yxati"), "adm:users:0")),
         _row(_btn("📚 " + _g(t, "adm_materials_btn", "Materiallar"), "adm:mats")),  # admin_materials.py bilan ulanadi
     ])
 
 @router.message(Command("admin"), F.from_user.id.in_(settings.admin_ids))
 async def admin_entry_ok(message: Message):
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(message.from_user.id, settings.DEFAULT_LANG)
     logger.info(f"/admin from {message.from_user.id} (ADMIN)")
     await message.answer("🛠 <b>Admin panel</b>", reply_markup=_admin_menu_kb(lang), parse_mode="HTML")
 
 @router.message(Command("admin"))
 async def admin_entry_denied(message: Message):
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(message.from_user.id, settings.DEFAULT_LANG)
     t = _t(lang)
     logger.info(f"/admin from {message.from_user.id} (DENIED)")
     await message.answer(_g(t, "adm_not_admin", "❌ Siz admin emassiz."))
@@ -137,15 +145,16 @@ async def whoami(message: Message):
 @router.callback_query(F.data == "adm:back")
 async def adm_back(cb: CallbackQuery):
     await _safe_cb_answer(cb, "◀️")
-    lang = get_lang(cb.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(cb.from_user.id, settings.DEFAULT_LANG)
     await cb.message.answer("🛠 <b>Admin panel</b>", reply_markup=_admin_menu_kb(lang), parse_mode="HTML")
 
 # ===================== SEND / BROADCAST =====================
 
 class SendFSM(StatesGroup):
-    TARGET = State()      # "one" | "all"
+    TARGET = State()      # "one" | "all" | "segment"
     ONE_USER = State()    # id/username/forward
-    MEDIA = State()       # photo/video optional
+    SEGMENT = State()     # filtrlar (storage/segments.py)
+    MEDIA = State()       # photo/video optional | tayyor xabar | albom
     TEXT = State()        # caption/text
     PREVIEW = State()
 
@@ -155,6 +164,7 @@ def _send_menu_kb(t: dict) -> InlineKeyboardMarkup:
             _btn("🧍‍♂️ " + _g(t, "adm_send_one", "Bitta foydalanuvchi"), "adm:send:one"),
             _btn("🌍 "   + _g(t, "adm_send_all", "Hammaga"),              "adm:send:all"),
         ),
+        _row(_btn("🎯 " + _g(t, "adm_send_segment", "Segment bo‘yicha"), "adm:send:seg")),
         _row(_btn(_g(t, "back_btn", "◀️ Orqaga"), "adm:back"))
     ])
 
@@ -162,16 +172,24 @@ def _send_menu_kb(t: dict) -> InlineKeyboardMarkup:
 async def adm_send(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb)
     await state.clear()
     await cb.message.answer(_g(t, "adm_send_choose", "Qaysi turdagi tarqatma?"), reply_markup=_send_menu_kb(t))
 
+async def _ask_media(message: Message, state: FSMContext, t: dict) -> None:
+    await message.answer(_g(t, "adm_send_media", "Rasm yoki video jo‘nating (ixtiyoriy)."))
+    await message.answer(
+        _g(t, "adm_skip_or_send", "Yoki ⏭ O‘tkazib yuborish tugmasini bosing:"),
+        reply_markup=_ikb([_row(_btn("⏭ " + _g(t, "skip_btn", "O‘tkazib yuborish"), "adm:skip_media"))])
+    )
+    await state.set_state(SendFSM.MEDIA)
+
 @router.callback_query(F.data.in_({"adm:send:one", "adm:send:all"}))
 async def adm_send_target(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb)
 
     target = "one" if cb.data.endswith(":one") else "all"
@@ -181,18 +199,114 @@ async def adm_send_target(cb: CallbackQuery, state: FSMContext):
         await cb.message.answer(_g(t, "adm_ask_user", "Foydalanuvchini yuboring:\n- forward qiling yoki\n- @username yoki user_id kiriting"))
         await state.set_state(SendFSM.ONE_USER)
     else:
-        await cb.message.answer(_g(t, "adm_send_media", "Rasm yoki video jo‘nating (ixtiyoriy)."))
-        await cb.message.answer(
-            _g(t, "adm_skip_or_send", "Yoki ⏭ O‘tkazib yuborish tugmasini bosing:"),
-            reply_markup=_ikb([_row(_btn("⏭ " + _g(t, "skip_btn", "O‘tkazib yuborish"), "adm:skip_media"))])
-        )
-        await state.set_state(SendFSM.MEDIA)
+        await _ask_media(cb.message, state, t)
+
+# ---------------- Segment ----------------
+_SEG_LANGS = (None, "uz", "ru", "en")
+_SEG_ONBOARDED = (None, True, False)
+_SEG_DAYS = (None, 1, 7, 30, 90)
+
+def _cycle(values, cur):
+    values = list(values)
+    return values[(values.index(cur) + 1) % len(values)] if cur in values else values[0]
+
+def _segment_label(t: dict, seg: Segment) -> str:
+    """Qisqa tavsif: 🌐 ru · 🕒 7 kun · 📅 ✅ (bo‘sh segment — "Hammasi")."""
+    parts = []
+    if seg.lang:
+        parts.append(f"🌐 {seg.lang}")
+    if seg.onboarded is not None:
+        parts.append("👣 " + ("✅" if seg.onboarded else "❌"))
+    if seg.active_days:
+        parts.append("🕒 " + _g(t, "adm_seg_days", "{n} kun").format(n=seg.active_days))
+    if seg.feature:
+        parts.append(f"🧩 {seg.feature}")
+    if seg.booked:
+        parts.append("📅 ✅")
+    return " · ".join(parts) or _g(t, "adm_seg_any", "Hammasi")
+
+def _segment_kb(t: dict, seg: Segment) -> InlineKeyboardMarkup:
+    any_ = _g(t, "adm_seg_any", "Hammasi")
+    onb = any_ if seg.onboarded is None else ("✅" if seg.onboarded else "❌")
+    days = _g(t, "adm_seg_days", "{n} kun").format(n=seg.active_days) if seg.active_days else any_
+    return _ikb([
+        _row(_btn(f"🌐 {_g(t, 'adm_seg_lang', 'Til')}: {seg.lang or any_}", "adm:seg:lang")),
+        _row(_btn(f"👣 {_g(t, 'adm_seg_onboarded', 'Ro‘yxatdan o‘tgan')}: {onb}", "adm:seg:onb")),
+        _row(_btn(f"🕒 {_g(t, 'adm_seg_active', 'Faollik')}: {days}", "adm:seg:act")),
+        _row(_btn(f"🧩 {_g(t, 'adm_seg_feature', 'Bo‘lim')}: {seg.feature or any_}", "adm:seg:feat")),
+        _row(_btn(f"📅 {_g(t, 'adm_seg_booked', 'Tasdiqlangan bron')}: {'✅' if seg.booked else any_}", "adm:seg:book")),
+        _row(
+            _btn("▶️ " + _g(t, "adm_seg_next", "Davom etish"), "adm:seg:go"),
+            _btn(_g(t, "back_btn", "◀️ Orqaga"), "adm:send"),
+        ),
+    ])
+
+async def _show_segment(message: Message, t: dict, seg: Segment, *, edit: bool = False) -> None:
+    # Soni keshdan (BROADCAST_COUNT_TTL) — filtrni almashtirish har safar COUNT(*) emas
+    n = await audience_count(db, seg) if db else 0
+    txt = (
+        f"🎯 <b>{_g(t, 'adm_send_segment', 'Segment bo‘yicha')}</b>\n{_segment_label(t, seg)}\n\n"
+        f"👥 {_g(t, 'adm_seg_count', 'Qabul qiluvchilar')}: <b>{n}</b>"
+    )
+    kb = _segment_kb(t, seg)
+    if edit:
+        try:
+            await message.edit_text(txt, reply_markup=kb, parse_mode="HTML")
+            return
+        except TelegramBadRequest as e:
+            if "message is not modified" in str(e).lower():
+                return
+    await message.answer(txt, reply_markup=kb, parse_mode="HTML")
+
+@router.callback_query(F.data == "adm:send:seg")
+async def adm_send_segment(cb: CallbackQuery, state: FSMContext):
+    if cb.from_user.id not in settings.admin_ids:
+        return
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    await _safe_cb_answer(cb)
+    await state.update_data(target="segment", segment={}, media=None, text=None)
+    await state.set_state(SendFSM.SEGMENT)
+    await _show_segment(cb.message, t, Segment())
+
+@router.callback_query(SendFSM.SEGMENT, F.data.regexp(r"^adm:seg:(lang|onb|act|feat|book)$"))
+async def adm_segment_toggle(cb: CallbackQuery, state: FSMContext):
+    if cb.from_user.id not in settings.admin_ids:
+        return
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    await _safe_cb_answer(cb)
+    seg = Segment.from_dict((await state.get_data()).get("segment"))
+    field = cb.data.rsplit(":", 1)[-1]
+    if field == "lang":
+        seg = replace(seg, lang=_cycle(_SEG_LANGS, seg.lang))
+    elif field == "onb":
+        seg = replace(seg, onboarded=_cycle(_SEG_ONBOARDED, seg.onboarded))
+    elif field == "act":
+        seg = replace(seg, active_days=_cycle(_SEG_DAYS, seg.active_days))
+    elif field == "feat":
+        features = [f for f, _ in await db.segment_features()] if db else []
+        seg = replace(seg, feature=_cycle([None, *features], seg.feature))
+    else:
+        seg = replace(seg, booked=not seg.booked)
+    await state.update_data(segment=seg.to_dict())
+    await _show_segment(cb.message, t, seg, edit=True)
+
+@router.callback_query(SendFSM.SEGMENT, F.data == "adm:seg:go")
+async def adm_segment_go(cb: CallbackQuery, state: FSMContext):
+    if cb.from_user.id not in settings.admin_ids:
+        return
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    seg = Segment.from_dict((await state.get_data()).get("segment"))
+    if db and not await audience_count(db, seg):
+        await cb.answer(_g(t, "adm_seg_empty", "Bu segmentda hech kim yo‘q."), show_alert=True)
+        return
+    await _safe_cb_answer(cb)
+    await _ask_media(cb.message, state, t)
 
 @router.message(SendFSM.ONE_USER)
 async def adm_pick_one_user(message: Message, state: FSMContext):
     if message.from_user.id not in settings.admin_ids:
         return
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG); t = _t(lang)
+    lang = await get_lang(message.from_user.id, settings.DEFAULT_LANG); t = _t(lang)
 
     user_id: Optional[int] = None
     txt = (message.text or "").strip()
@@ -201,9 +315,21 @@ async def adm_pick_one_user(message: Message, state: FSMContext):
         user_id = message.forward_from.id
     elif txt.isdigit():
         user_id = int(txt)
+    elif txt.startswith("@") and txt.endswith("*") and db:
+        # Prefiks qidiruv: @abc* — bitta topilsa tanlaymiz, ko‘p bo‘lsa ro‘yxat
+        try:
+            found = await db.search_users_by_username(txt, limit=10)
+        except Exception:
+            found = []
+        if len(found) == 1:
+            user_id = int(found[0]["user_id"])
+        elif found:
+            lines = [f"@{u['username']} — <code>{u['user_id']}</code>" for u in found]
+            await message.answer("🔎 " + "\n".join(lines), parse_mode="HTML")
+            return
     elif txt.startswith("@") and db:
         try:
-            u = db.find_user_by_username(txt[1:])
+            u = await db.find_user_by_username(txt[1:])
             if u:
                 user_id = int(u.get("user_id") or u.get("id"))
         except Exception:
@@ -214,29 +340,86 @@ async def adm_pick_one_user(message: Message, state: FSMContext):
         return
 
     await state.update_data(to_user=user_id)
-    await message.answer(_g(t, "adm_send_media", "Rasm yoki video jo‘nating (ixtiyoriy)."))
-    await message.answer(
-        _g(t, "adm_skip_or_send", "Yoki ⏭ O‘tkazib yuborish tugmasini bosing:"),
-        reply_markup=_ikb([_row(_btn("⏭ " + _g(t, "skip_btn", "O‘tkazib yuborish"), "adm:skip_media"))])
-    )
-    await state.set_state(SendFSM.MEDIA)
+    await _ask_media(message, state, t)
 
 @router.callback_query(SendFSM.MEDIA, F.data == "adm:skip_media")
 async def adm_skip_media(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb, "⏭")
     await cb.message.answer(_g(t, "adm_ask_text", "Matn/caption kiriting (ixtiyoriy)."))
     await state.set_state(SendFSM.TEXT)
 
+# ---------------- Albom (media group) ----------------
+# Telegram albom elementlarini alohida update lar bilan yuboradi, ular turli
+# worker larga tushishi mumkin: har bir element KV dagi ro‘yxatga qo‘shiladi
+# (REDIS_URL bo‘lsa umumiy), birinchisini olgan worker ALBUM_WAIT soniya kutib
+# butun ro‘yxatni yig‘adi
+ALBUM_WAIT = 1.0
+ALBUM_TTL = 60
+
+def _dump_entities(entities) -> list:
+    """MessageEntity -> JSON (FSM holati bazada / Redis da saqlanadi)."""
+    return [e.model_dump(mode="json", exclude_none=True) for e in entities or []]
+
+def _album_item(m: Message) -> Optional[dict]:
+    for kind in ("photo", "video", "document", "audio"):
+        obj = getattr(m, kind)
+        if obj:
+            item = {"type": kind, "media": obj[-1].file_id if kind == "photo" else obj.file_id}
+            if m.caption:
+                item["caption"] = m.caption
+                item["caption_entities"] = _dump_entities(m.caption_entities)
+            return item
+    return None
+
+# send_content (broadcast_jobs) biladigan turlar — preview o‘chirilsa zaxira nusxa
+_CONTENT_KINDS = ("photo", "video", "animation", "document", "audio", "voice")
+
+def _message_content(m: Message) -> Optional[dict]:
+    if m.text:
+        return {"type": "text", "text": m.text, "entities": _dump_entities(m.entities)}
+    for kind in _CONTENT_KINDS:
+        obj = getattr(m, kind)
+        if obj:
+            return {
+                "type": kind,
+                "file_id": obj[-1].file_id if kind == "photo" else obj.file_id,
+                "text": m.caption,
+                "entities": _dump_entities(m.caption_entities),
+            }
+    return None  # stiker, so‘rovnoma va h.k. — faqat copy_message
+
+@router.message(SendFSM.MEDIA, F.media_group_id)
+async def adm_take_album(message: Message, state: FSMContext):
+    if message.from_user.id not in settings.admin_ids:
+        return
+    key = f"album:{message.chat.id}:{message.media_group_id}"
+    part = {"id": message.message_id, "item": _album_item(message)}
+    if await kv.append(key, json.dumps(part, ensure_ascii=False), ttl=ALBUM_TTL) > 1:
+        return
+    await asyncio.sleep(ALBUM_WAIT)
+    parts = sorted(map(json.loads, await kv.get_list(key)), key=lambda p: p["id"])
+    await kv.delete(key)
+    album = [p["item"] for p in parts if p["item"]]
+    await state.update_data(album=album, media=None, source=None, content=None, text=None, entities=None)
+    t = _t(await get_lang(message.from_user.id, settings.DEFAULT_LANG))
+    if any(it.get("caption") for it in album):
+        await _preview(message, state, t)
+    else:
+        await message.answer(_g(t, "adm_ask_text", "Matn/caption kiriting (ixtiyoriy)."))
+        await state.set_state(SendFSM.TEXT)
+
 @router.message(SendFSM.MEDIA, F.photo)
 async def adm_take_photo(message: Message, state: FSMContext):
     if message.from_user.id not in settings.admin_ids:
         return
+    if message.caption:
+        return await adm_take_source(message, state)
     file_id = message.photo[-1].file_id
     await state.update_data(media={"type": "photo", "file_id": file_id})
-    t = _t(get_lang(message.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(message.from_user.id, settings.DEFAULT_LANG))
     await message.answer(_g(t, "adm_ask_text", "Matn/caption kiriting (ixtiyoriy)."))
     await state.set_state(SendFSM.TEXT)
 
@@ -244,20 +427,91 @@ async def adm_take_photo(message: Message, state: FSMContext):
 async def adm_take_video(message: Message, state: FSMContext):
     if message.from_user.id not in settings.admin_ids:
         return
+    if message.caption:
+        return await adm_take_source(message, state)
     file_id = message.video.file_id
     await state.update_data(media={"type": "video", "file_id": file_id})
-    t = _t(get_lang(message.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(message.from_user.id, settings.DEFAULT_LANG))
     await message.answer(_g(t, "adm_ask_text", "Matn/caption kiriting (ixtiyoriy)."))
     await state.set_state(SendFSM.TEXT)
 
+@router.message(SendFSM.MEDIA)
+async def adm_take_source(message: Message, state: FSMContext):
+    """Tayyor xabar (formatlangan matn, hujjat, caption li media ...) — o‘zi nusxalanadi."""
+    if message.from_user.id not in settings.admin_ids:
+        return
+    await state.update_data(
+        source={"chat_id": message.chat.id, "message_id": message.message_id},
+        content=_message_content(message),
+        media=None, album=None, text=None, entities=None,
+    )
+    await _preview(message, state, _t(await get_lang(message.from_user.id, settings.DEFAULT_LANG)))
+
 @router.message(SendFSM.TEXT)
 async def adm_take_text(message: Message, state: FSMContext):
     if message.from_user.id not in settings.admin_ids:
         return
-    txt = (message.text or "").strip()
-    await state.update_data(text=txt)
+    t = _t(await get_lang(message.from_user.id, settings.DEFAULT_LANG))
+    txt = message.text or ""
+    data = await state.get_data()
+    album = data.get("album")
+    if not txt.strip() and not data.get("media") and not album:
+        await message.answer(_g(t, "adm_ask_text", "Matn/caption kiriting (ixtiyoriy)."))
+        return
+    if album:
+        # Albom caption i — birinchi elementda
+        first = {k: v for k, v in album[0].items() if k not in ("caption", "caption_entities")}
+        if txt.strip():
+            first.update(caption=txt, caption_entities=_dump_entities(message.entities))
+        await state.update_data(album=[first, *album[1:]])
+    else:
+        media = data.get("media")
+        entities = _dump_entities(message.entities)
+        content = {"type": media["type"], "file_id": media["file_id"]} if media else {"type": "text"}
+        content.update(text=txt or None, entities=entities)
+        await state.update_data(text=txt, entities=entities, content=content, source=None)
+    await _preview(message, state, t)
+
+async def _preview(message: Message, state: FSMContext, t: dict) -> None:
+    """
+    Preview — admin chatida yuboriladigan xabarning aynan o‘zi (tugmalarsiz).
+    Tarqatma uning nusxasi: copy_message(preview) yoki albom uchun bitta
+    send_media_group — har bir foydalanuvchiga bitta API so‘rov.
+    """
+    bot = message.bot
+    chat_id = message.chat.id
+    data = await state.get_data()
+    media = data.get("media")
+    txt = data.get("text") or ""
+    # Formatlash entity lar bilan keladi — standart parse_mode (HTML) ularga xalaqit bermasin
+    ents = data.get("entities") or []
+    fmt = {"parse_mode": None} if ents else {}
 
-    t = _t(get_lang(message.from_user.id, settings.DEFAULT_LANG))
+    await message.answer("🧪 <b>Preview</b>", parse_mode="HTML")
+    preview = None
+    if data.get("album"):
+        await bot.send_media_group(chat_id, media=input_media(data["album"]))
+    elif data.get("source"):
+        src = data["source"]
+        sent = await bot.copy_message(chat_id, src["chat_id"], src["message_id"])
+        preview = {"chat_id": chat_id, "message_id": sent.message_id}
+    else:
+        if media and media["type"] == "photo":
+            sent = await message.answer_photo(media["file_id"], caption=txt or None, caption_entities=ents or None, **fmt)
+        elif media:
+            sent = await message.answer_video(media["file_id"], caption=txt or None, caption_entities=ents or None, **fmt)
+        else:
+            sent = await message.answer(txt, entities=ents or None, **fmt)
+        preview = {"chat_id": chat_id, "message_id": sent.message_id}
+    await state.update_data(preview=preview)
+
+    head = "⬆️"
+    if data.get("target") != "one" and db:
+        seg = Segment.from_dict(data.get("segment"))
+        head += (
+            f"\n🎯 {_segment_label(t, seg)}\n"
+            f"👥 {_g(t, 'adm_seg_count', 'Qabul qiluvchilar')}: <b>{await audience_count(db, seg)}</b>"
+        )
     kb = _ikb([
         _row(
             _btn("✅ " + _g(t, "send_btn", "Yuborish"), "adm:submit"),
@@ -265,25 +519,20 @@ async def adm_take_text(message: Message, state: FSMContext):
             _btn("❌ " + _g(t, "cancel_btn", "Bekor qilish"), "adm:cancel"),
         )
     ])
-
-    await message.answer("🧪 <b>Preview</b>", parse_mode="HTML")
-    data = await state.get_data()
-    media = data.get("media")
-    if media:
-        if media["type"] == "photo":
-            await message.answer_photo(media["file_id"], caption=txt or None, reply_markup=kb)
-        else:
-            await message.answer_video(media["file_id"], caption=txt or None, reply_markup=kb)
-    else:
-        await message.answer(txt or "—", reply_markup=kb)
+    await message.answer(head, reply_markup=kb, parse_mode="HTML")
     await state.set_state(SendFSM.PREVIEW)
 
 @router.callback_query(SendFSM.PREVIEW, F.data == "adm:edit")
 async def adm_edit(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb)
+    if (await state.get_data()).get("source"):
+        # Tayyor xabar — butunlay yangisini kutamiz
+        await state.update_data(source=None)
+        await _ask_media(cb.message, state, t)
+        return
     await cb.message.answer(_g(t, "adm_ask_text", "Matn/caption kiriting (ixtiyoriy)."))
     await state.set_state(SendFSM.TEXT)
 
@@ -291,7 +540,7 @@ async def adm_edit(cb: CallbackQuery, state: FSMContext):
 async def adm_cancel(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb, "❌")
     await state.clear()
     await cb.message.answer(_g(t, "adm_broadcast_canceled", "Tarqatma bekor qilindi."))
@@ -300,61 +549,124 @@ async def adm_cancel(cb: CallbackQuery, state: FSMContext):
 async def adm_submit(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb, "🚀")
 
     data = await state.get_data()
-    target = data.get("target")
-    media = data.get("media")
-    text  = data.get("text") or ""
+    # Holatni darhol tozalaymiz: tarqatma fonda ketadi, qayta "Yuborish" bo‘lmasin
+    await state.clear()
+    # Albom — bitta send_media_group, qolgani — preview dan copy_message
+    if data.get("album"):
+        payload = {"album": data["album"]}
+    elif data.get("preview"):
+        # content — preview o‘chirilsa ham tarqatma davom etsin (send_content)
+        payload = {"copy": data["preview"], "content": data.get("content")}
+    else:
+        payload = {"media": data.get("media"), "text": data.get("text") or ""}
+    if data.get("target") == "segment" and data.get("segment"):
+        payload["segment"] = Segment.from_dict(data["segment"]).to_dict()
+    bot = cb.message.bot
+
+    if data.get("target") == "one":
+        d = await Broadcaster().deliver(int(data["to_user"]), lambda uid: send_payload(bot, uid, payload))
+        ok = int(d.status == STATUS_OK)
+        if d.status == STATUS_BLOCKED and db:
+            await db.mark_unreachable([(d.user_id, d.error)])
+        done_txt = _g(t, "adm_broadcast_done", "Tarqatma yakunlandi. ✅: {ok}, ❌: {fail}")
+        await cb.message.answer(done_txt.format(ok=ok, fail=1 - ok))
+        return
 
-    sent_ok = 0
-    sent_fail = 0
+    # Butun auditoriya / segment — bazadagi ish sifatida (davom ettiriladi, takror yuborilmaydi)
+    jid = await runner.submit(bot, admin_id=cb.from_user.id, chat_id=cb.message.chat.id, payload=payload)
+    await cb.message.answer(
+        f"#{jid} " + _g(t, "adm_broadcast_started", "Tarqatma boshlandi. Yakunlanganda xabar beraman."),
+        reply_markup=_ikb([_row(_btn("📊 " + _g(t, "adm_bc_list_btn", "Tarqatmalar"), "adm:bc:list"))]),
+    )
 
-    try:
-        if target == "one":
-            uid = int(data["to_user"])
-            await _send_one(cb, uid, media, text)
-            sent_ok = 1
-        else:
-            all_users = db.get_all_users(0, 10_000) if db else []
-            for u in all_users:
-                uid = int(u.get("user_id") or u.get("id"))
-                try:
-                    await _send_one(cb, uid, media, text)
-                    sent_ok += 1
-                    await asyncio.sleep(0.05)  # floodlimit xavfsizligi
-                except (TelegramForbiddenError, TelegramBadRequest):
-                    sent_fail += 1
-                except Exception:
-                    sent_fail += 1
-    finally:
-        await state.clear()
-
-    done_txt = _g(t, "adm_broadcast_done", "Tarqatma yakunlandi. ✅: {ok}, ❌: {fail}")
-    await cb.message.answer(done_txt.format(ok=sent_ok, fail=sent_fail))
-
-async def _send_one(cb: CallbackQuery, uid: int, media: Optional[dict], text: str):
-    if media:
-        if media["type"] == "photo":
-            await cb.message.bot.send_photo(uid, media["file_id"], caption=text or None)
-        else:
-            await cb.message.bot.send_video(uid, media["file_id"], caption=text or None)
+# ===================== BROADCAST JOBS =====================
+
+_BC_ICONS = {"running": "▶️", "paused": "⏸", "done": "✅", "canceled": "✖️"}
+
+def _job_line(t: dict, j: dict) -> str:
+    done = int(j["ok"]) + int(j["blocked"]) + int(j["failed"])
+    total = max(int(j["total"] or 0), done)
+    pct = f" ({done * 100 // total}%)" if total else ""
+    seg = (j.get("payload") or {}).get("segment")
+    return (
+        f"{_BC_ICONS.get(j['status'], '•')} <b>#{j['id']}</b> — {done}/{total}{pct}\n"
+        + (f"   🎯 {_segment_label(t, Segment.from_dict(seg))}\n" if seg else "")
+        + f"   ✅ {j['ok']} · 🚫 {j['blocked']} · ❌ {j['failed']}"
+    )
+
+def _jobs_kb(t: dict, jobs: List[dict]) -> InlineKeyboardMarkup:
+    rows = []
+    for j in jobs:
+        jid = j["id"]
+        if j["status"] == "running":
+            rows.append(_row(_btn(f"⏸ #{jid}", f"adm:bc:pause:{jid}"), _btn(f"✖️ #{jid}", f"adm:bc:cancel:{jid}")))
+        elif j["status"] == "paused":
+            rows.append(_row(_btn(f"▶️ #{jid}", f"adm:bc:resume:{jid}"), _btn(f"✖️ #{jid}", f"adm:bc:cancel:{jid}")))
+    rows.append(_row(_btn("🔄", "adm:bc:list"), _btn(_g(t, "back_btn", "◀️ Orqaga"), "adm:back")))
+    return _ikb(rows)
+
+async def _show_jobs(message: Message, t: dict, *, edit: bool = False) -> None:
+    jobs = await broadcasts.recent(5)
+    body = "\n\n".join(_job_line(t, j) for j in jobs) or _g(t, "adm_bc_empty", "Hali tarqatma yo‘q.")
+    txt = f"📣 <b>{_g(t, 'adm_bc_list_btn', 'Tarqatmalar')}</b>\n\n{body}"
+    kb = _jobs_kb(t, jobs)
+    if edit:
+        try:
+            await message.edit_text(txt, reply_markup=kb, parse_mode="HTML")
+            return
+        except TelegramBadRequest:
+            pass  # "message is not modified" yoki eski xabar
+    await message.answer(txt, reply_markup=kb, parse_mode="HTML")
+
+@router.message(Command("broadcasts"), F.from_user.id.in_(settings.admin_ids))
+async def adm_jobs_cmd(message: Message):
+    await _show_jobs(message, _t(await get_lang(message.from_user.id, settings.DEFAULT_LANG)))
+
+@router.callback_query(F.data == "adm:bc:list")
+async def adm_jobs(cb: CallbackQuery):
+    if cb.from_user.id not in settings.admin_ids:
+        return
+    await _safe_cb_answer(cb)
+    await _show_jobs(cb.message, _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG)), edit=True)
+
+@router.callback_query(F.data.regexp(r"^adm:bc:(pause|resume|cancel):\d+$"))
+async def adm_job_action(cb: CallbackQuery):
+    if cb.from_user.id not in settings.admin_ids:
+        return
+    _, _, action, jid = cb.data.split(":")
+    if action == "pause":
+        ok = await runner.pause(int(jid))
+    elif action == "resume":
+        ok = await runner.resume(cb.message.bot, int(jid))
     else:
-        await cb.message.bot.send_message(uid, text or " ")
+        ok = await runner.cancel(int(jid))
+    await _safe_cb_answer(cb, "✅" if ok else "⚠️")
+    await _show_jobs(cb.message, _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG)), edit=True)
 
 # ===================== USERS LIST =====================
 
 PAGE_SIZE = 8  # xavfsizroq
 
-def _users_page_kb(page: int, has_prev: bool, has_next: bool, t: dict) -> InlineKeyboardMarkup:
+def _users_page_kb(
+    page: int,
+    has_prev: bool,
+    has_next: bool,
+    t: dict,
+    first_cursor: Optional[str] = None,
+    last_cursor: Optional[str] = None,
+) -> InlineKeyboardMarkup:
+    # callback: adm:users:<page>[:a|b:<cursor>] — cursor keyset sahifalash uchun
     rows: list[list[InlineKeyboardButton]] = []
     nav: list[InlineKeyboardButton] = []
-    if has_prev:
-        nav.append(_btn("⬅️", f"adm:users:{page-1}"))
+    if has_prev and first_cursor:
+        nav.append(_btn("⬅️", f"adm:users:{page-1}:b:{first_cursor}"))
     nav.append(_btn(f"{page+1}", f"noop:{page}"))  # sahifa raqami (noop)
-    if has_next:
-        nav.append(_btn("➡️", f"adm:users:{page+1}"))
+    if has_next and last_cursor:
+        nav.append(_btn("➡️", f"adm:users:{page+1}:a:{last_cursor}"))
     if nav:
         rows.append(nav)
     rows.append([_btn("🔍 " + _g(t, "adm_user_show_btn", "Foydalanuvchini ko‘rish"), "adm:find")])
@@ -365,33 +677,50 @@ def _users_page_kb(page: int, has_prev: bool, has_next: bool, t: dict) -> Inline
 async def adm_users(cb: CallbackQuery):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb)
 
-    page = int(cb.data.split(":")[-1])
-    all_users = db.get_all_users(page * PAGE_SIZE, PAGE_SIZE + 1) if db else []
-    items = all_users[:PAGE_SIZE]
-    has_next = len(all_users) > PAGE_SIZE
-    has_prev = page > 0
+    parts = cb.data.split(":")
+    page = max(0, int(parts[2]))
+    direction = parts[3] if len(parts) >= 5 else ""
+    cursor = parts[4] if len(parts) >= 5 else None
+
+    items: list[dict] = []
+    if db:
+        if direction == "b":
+            rows = await db.iter_users(before=cursor, limit=PAGE_SIZE + 1)
+            items = rows[-PAGE_SIZE:]
+            has_prev, has_next = len(rows) > PAGE_SIZE, True
+        else:
+            rows = await db.iter_users(after=cursor if direction == "a" else None, limit=PAGE_SIZE + 1)
+            items = rows[:PAGE_SIZE]
+            has_prev, has_next = direction == "a", len(rows) > PAGE_SIZE
+    else:
+        has_prev = has_next = False
+
+    first_cursor = items[0]["cursor"] if items else None
+    last_cursor = items[-1]["cursor"] if items else None
+    page_kb = _users_page_kb(page, has_prev, has_next, t, first_cursor, last_cursor)
 
     if not items:
-        await cb.message.answer("— Ro‘yxat bo‘sh —", reply_markup=_users_page_kb(page, has_prev, has_next, t))
+        await cb.message.answer("— Ro‘yxat bo‘sh —", reply_markup=page_kb)
         return
 
     header = "👥 <b>Foydalanuvchilar</b>\n"
-    body = "\n".join(_user_card(u) for u in items)
+    booked_ids = await _users_with_approved_booking([int(u.get("user_id") or 0) for u in items])
+    body = "\n".join(_user_card(u, booked_ids) for u in items)
     txt = header + body
 
     chunks = _split_text_blocks(txt, 3800)
     for i, chunk in enumerate(chunks):
-        kb = _users_page_kb(page, has_prev, has_next, t) if i == len(chunks) - 1 else None
+        kb = page_kb if i == len(chunks) - 1 else None
         await cb.message.answer(chunk, parse_mode="HTML", reply_markup=kb)
 
 @router.callback_query(F.data == "adm:find")
 async def adm_find_prompt(cb: CallbackQuery, state: FSMContext):
     if cb.from_user.id not in settings.admin_ids:
         return
-    t = _t(get_lang(cb.from_user.id, settings.DEFAULT_LANG))
+    t = _t(await get_lang(cb.from_user.id, settings.DEFAULT_LANG))
     await _safe_cb_answer(cb)
     # ONE_USER holatini qayta ishlatamiz (ID/@/forward qabul qiladi)
     await state.set_state(SendFSM.ONE_USER)
@@ -21,7 +21,7 @@ from ..storage.memory import get_lang
 
 # --- DB ---
 try:
-    from ..storage.db import db  # type: ignore
+    from ..storage.db import adb as db  # type: ignore
 except Exception:
     db = None  # type: ignore
 
@@ -111,14 +111,18 @@ def _paid_kb() -> InlineKeyboardMarkup:
         [_btn("🏠", "madmin:root")],
     ])
 
-def _list_nav_kb(cat: str, page: int, has_prev: bool, has_next: bool, lang: str) -> InlineKeyboardMarkup:
+def _list_nav_kb(
+    cat: str, page: int, has_prev: bool, has_next: bool, lang: str,
+    first_cursor: Optional[str] = None, last_cursor: Optional[str] = None,
+) -> InlineKeyboardMarkup:
+    # callback: madmin:list:cat:<cat>:<page>[:a|b:<cursor>]
     t = _t(lang)
     nav: List[InlineKeyboardButton] = []
-    if has_prev:
-        nav.append(_btn("⬅️", f"madmin:list:cat:{cat}:{page-1}"))
+    if has_prev and first_cursor:
+        nav.append(_btn("⬅️", f"madmin:list:cat:{cat}:{page-1}:b:{first_cursor}"))
     nav.append(_btn(f"{page+1}", f"madmin:nop:{page}"))
-    if has_next:
-        nav.append(_btn("➡️", f"madmin:list:cat:{cat}:{page+1}"))
+    if has_next and last_cursor:
+        nav.append(_btn("➡️", f"madmin:list:cat:{cat}:{page+1}:a:{last_cursor}"))
     rows: List[List[InlineKeyboardButton]] = []
     if nav:
         rows.append(nav)
@@ -159,20 +163,20 @@ class EditFSM(StatesGroup):
 @router.message(Command("mats"))
 async def mats_cmd(message: Message):
     if not _is_admin(message.from_user.id): return
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(message.from_user.id, settings.DEFAULT_LANG)
     await message.answer("🧰 <b>Materiallar (Admin)</b>", parse_mode="HTML", reply_markup=_root_kb(lang))
 
 @router.callback_query(F.data.in_({"adm:mats", "admin:mats"}))
 async def m_root_from_admin(cb: CallbackQuery):
     if not _is_admin(cb.from_user.id): return
-    lang = get_lang(cb.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(cb.from_user.id, settings.DEFAULT_LANG)
     await _safe(cb)
     await cb.message.answer("🧰 <b>Materiallar (Admin)</b>", parse_mode="HTML", reply_markup=_root_kb(lang))
 
 @router.callback_query(F.data == "madmin:root")
 async def m_root(cb: CallbackQuery):
     if not _is_admin(cb.from_user.id): return
-    lang = get_lang(cb.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(cb.from_user.id, settings.DEFAULT_LANG)
     await _safe(cb)
     await cb.message.answer("🧰 <b>Materiallar (Admin)</b>", parse_mode="HTML", reply_markup=_root_kb(lang))
 
@@ -188,7 +192,7 @@ async def m_stats(cb: CallbackQuery):
     for cat, icon in CATS:
         for code, flag in LANGS:
             try:
-                cnt = db.count_materials(category=cat, lang=code)
+                cnt = await db.count_materials(category=cat, lang=code)
             except Exception:
                 cnt = "?"
             lines.append(f"{icon} {cat.title()} — {flag} {code.upper()}: <b>{cnt}</b>")
@@ -322,7 +326,7 @@ async def add_save(cb: CallbackQuery, state: FSMContext):
     await _safe(cb, "💾")
     data = await state.get_data()
     try:
-        mid = db.add_material(
+        mid = await db.add_material(
             category=data["cat"],
             lang=data["lang"],
             title=data["title"],
@@ -349,26 +353,29 @@ async def list_pick_cat(cb: CallbackQuery):
 async def materials_list(cb: CallbackQuery):
     if not _is_admin(cb.from_user.id) or not db: return
     parts = cb.data.split(":")
-    # madmin:list:cat:<cat>[:<page>]
+    # madmin:list:cat:<cat>[:<page>[:a|b:<cursor>]]
     cat = parts[3]
     page = int(parts[4]) if len(parts) >= 5 else 0
+    direction, cursor = (parts[5], parts[6]) if len(parts) >= 7 else ("", None)
     if cat not in CAT_SET:
         await _safe(cb, "❌ Noto‘g‘ri kategoriya")
         return
 
     await _safe(cb)
-    lang = get_lang(cb.from_user.id, settings.DEFAULT_LANG)
-    offset = page * PAGE_SIZE
+    lang = await get_lang(cb.from_user.id, settings.DEFAULT_LANG)
     try:
-        items = db.list_materials(category=cat, lang=lang, offset=offset, limit=PAGE_SIZE + 1)
+        if direction == "b":
+            rows = await db.list_materials(category=cat, lang=lang, before=cursor, limit=PAGE_SIZE + 1)
+            items, has_prev, has_next = rows[-PAGE_SIZE:], len(rows) > PAGE_SIZE, True
+        else:
+            rows = await db.list_materials(
+                category=cat, lang=lang, after=cursor if direction == "a" else None, limit=PAGE_SIZE + 1
+            )
+            items, has_prev, has_next = rows[:PAGE_SIZE], direction == "a", len(rows) > PAGE_SIZE
     except Exception as e:
         await cb.message.answer(f"❌ DB xato: {e}")
         return
 
-    has_next = len(items) > PAGE_SIZE
-    items = items[:PAGE_SIZE]
-    has_prev = page > 0
-
     t = _t(lang)
     header = f"{_cat_icon(cat)} <b>{_cat_title(cat, t)}</b>"
     kb_rows: List[List[InlineKeyboardButton]] = []
@@ -381,7 +388,8 @@ async def materials_list(cb: CallbackQuery):
         tag = "🔒" if it.get("is_paid") else "✅"
         kb_rows.append([ _btn(f"{tag} #{it['id']} — {_short(it.get('title',''), 48)}", f"madmin:item:{int(it['id'])}") ])
 
-    kb = _ikb(kb_rows + _list_nav_kb(cat, page, has_prev, has_next, lang).inline_keyboard)
+    nav_kb = _list_nav_kb(cat, page, has_prev, has_next, lang, items[0]["cursor"], items[-1]["cursor"])
+    kb = _ikb(kb_rows + nav_kb.inline_keyboard)
     await cb.message.answer(header, parse_mode="HTML", reply_markup=kb)
 
 # ===================== ITEM VIEW + ACTIONS =====================
@@ -405,11 +413,11 @@ async def item_open(cb: CallbackQuery):
     if not _is_admin(cb.from_user.id) or not db: return
     mid = int(cb.data.split(":")[-1])
     await _safe(cb)
-    it = db.get_material(mid)
+    it = await db.get_material(mid)
     if not it:
         await cb.message.answer("❌ Topilmadi.")
         return
-    lang = get_lang(cb.from_user.id, settings.DEFAULT_LANG)
+    lang = await get_lang(cb.from_user.id, settings.DEFAULT_LANG)
     await cb.message.answer(_fmt_item(it, lang), parse_mode="HTML", reply_markup=_item_kb(it, lang))
 
 @router.callback_query(F.data.startswith("madmin:item:back:"))
@@ -426,7 +434,7 @@ async def item_preview(cb: CallbackQuery):
     if not _is_admin(cb.from_user.id) or not db: return
     mid = int(cb.data.split(":")[-1])
     await _safe(cb, "👁")
-    it = db.get_material(mid)
+    it = await db.get_material(mid)
     if not it:
         await cb.message.answer("❌ Topilmadi."); return
 
@@ -453,15 +461,15 @@ async def item_toggle_paid(cb: CallbackQuery):
     if not _is_admin(cb.from_user.id) or not db: return
     mid = int(cb.data.split(":")[-1])
     await _safe(cb)
-    it = db.get_material(mid)
+    it = await db.get_material(mid)
     if not it: await cb.message.answer("❌ Topilmadi."); return
     if not _has(db, "update_material"):
         await cb.message.answer("ℹ️ DB.update_material mavjud emas."); return
     new_paid = 0 if it.get("is_paid") else 1
     try:
-        db.update_material(mid, is_paid=new_paid)
-        it2 = db.get_material(mid)
-        lang = get_lang(cb.from_user.id, settings.DEFAULT_LANG)
+        await db.update_material(mid, is_paid=new_paid)
+        it2 = await db.get_material(mid)
+        lang = await get_lang(cb.from_user.id, settings.DEFAULT_LANG)
         await cb.message.answer("✅ Holat o‘zgardi.", reply_markup=_item_kb(it2, lang))
     except Exception as e:
         await cb.message.answer(f"❌ Xato: {e}")
@@ -487,7 +495,7 @@ async def item_set_price_take(message: Message, state: FSMContext):
         usd, cents = 0.0, 0
     await state.clear()
     try:
-        db.update_material(mid, price_cents=cents, is_paid=1 if cents > 0 else 0)
+        await db.update_material(mid, price_cents=cents, is_paid=1 if cents > 0 else 0)
         await message.answer(f"✅ Narx yangilandi: {usd:.2f}$")
     except Exception as e:
         await message.answer(f"❌ Xato: {e}")
@@ -508,7 +516,7 @@ async def item_edit_title_take(message: Message, state: FSMContext):
     data = await state.get_data(); mid = int(data.get("edit_mid"))
     await state.clear()
     try:
-        db.update_material(mid, title=(message.text or "").strip())
+        await db.update_material(mid, title=(message.text or "").strip())
         await message.answer("✅ Sarlavha yangilandi.")
     except Exception as e:
         await message.answer(f"❌ Xato: {e}")
@@ -530,7 +538,7 @@ async def item_edit_desc_take(message: Message, state: FSMContext):
     await state.clear()
     try:
         desc = (message.text or "").strip()
-        db.update_material(mid, description=desc or None)
+        await db.update_material(mid, description=desc or None)
         await message.answer("✅ Tavsif yangilandi.")
     except Exception as e:
         await message.answer(f"❌ Xato: {e}")
@@ -543,7 +551,7 @@ async def item_delete(cb: CallbackQuery):
     if not _has(db, "delete_material"):
         await cb.message.answer("ℹ️ DB.delete_material mavjud emas."); return
     try:
-        db.delete_material(mid)
+        await db.delete_material(mid)
         await cb.message.answer("🗑 O‘chirildi.")
     except Exception as e:
         await cb.message.answer(f"❌ Xato: {e}")
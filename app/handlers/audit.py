@@ -3,28 +3,32 @@
 
 import calendar
 import datetime as dt
-import itertools
 import re
-from typing import Dict, Any, List, Tuple
+from typing import List, Tuple
 
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
 
 from loguru import logger
 from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
 
 from ..locales import L
 from ..storage.memory import get_lang, get_profile
+from ..storage.bookings import (
+    bookings, mask_slots, SlotTaken, FULL_MASK, SLOTS,
+    STATUS_PENDING, STATUS_APPROVED, STATUS_CANCELED, STATUS_RETIME,
+)
 from ..config import settings
+from ..scheduler import scheduler, local_epoch
+from ..fanout import fanout_first, FanoutResult
 
 router = Router()
 
-# --- In-memory (demo) ---
-BOOKINGS: Dict[int, Dict[str, Any]] = {}
-BOOKING_SEQ = itertools.count(1001)
-PENDING_RETIME: Dict[int, int] = {}  # user_id -> booking_id
+# Tasdiqlangan bron uchun eslatmalar: (tur, uchrashuvgacha soniya)
+_REMINDERS = (("day", 24 * 3600), ("hour", 3600))
 
 # --- Time parser ---
 _TIME_RE = re.compile(
@@ -32,38 +36,32 @@ _TIME_RE = re.compile(
     re.IGNORECASE,
 )
 
+def _admin_log(kind: str):
+    def hook(res: FanoutResult) -> None:
+        if res.ok:
+            logger.info(f"Admin notify -> {kind} {res.target}: OK")
+        elif isinstance(res.error, (TelegramBadRequest, TelegramForbiddenError)):
+            logger.warning(f"Admin notify -> {kind} {res.target}: {res.error}")
+        else:
+            logger.opt(exception=res.error).error(f"Admin notify -> {kind} {res.target}: {res.error}")
+    return hook
+
 async def _notify_admins(bot, text: str, kb=None) -> bool:
-    groups = []
-    if getattr(settings, "admin_group_ids", None):
-        groups.extend(settings.admin_group_ids)
-    elif getattr(settings, "ADMIN_GROUP_ID", None):
+    """
+    Admin guruh(lar)iga parallel yuboradi; birinchi guruh xabarni olishi bilan
+    qaytadi (qolganlari fonda). Hech bir guruhga yetmasa — admin_ids ga.
+    """
+    groups = list(getattr(settings, "admin_group_ids", None) or [])
+    if not groups and getattr(settings, "ADMIN_GROUP_ID", None):
         groups.append(settings.ADMIN_GROUP_ID)
 
-    sent_any = False
-    for gid in groups:
-        if not gid:
-            continue
-        try:
-            await bot.send_message(gid, text, reply_markup=kb, parse_mode="HTML")
-            logger.info(f"Admin notify -> group {gid}: OK")
-            sent_any = True
-        except (TelegramBadRequest, TelegramForbiddenError) as e:
-            logger.warning(f"Admin notify -> group {gid}: {e}")
-        except Exception as e:
-            logger.exception(f"Admin notify -> group {gid}: {e}")
-
-    if not sent_any and getattr(settings, "admin_ids", None):
-        for uid in settings.admin_ids:
-            try:
-                await bot.send_message(uid, text, reply_markup=kb, parse_mode="HTML")
-                logger.info(f"Admin notify -> user {uid}: OK")
-                sent_any = True
-            except (TelegramBadRequest, TelegramForbiddenError) as e:
-                logger.warning(f"Admin notify -> user {uid}: {e}")
-            except Exception as e:
-                logger.exception(f"Admin notify -> user {uid}: {e}")
-
-    return sent_any
+    def send(chat_id: int):
+        return bot.send_message(chat_id, text, reply_markup=kb, parse_mode="HTML")
+
+    if await fanout_first(groups, send, on_result=_admin_log("group")):
+        return True
+    admins = getattr(settings, "admin_ids", None) or []
+    return await fanout_first(admins, send, on_result=_admin_log("user")) is not None
 
 def _parse_time(text: str) -> str | None:
     if not text:
@@ -95,6 +93,9 @@ class AuditFSM(StatesGroup):
     TIME_MANUAL = State()
     REVIEW = State()
 
+class RetimeFSM(StatesGroup):
+    WAIT = State()   # admin "rt" bosgan — foydalanuvchidan yangi vaqt kutiladi
+
 # --- Helpers ---
 def _t(lang: str) -> dict:
     return L.get(lang, L["uz"])
@@ -118,19 +119,11 @@ def _days_in_month(y: int, m: int) -> int:
     return calendar.monthrange(y, m)[1]
 
 def _time_slots() -> List[str]:
-    return [f"{h:02d}:00" for h in range(8, 20)]  # 08:00..19:00
-
-def _booked_slots_for_date(year: int, month: int, day: int) -> set[str]:
-    taken: set[str] = set()
-    for b in BOOKINGS.values():
-        if b.get("status") == "approved" and b.get("year") == year and b.get("month") == month and b.get("day") == day:
-            t = b.get("time")
-            if t:
-                taken.add(str(t))
-    return taken
+    return list(SLOTS)  # 08:00..19:00 (bookings.SLOTS — bitmaska bilan bir xil tartib)
 
-def _is_taken(year: int, month: int, day: int, time_s: str) -> bool:
-    return time_s in _booked_slots_for_date(year, month, day)
+async def _is_taken(year: int, month: int, day: int, time_s: str) -> bool:
+    # aniq vaqt bo‘yicha (qo‘lda kiritilgan 14:30 ham) — bitta indeks SEARCH
+    return await bookings.is_taken(year, month, day, time_s)
 
 def _admin_booking_text(t: dict, b: dict) -> str:
     prof = b.get("profile", {})
@@ -163,7 +156,7 @@ def _user_review_text(t: dict, b: dict) -> str:
 # === Entry (MAIN CHANGE — website button opens URL directly) ===
 @router.message(F.text.func(lambda s: s in {L["uz"]["btn_audit"], L["en"]["btn_audit"], L["ru"]["btn_audit"]}))
 async def audit_entry(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = _t(lang)
     url = getattr(settings, "AUDIT_WEBSITE_URL", "https://mcompany.uz/audit/starter/")
     kb = _ikb([_row(
@@ -175,7 +168,7 @@ async def audit_entry(message: Message):
 # (Optional legacy handler; URL tugma callback yubormaydi, lekin qoldiramiz)
 @router.callback_query(F.data == "audit:web")
 async def audit_web(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     url = getattr(settings, "AUDIT_WEBSITE_URL", "https://mcompany.uz/audit/starter/")
     kb = _ikb([
         _row(InlineKeyboardButton(text=t.get("more_btn", "🔗 O‘tish"), url=url)),
@@ -186,7 +179,7 @@ async def audit_web(cb: CallbackQuery):
 
 @router.callback_query(F.data == "audit:back")
 async def audit_back(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     url = getattr(settings, "AUDIT_WEBSITE_URL", "https://mcompany.uz/audit/starter/")
     kb = _ikb([_row(
         InlineKeyboardButton(text=t.get("audit_web", "🌐 Veb-sayt"), url=url),          # <-- URL ham bu yerda
@@ -198,7 +191,7 @@ async def audit_back(cb: CallbackQuery):
 # --- Booking flow (unchanged) ---
 @router.callback_query(F.data == "audit:book")
 async def audit_book(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     await cb.answer()
     await state.clear()
     await state.update_data(lang=lang, user_id=cb.from_user.id, chat_id=cb.message.chat.id, status="pending")
@@ -208,7 +201,7 @@ async def audit_book(cb: CallbackQuery, state: FSMContext):
 @router.message(AuditFSM.BIZ_NAME)
 async def aud_take_name(message: Message, state: FSMContext):
     name = (message.text or "").strip()
-    lang = get_lang(message.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(message.from_user.id, "uz"); t = _t(lang)
     if not name:
         await message.answer(t["aud_ask_biz_name"]); return
     await state.update_data(biz_name=name)
@@ -218,7 +211,7 @@ async def aud_take_name(message: Message, state: FSMContext):
 @router.message(AuditFSM.BIZ_DESC)
 async def aud_take_desc(message: Message, state: FSMContext):
     desc = (message.text or "").strip()
-    lang = get_lang(message.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(message.from_user.id, "uz"); t = _t(lang)
     if not desc:
         await message.answer(t["aud_ask_biz_desc"]); return
     await state.update_data(biz_desc=desc)
@@ -232,7 +225,7 @@ async def aud_take_desc(message: Message, state: FSMContext):
 
 @router.callback_query(AuditFSM.REVENUE, F.data.startswith("aud:rev:"))
 async def aud_take_revenue(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     key = cb.data.split(":")[-1]
     rev_map = {"low": t["aud_rev_low"], "mid": t["aud_rev_mid"], "high": t["aud_rev_high"]}
     await state.update_data(revenue=rev_map.get(key, key))
@@ -250,16 +243,21 @@ async def aud_take_revenue(cb: CallbackQuery, state: FSMContext):
 
 @router.callback_query(AuditFSM.MONTH, F.data.startswith("aud:mo:"))
 async def aud_take_month(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     month = int(cb.data.split(":")[-1])
     year = dt.date.today().year
     await state.update_data(month=month, year=year)
     await cb.answer()
 
     ndays = _days_in_month(year, month)
+    # Butun oy bandligi — bitta o‘qish; to‘liq band kunlar kulrang (tanlab bo‘lmaydi)
+    masks = await bookings.month_masks(year, month)
     rows, row = [], []
     for d in range(1, ndays + 1):
-        row.append(InlineKeyboardButton(text=str(d), callback_data=f"aud:day:{d}"))
+        if masks.get(d, 0) & FULL_MASK == FULL_MASK:
+            row.append(InlineKeyboardButton(text=f"▫️{d}", callback_data="aud:dayfull"))
+        else:
+            row.append(InlineKeyboardButton(text=str(d), callback_data=f"aud:day:{d}"))
         if len(row) == 7:
             rows.append(_row(*row)); row = []
     if row: rows.append(_row(*row))
@@ -268,14 +266,17 @@ async def aud_take_month(cb: CallbackQuery, state: FSMContext):
 
 @router.callback_query(AuditFSM.DAY, F.data.startswith("aud:day:"))
 async def aud_take_day(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     day = int(cb.data.split(":")[-1])
     await state.update_data(day=day)
     await cb.answer()
 
     data = await state.get_data()
-    taken = _booked_slots_for_date(data["year"], data["month"], day)
+    await cb.message.answer(t["aud_pick_time"], reply_markup=await _time_kb(t, data["year"], data["month"], day))
+    await state.set_state(AuditFSM.TIME)
 
+async def _time_kb(t: dict, year: int, month: int, day: int) -> InlineKeyboardMarkup:
+    taken = mask_slots(await bookings.day_mask(year, month, day))
     rows, row = [], []
     for s in _time_slots():
         if s in taken:
@@ -286,17 +287,21 @@ async def aud_take_day(cb: CallbackQuery, state: FSMContext):
             rows.append(_row(*row)); row = []
     if row: rows.append(_row(*row))
     rows.append(_row(InlineKeyboardButton(text=t["aud_time_manual"], callback_data="aud:time:manual")))
-    await cb.message.answer(t["aud_pick_time"], reply_markup=_ikb(rows))
-    await state.set_state(AuditFSM.TIME)
+    return _ikb(rows)
 
 @router.callback_query(F.data == "aud:noop")
 async def aud_noop(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     await cb.answer(_t(lang).get("aud_slot_taken", "Bu vaqt band."), show_alert=False)
 
+@router.callback_query(F.data == "aud:dayfull")
+async def aud_day_full(cb: CallbackQuery):
+    lang = await get_lang(cb.from_user.id, "uz")
+    await cb.answer(_t(lang).get("aud_day_full", "Bu kunda bo‘sh vaqt yo‘q."), show_alert=False)
+
 @router.callback_query(AuditFSM.TIME, F.data.startswith("aud:time:"))
 async def aud_take_time(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     _, _, val = cb.data.partition("aud:time:")
     await cb.answer()
 
@@ -306,7 +311,7 @@ async def aud_take_time(cb: CallbackQuery, state: FSMContext):
         return
 
     data = await state.get_data()
-    if _is_taken(data["year"], data["month"], data["day"], val):
+    if await _is_taken(data["year"], data["month"], data["day"], val):
         await cb.message.answer(t.get("aud_slot_taken", "Bu vaqt band. Iltimos, boshqa vaqt tanlang."))
         return
 
@@ -315,7 +320,7 @@ async def aud_take_time(cb: CallbackQuery, state: FSMContext):
 
 @router.message(AuditFSM.TIME_MANUAL)
 async def aud_take_time_manual(message: Message, state: FSMContext):
-    lang = get_lang(message.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(message.from_user.id, "uz"); t = _t(lang)
     ts = _parse_time(message.text or "")
     if not ts:
         await message.answer(t["aud_time_invalid"], parse_mode="HTML"); return
@@ -325,7 +330,7 @@ async def aud_take_time_manual(message: Message, state: FSMContext):
         await message.answer(t["aud_time_invalid"], parse_mode="HTML"); return
 
     data = await state.get_data()
-    if _is_taken(data["year"], data["month"], data["day"], ts):
+    if await _is_taken(data["year"], data["month"], data["day"], ts):
         await message.answer(t.get("aud_slot_taken", "Bu vaqt band. Iltimos, boshqa vaqt tanlang."))
         return
 
@@ -335,7 +340,7 @@ async def aud_take_time_manual(message: Message, state: FSMContext):
 async def _show_review(msg: Message, state: FSMContext, lang: str):
     t = _t(lang)
     data = await state.get_data()
-    prof = get_profile(data.get("user_id") or msg.chat.id) or {}
+    prof = await get_profile(data.get("user_id") or msg.chat.id) or {}
     prof.setdefault("user_id", data.get("user_id") or msg.chat.id)
     data.update(profile=prof, lang=lang)
     await state.update_data(**data)
@@ -352,14 +357,14 @@ async def _show_review(msg: Message, state: FSMContext, lang: str):
 # --- Review actions ---
 @router.callback_query(AuditFSM.REVIEW, F.data == "aud:cancel")
 async def aud_cancel(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     await cb.answer("❌")
     await state.clear()
     await cb.message.answer(t["aud_canceled"])
 
 @router.callback_query(AuditFSM.REVIEW, F.data == "aud:edit")
 async def aud_edit(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     kb = _ikb([
         _row(
             InlineKeyboardButton(text=t["aud_edit_biz_name"], callback_data="aud:edit:name"),
@@ -376,7 +381,7 @@ async def aud_edit(cb: CallbackQuery):
 @router.callback_query(AuditFSM.REVIEW, F.data.startswith("aud:edit:"))
 async def aud_edit_switch(cb: CallbackQuery, state: FSMContext):
     part = cb.data.split(":")[-1]
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     await cb.answer()
     if part == "name":
         await cb.message.answer(t["aud_ask_biz_name"]); await state.set_state(AuditFSM.BIZ_NAME)
@@ -402,21 +407,34 @@ async def aud_edit_switch(cb: CallbackQuery, state: FSMContext):
 
 @router.callback_query(AuditFSM.REVIEW, F.data == "aud:confirm")
 async def aud_confirm(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     data = await state.get_data()
-    await cb.answer("✅")
 
-    bid = next(BOOKING_SEQ)
     data.update({
-        "booking_id": bid,
         "user_id": data.get("user_id") or cb.from_user.id,
         "chat_id": data.get("chat_id") or cb.message.chat.id,
-        "profile": get_profile(cb.from_user.id) or {},
+        "profile": await get_profile(cb.from_user.id) or {},
         "lang": lang,
         "status": "pending",
     })
     data["profile"].setdefault("user_id", data["user_id"])
-    BOOKINGS[bid] = data
+    try:
+        # Atomar: bir vaqtda tasdiqlagan ikki foydalanuvchidan faqat bittasi slotni oladi
+        bid = await bookings.reserve(
+            user_id=data["user_id"], chat_id=data["chat_id"], lang=lang,
+            year=data["year"], month=data["month"], day=data["day"], time=data["time"],
+            biz_name=data.get("biz_name"), biz_desc=data.get("biz_desc"), revenue=data.get("revenue"),
+            profile=data["profile"],
+        )
+    except SlotTaken:
+        await cb.answer(t.get("aud_slot_taken", "Bu vaqt band."), show_alert=True)
+        await cb.message.answer(
+            t["aud_pick_time"], reply_markup=await _time_kb(t, data["year"], data["month"], data["day"])
+        )
+        await state.set_state(AuditFSM.TIME)
+        return
+    await cb.answer("✅")
+    data["booking_id"] = bid
 
     await cb.message.answer(t["aud_sent_to_admins"])
     await state.clear()
@@ -427,73 +445,113 @@ async def aud_confirm(cb: CallbackQuery, state: FSMContext):
         InlineKeyboardButton(text=t["aud_admin_retime"],  callback_data=f"audadmin:rt:{bid}"),
         InlineKeyboardButton(text=t["aud_admin_cancel"],  callback_data=f"audadmin:cn:{bid}"),
     )])
-    await cb.message.bot.send_message(
-        chat_id=getattr(settings, "ADMIN_GROUP_ID", getattr(settings, "faq_group_id", -1001234567890)),
-        text=text, reply_markup=kb, parse_mode="HTML"
-    )
+    if not await _notify_admins(cb.message.bot, text, kb):
+        logger.error(f"Booking #{bid}: no admin chat received the request")
 
 # --- Admin actions ---
+# action -> (yangi holat, qaysi holatlardan o‘tish mumkin)
+_ADMIN_TRANSITIONS = {
+    "ok": (STATUS_APPROVED, (STATUS_PENDING,)),
+    "rt": (STATUS_RETIME, (STATUS_PENDING, STATUS_APPROVED)),
+    "cn": (STATUS_CANCELED, (STATUS_PENDING, STATUS_APPROVED, STATUS_RETIME)),
+}
+
 @router.callback_query(F.data.startswith("audadmin:"))
-async def admin_actions(cb: CallbackQuery):
+async def admin_actions(cb: CallbackQuery, fsm_storage: BaseStorage):
     parts = cb.data.split(":")
     action, bid = parts[1], int(parts[2])
-    booking = BOOKINGS.get(bid)
-    if not booking:
+    booking = await bookings.get(bid)
+    if not booking or action not in _ADMIN_TRANSITIONS:
         await cb.answer("Not found", show_alert=True); return
 
     user_id = booking.get("user_id")
     lang = booking.get("lang", "uz")
     t = _t(lang)
+
+    # Compare-and-set: ikki admin bir vaqtda bossa, faqat birinchisi o‘tadi
+    status, expect = _ADMIN_TRANSITIONS[action]
+    if not await bookings.set_status(bid, status, expect=expect):
+        current = (await bookings.get(bid) or booking).get("status")
+        await cb.answer(f"⚠️ #{bid}: {current}", show_alert=True); return
     await cb.answer()
 
     if action == "ok":
-        booking["status"] = "approved"
         if user_id:
             await cb.message.bot.send_message(user_id, t["aud_user_approved"])
+            await _schedule_reminders(booking)
         await cb.message.edit_reply_markup(reply_markup=None)
 
     elif action == "rt":
-        booking["status"] = "retime_requested"
+        await scheduler.cancel(f"booking:{bid}")
         if user_id:
-            PENDING_RETIME[user_id] = bid
+            # Foydalanuvchining shaxsiy chati holati: faqat shu holatda matn vaqt deb olinadi
+            key = StorageKey(bot_id=cb.bot.id, chat_id=int(user_id), user_id=int(user_id))
+            await FSMContext(fsm_storage, key).set_state(RetimeFSM.WAIT)
             await cb.message.bot.send_message(user_id, t["aud_user_retime"], parse_mode="HTML")
         await cb.message.edit_reply_markup(reply_markup=None)
 
     elif action == "cn":
-        booking["status"] = "canceled"
+        await scheduler.cancel(f"booking:{bid}")
         if user_id:
             await cb.message.bot.send_message(user_id, t["aud_user_canceled"])
         await cb.message.edit_reply_markup(reply_markup=None)
 
-# --- User sends new time after admin retime request ---
-@router.message(F.text)
-async def handle_retime_if_pending(message: Message):
-    user_id = message.from_user.id
-    if user_id not in PENDING_RETIME:
+# --- Reminders (app/scheduler.py) ---
+async def _schedule_reminders(booking: dict) -> None:
+    try:
+        at = local_epoch(booking["year"], booking["month"], booking["day"], booking["time"])
+    except (ValueError, KeyError):
+        return
+    now = int(dt.datetime.now(dt.timezone.utc).timestamp())
+    for kind, before in _REMINDERS:
+        run_at = at - before
+        if run_at <= now:
+            continue  # masalan, 1 soatdan kamroq qolganda tasdiqlansa
+        await scheduler.schedule(
+            "audit_reminder", run_at,
+            {"booking_id": booking["id"], "kind": kind, "at": at},
+            ref=f"booking:{booking['id']}",
+        )
+
+@scheduler.handler("audit_reminder")
+async def _send_reminder(bot, payload: dict) -> None:
+    booking = await bookings.get(int(payload.get("booking_id") or 0))
+    # Bron o‘zgargan/bekor qilingan yoki uchrashuv o‘tib ketgan bo‘lsa — jim
+    if not booking or booking["status"] != STATUS_APPROVED:
+        return
+    if int(dt.datetime.now(dt.timezone.utc).timestamp()) >= int(payload.get("at") or 0):
         return
+    t = _t(booking.get("lang") or "uz")
+    key = "aud_remind_day" if payload.get("kind") == "day" else "aud_remind_hour"
+    await bot.send_message(booking["user_id"], t[key].format(time=booking["time"]))
 
-    bid = PENDING_RETIME.pop(user_id)
-    booking = BOOKINGS.get(bid)
+# --- User sends new time after admin retime request ---
+# Vaqtga o‘xshamagan matn boshqa handlerlarga o‘tadi (holat saqlanadi)
+@router.message(RetimeFSM.WAIT, F.text.func(_parse_time))
+async def handle_retime_if_pending(message: Message, state: FSMContext):
+    user_id = message.from_user.id
+    # Bron retime_requested holatida qoladi — noto‘g‘ri vaqtdan so‘ng ham qayta yuborish mumkin
+    booking = await bookings.pending_retime(user_id)
     if not booking:
+        await state.clear()  # admin orada tasdiqladi/bekor qildi
         return
+    bid = booking["id"]
 
     ts = _parse_time(message.text or "")
-    if not ts:
-        await message.answer("❗️ Noto‘g‘ri vaqt. Namuna: 14:00"); return
-
     hh, mm = map(int, ts.split(":"))
     minutes = hh * 60 + mm
     if not (8 * 60 <= minutes <= 19 * 60):
         await message.answer("❗️ Vaqt 08:00–19:00 oralig‘ida bo‘lishi kerak."); return
 
-    if _is_taken(booking["year"], booking["month"], booking["day"], ts):
+    try:
+        # Oldindan _is_taken so‘ramaymiz: UNIQUE indeks atomar hakam
+        if not await bookings.retime(bid, ts):
+            await state.clear()
+            return
+    except SlotTaken:
         await message.answer("❗️ Bu vaqt allaqachon band. Iltimos, boshqa vaqt tanlang."); return
-
     booking["time"] = ts
-    booking["status"] = "pending"
+    await state.clear()
 
     await message.answer("✅ Yangi vaqt qabul qilindi.")
-    await message.bot.send_message(
-        chat_id=getattr(settings, "ADMIN_GROUP_ID", getattr(settings, "faq_group_id", -1001234567890)),
-        text=f"♻️ Booking #{bid} — user updated time to {booking['time']}",
-    )
+    await _notify_admins(message.bot, f"♻️ Booking #{bid} — user updated time to {booking['time']}")
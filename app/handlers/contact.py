@@ -72,7 +72,7 @@ async def _safe_cb_answer(cb: CallbackQuery, *args, **kwargs):
 # ---------- Entry: Reply tugmadan ----------
 @router.message(F.text.in_(CONTACT_BTNS))
 async def contact_entry(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = _t(lang)
     await message.answer(t["contact_title"], reply_markup=_main_kb(lang))
 
@@ -80,7 +80,7 @@ async def contact_entry(message: Message):
 # ---------- Entry: Welcome inline tugmadan ----------
 @router.callback_query(F.data == "nav:contact")
 async def nav_contact(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     await _safe_cb_answer(cb)
     t = _t(lang)
     await cb.message.answer(t["contact_title"], reply_markup=_main_kb(lang))
@@ -89,7 +89,7 @@ async def nav_contact(cb: CallbackQuery):
 # ---------- Address ----------
 @router.callback_query(F.data == "contact:addr")
 async def contact_addr(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     await _safe_cb_answer(cb)
 
     title = t.get("contact_addr_title") or "M Company Office"
@@ -125,7 +125,7 @@ async def contact_addr(cb: CallbackQuery):
 # ---------- Email ----------
 @router.callback_query(F.data == "contact:mail")
 async def contact_mail(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
     await _safe_cb_answer(cb)
 
@@ -140,7 +140,7 @@ async def contact_mail(cb: CallbackQuery):
 # ---------- Call (to‘g‘ridan-to‘g‘ri) ----------
 @router.callback_query(F.data == "contact:call")
 async def contact_call(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz"); t = _t(lang)
+    lang = await get_lang(cb.from_user.id, "uz"); t = _t(lang)
     await _safe_cb_answer(cb)
 
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -160,7 +160,7 @@ async def contact_call(cb: CallbackQuery):
 # ---------- Working hours ----------
 @router.callback_query(F.data == "contact:hours")
 async def contact_hours(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
     await _safe_cb_answer(cb)
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -172,14 +172,14 @@ async def contact_hours(cb: CallbackQuery):
 # ---------- Social ----------
 @router.callback_query(F.data == "contact:social")
 async def contact_social(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
     await _safe_cb_answer(cb)
     await cb.message.answer(f"🌐 {t['contact_social_title']}", reply_markup=_social_kb(lang))
 
 @router.callback_query(F.data == "social:tg")
 async def social_tg(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
     await _safe_cb_answer(cb)
     kb = InlineKeyboardMarkup(inline_keyboard=[
@@ -192,7 +192,7 @@ async def social_tg(cb: CallbackQuery):
 # ---------- Back to Contact main ----------
 @router.callback_query(F.data == "contact:back")
 async def contact_back(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
     await _safe_cb_answer(cb)
     await cb.message.answer(t["contact_title"], reply_markup=_main_kb(lang))
@@ -1,7 +1,8 @@
 
 from __future__ import annotations
 
-from typing import Dict, List, Tuple
+import time
+from typing import List
 from aiogram import Router, F
 from aiogram.types import (
     Message, CallbackQuery,
@@ -10,10 +11,14 @@ from aiogram.types import (
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 from aiogram.filters import Command
+from loguru import logger
 
 from ..locales import L
 from ..storage.memory import get_lang, get_phone
+from ..storage.faq_links import faq_links
 from ..config import settings
+from ..fanout import fanout_first, FanoutResult
+from ..scheduler import scheduler
 
 router = Router()
 
@@ -38,8 +43,10 @@ class AskQuestion(StatesGroup):
     waiting_text = State()
 
 # --- Guruhga yuborilgan savol bilan foydalanuvchini bog‘lash (guruh_id, msg_id) -> user_info ---
-# Eslatma: Bu xotira ichida saqlanadi (process qayta ishga tushsa yo‘qoladi).
-QUESTION_LINK: Dict[Tuple[int, int], Dict[str, str | int]] = {}
+# Bazada saqlanadi (storage/faq_links.py): qayta ishga tushgandan keyin ham reply ishlaydi,
+# muddati o‘tganlari rejalashtiruvchi orqali har kuni tozalanadi.
+_PRUNE_REF = "faq_links:prune"
+_PRUNE_EVERY = 24 * 3600
 
 
 def _faq_keyboard(lang: str) -> InlineKeyboardMarkup:
@@ -84,14 +91,14 @@ def _back_kb(lang: str) -> InlineKeyboardMarkup:
 @router.message(F.text.in_(FAQ_BTNS))
 async def faq_entry(message: Message):
     """FAQ bo'limini ko'rsatish."""
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = L[lang]
     await message.answer(t["faq_title"], reply_markup=_faq_keyboard(lang))
 
 
 @router.callback_query(F.data == "faq:back")
 async def faq_back(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L[lang]
     await cb.answer()
     await cb.message.answer(t["faq_title"], reply_markup=_faq_keyboard(lang))
@@ -100,7 +107,7 @@ async def faq_back(cb: CallbackQuery):
 # --- Savollarga javob beruvchi handler ---
 @router.callback_query(F.data.startswith("faq:q"))
 async def faq_answer(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L[lang]
     key = cb.data.split(":", 1)[1]  # q1..q7
     ans_key = f"faq_a{key[1:]}"     # a1..a7
@@ -112,7 +119,7 @@ async def faq_answer(cb: CallbackQuery):
 # --- Savol berish oqimi (foydalanuvchidan matn) ---
 @router.callback_query(F.data == "faq:ask")
 async def faq_ask_start(cb: CallbackQuery, state: FSMContext):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L[lang]
     await cb.answer()
     await state.set_state(AskQuestion.waiting_text)
@@ -127,7 +134,7 @@ async def faq_receive_question(message: Message, state: FSMContext):
     """Foydalanuvchi savolini qabul qiladi va M Company guruh(lar)i ga yuboradi.
     Guruhda admin(lar) shu xabarga REPLY qilib javob yozsa, bot javobni foydalanuvchiga yuboradi.
     """
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = L[lang]
 
     text = (message.text or "").strip()
@@ -139,7 +146,7 @@ async def faq_receive_question(message: Message, state: FSMContext):
     u = message.from_user
     display = u.full_name or u.first_name or "User"
     uname = f"@{u.username}" if u.username else "—"
-    phone = get_phone(u.id , default="None")
+    phone = await get_phone(u.id , default="None")
     if not FAQ_GROUP_IDS:
         await message.answer("⚠️ FAQ guruhi sozlanmagan. Administratorga murojaat qiling.")
         await state.clear()
@@ -155,24 +162,22 @@ async def faq_receive_question(message: Message, state: FSMContext):
         "ℹ️ <i>Javob berish uchun shu xabarga <b>reply</b> yozing — foydalanuvchiga DM sifatida yuboriladi.</i>"
     )
 
-    sent_something = False
-    for gid in FAQ_GROUP_IDS:
-        try:
-            sent = await message.bot.send_message(
-                chat_id=gid,
-                text=payload,
-                parse_mode="HTML"
-            )
-            # Bog'lash: (guruh_id, guruh_msg_id) -> foydalanuvchi
-            QUESTION_LINK[(sent.chat.id, sent.message_id)] = {
-                "user_id": u.id,
-                "first_name": u.first_name or display,
-                "lang": lang,
-            }
-            sent_something = True
-        except Exception as e:
+    def send(gid: int):
+        return message.bot.send_message(chat_id=gid, text=payload, parse_mode="HTML")
+
+    async def link(res: FanoutResult) -> None:
+        if not res.ok:
             # Guruhga yuborib bo'lmadi (bot a'zo emas / chat not found / bloklangan)
-            await message.answer(f"⚠️ Guruh {gid} ga yuborilmadi: {e}")
+            logger.warning(f"FAQ question -> group {res.target}: {res.error}")
+            return
+        # Bog'lash: (guruh_id, guruh_msg_id) -> foydalanuvchi
+        await faq_links.put(
+            res.message.chat.id, res.message.message_id,
+            user_id=u.id, first_name=u.first_name or display, lang=lang,
+        )
+
+    # Guruhlarga parallel; birinchi guruh olishi bilan foydalanuvchiga javob beramiz
+    sent_something = await fanout_first(FAQ_GROUP_IDS, send, on_result=link) is not None
 
     if sent_something:
         await message.answer(f"✅ {t['faq_ask_received']}")
@@ -201,12 +206,12 @@ async def group_reply_router(message: Message):
         return
 
     key = (message.chat.id, ref.message_id)
-    link = QUESTION_LINK.get(key)
+    link = await faq_links.get(*key)
     if not link:
         return  # Bu reply biz bog'lagan savolga tegishli emas
 
     user_id = int(link["user_id"])
-    first_name = str(link.get("first_name", ""))
+    first_name = str(link.get("first_name") or "")
     # Javob matni (matn yoki media caption)
     body = (message.text or message.caption or "").strip()
 
@@ -236,6 +241,25 @@ async def group_reply_router(message: Message):
         pass
 
 
+# --- Muddati o'tgan bog'lanishlarni tozalash (app/scheduler.py) ---
+async def schedule_link_prune() -> None:
+    """Ishga tushishda chaqiriladi: eski zanjirni bekor qilib, keyingi tozalashni rejalashtiradi."""
+    await scheduler.cancel(_PRUNE_REF)
+    await scheduler.schedule("faq_links_prune", int(time.time()) + 60, ref=_PRUNE_REF)
+
+
+@scheduler.handler("faq_links_prune")
+async def _prune_links(bot, payload: dict) -> None:
+    # Xato bo'lsa ham zanjir uzilmasin (qayta urinish o'rniga ertangi tozalash)
+    try:
+        n = await faq_links.prune()
+        if n:
+            logger.info(f"🧹 FAQ links pruned: {n}")
+    except Exception as e:
+        logger.warning(f"FAQ links prune failed: {e}")
+    await scheduler.schedule("faq_links_prune", int(time.time()) + _PRUNE_EVERY, ref=_PRUNE_REF)
+
+
 # --- Qo'shimcha: Guruh ID topish uchun /id ---
 @router.message(Command("id"))
 async def chat_id_echo(message: Message):
@@ -5,14 +5,7 @@ from loguru import logger
 
 from ..locales import L
 from ..config import settings
-from ..storage.db import db
-from ..storage.memory import get_lang
-
-# optional memory setter (agar mavjud bo'lsa)
-try:
-    from ..storage.memory import set_lang as memory_set_lang  # type: ignore
-except Exception:
-    memory_set_lang = None  # type: ignore
+from ..middlewares import UserContext
 
 from .onboarding import start_onboarding
 from .main_menu import show_main_menu, get_main_menu_kb
@@ -30,33 +23,23 @@ def _lang_kb() -> InlineKeyboardMarkup:
 
 
 @router.message(Command("lang"))
-async def cmd_lang(message: Message):
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+async def cmd_lang(message: Message, user_ctx: UserContext):
+    lang = user_ctx.lang_or(settings.DEFAULT_LANG)
     t = L.get(lang, L["uz"])
     await message.answer(t.get("choose_lang", "Tilni tanlang:"), reply_markup=_lang_kb())
 
 
 @router.callback_query(F.data.startswith("lang:"))
-async def set_language(cb: CallbackQuery):
+async def set_language(cb: CallbackQuery, user_ctx: UserContext):
     lang = cb.data.split(":", 1)[1].strip().lower()
     if lang not in {"uz", "ru", "en"}:
         lang = "uz"
     
     uid = cb.from_user.id
     
-    # Tilni DB ga saqlash
-    try:
-        db.set_lang(uid, lang)
-        logger.info(f"✅ Language set to '{lang}' for user {uid}")
-    except Exception as e:
-        logger.error(f"❌ db.set_lang failed: {e}")
-    
-    # Memory cache yangilash
-    if memory_set_lang:
-        try:
-            memory_set_lang(uid, lang)
-        except Exception:
-            pass
+    # Tilni saqlash: kesh darhol, DB — update oxirida (UserContextMiddleware)
+    user_ctx.set_lang(lang)
+    logger.info(f"✅ Language set to '{lang}' for user {uid}")
     
     t = L.get(lang, L["uz"])
     await cb.answer(t.get("lang_ok", "Saqlandi ✅"))
@@ -72,8 +55,7 @@ async def set_language(cb: CallbackQuery):
     await _show_welcome(cb.message, lang)
     
     # User onboarding holati tekshirish
-    u = db.get_user(uid)
-    if not u or not bool(u.get("onboarded", 0)):
+    if not user_ctx.onboarded:
         # Ism va telefonni so'raymiz
         logger.info(f"🎯 Starting onboarding for user {uid}")
         await start_onboarding(cb.message, lang)
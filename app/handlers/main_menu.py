@@ -54,7 +54,7 @@ async def get_main_menu_kb(lang: str, inline: bool = False):
 async def show_main_menu(message: Message, lang: str | None = None):
     """Asosiy menyuni reply tugmalar bilan ko‘rsatish."""
     if not lang:
-        lang = get_lang(message.from_user.id, "uz")
+        lang = await get_lang(message.from_user.id, "uz")
     t = _t(lang)
     await message.answer(t.get("menu_hint", "🟡 Asosiy menyu:"), reply_markup=build_main_kb(lang))
 
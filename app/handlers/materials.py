@@ -17,7 +17,7 @@ from ..storage.memory import get_lang
 
 # DB (kutilyotgan API: list_materials(category, lang, offset, limit) va get_material(id))
 try:
-    from ..storage.db import db  # type: ignore
+    from ..storage.db import adb as db  # type: ignore
 except Exception as e:
     db = None  # type: ignore
     logger.warning(f"Materials: DB import failed: {e}")
@@ -131,36 +131,42 @@ def _list_kb(
         prefix = "🔒" if paid else "✅"
         rows.append([InlineKeyboardButton(text=f"{prefix} {title}", callback_data=f"mat:open:{mat_id}")])
 
+    # callback: mat:cat:<cat>:<page>[:a|b:<cursor>] — keyset sahifalash
     nav: List[InlineKeyboardButton] = []
-    if has_prev:
-        nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"mat:cat:{cat}:{page-1}"))
+    if has_prev and items:
+        nav.append(InlineKeyboardButton(text="⬅️", callback_data=f"mat:cat:{cat}:{page-1}:b:{items[0]['cursor']}"))
     nav.append(InlineKeyboardButton(text=f"{page+1}", callback_data=f"noop:{page}"))
-    if has_next:
-        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"mat:cat:{cat}:{page+1}"))
+    if has_next and items:
+        nav.append(InlineKeyboardButton(text="➡️", callback_data=f"mat:cat:{cat}:{page+1}:a:{items[-1]['cursor']}"))
     if nav:
         rows.append(nav)
 
     rows.append([InlineKeyboardButton(text=_g(t, "materials_back", "⬅️ Orqaga"), callback_data="mat:back")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
+async def _fetch_page(cat: str, lang: str, direction: str = "", cursor: Optional[str] = None):
+    """(items, has_prev, has_next) — keyset: a=keyingi, b=oldingi, bo‘sh=birinchi sahifa."""
+    if direction == "b":
+        rows = await db.list_materials(category=cat, lang=lang, before=cursor, limit=PAGE_SIZE + 1)  # type: ignore[attr-defined]
+        return rows[-PAGE_SIZE:], len(rows) > PAGE_SIZE, True
+    rows = await db.list_materials(  # type: ignore[attr-defined]
+        category=cat, lang=lang, after=cursor if direction == "a" else None, limit=PAGE_SIZE + 1
+    )
+    return rows[:PAGE_SIZE], direction == "a", len(rows) > PAGE_SIZE
+
 async def _send_category_list_by_message(message: Message, lang: str, cat: str, page: int = 0):
     t = _t(lang)
     if not db or not hasattr(db, "list_materials"):
         await message.answer(_g(t, "materials_db_missing", "DB sozlanmagan."))
         return
 
-    offset = page * PAGE_SIZE
     try:
-        items = db.list_materials(category=cat, lang=lang, offset=offset, limit=PAGE_SIZE + 1)  # type: ignore[attr-defined]
+        items, has_prev, has_next = await _fetch_page(cat, lang)
     except Exception as e:
         logger.error(f"Materials DB error: {e}")
         await message.answer(_g(t, "materials_db_missing", "DBda xatolik yuz berdi."))
         return
 
-    has_next = len(items) > PAGE_SIZE
-    items = items[:PAGE_SIZE]
-    has_prev = page > 0
-
     if not items:
         await message.answer(_g(t, "materials_not_found", "Hozircha material yo'q."), reply_markup=_cat_kb(lang))
         return
@@ -176,7 +182,7 @@ async def _send_category_list_by_message(message: Message, lang: str, cat: str,
 
 @router.message(StateFilter(None), Command("materials"))     # ⬅️ FSM bo‘lmaganda
 async def materials_cmd(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = _t(lang)
     await message.answer(
         f"📚 <b>{_g(t, 'materials_title', 'Materiallar')}</b>\n\n{_g(t, 'materials_choose_cat', 'Kategoriya tanlang:')}",
@@ -192,7 +198,7 @@ def is_materials_button(text: str) -> bool:
 
 @router.message(StateFilter(None), F.text.func(is_materials_button))   # ⬅️ FSM bo‘lmaganda
 async def materials_entry(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = _t(lang)
     await message.answer(
         f"📚 <b>{_g(t, 'materials_title', 'Materiallar')}</b>\n\n{_g(t, 'materials_choose_cat', 'Kategoriya tanlang:')}",
@@ -209,7 +215,7 @@ def is_category_alias(text: str) -> bool:
 async def materials_entry_by_alias(message: Message):
     cat = CAT_ALIASES.get(_norm(message.text or ""), "")
     if cat in CAT_KEYS:
-        lang = get_lang(message.from_user.id, "uz")
+        lang = await get_lang(message.from_user.id, "uz")
         await _send_category_list_by_message(message, lang, cat, page=0)
 
 # ===================== List w/ pagination (callbacks) =====================
@@ -218,32 +224,28 @@ async def materials_entry_by_alias(message: Message):
 async def materials_list(cb: CallbackQuery):
     await _safe_cb_answer(cb)
     try:
-        _, _, cat, page_s = cb.data.split(":")
-        page = int(page_s)
+        parts = cb.data.split(":")
+        cat, page = parts[2], int(parts[3])
+        direction, cursor = (parts[4], parts[5]) if len(parts) >= 6 else ("", None)
     except Exception:
         return
     if cat not in CAT_KEYS:
         return
 
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
 
     if not db or not hasattr(db, "list_materials"):
         await cb.message.answer(_g(t, "materials_db_missing", "DB sozlanmagan."))
         return
 
-    offset = page * PAGE_SIZE
     try:
-        items = db.list_materials(category=cat, lang=lang, offset=offset, limit=PAGE_SIZE + 1)  # type: ignore[attr-defined]
+        items, has_prev, has_next = await _fetch_page(cat, lang, direction, cursor)
     except Exception as e:
         logger.error(f"Materials DB error: {e}")
         await cb.message.answer(_g(t, "materials_db_missing", "DBda xatolik yuz berdi."))
         return
 
-    has_next = len(items) > PAGE_SIZE
-    items = items[:PAGE_SIZE]
-    has_prev = page > 0
-
     if not items:
         await cb.message.answer(_g(t, "materials_not_found", "Hozircha material yo'q."), reply_markup=_cat_kb(lang))
         return
@@ -260,7 +262,7 @@ async def materials_list(cb: CallbackQuery):
 @router.callback_query(F.data.startswith("mat:open:"))
 async def material_open(cb: CallbackQuery):
     await _safe_cb_answer(cb)
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
 
     try:
@@ -272,7 +274,7 @@ async def material_open(cb: CallbackQuery):
         await cb.message.answer(_g(t, "materials_db_missing", "DB sozlanmagan."))
         return
 
-    it = db.get_material(mat_id)  # type: ignore[attr-defined]
+    it = await db.get_material(mat_id)  # type: ignore[attr-defined]
     if not it:
         await cb.message.answer(_g(t, "materials_not_found_one", "❌ Material topilmadi."))
         return
@@ -322,7 +324,7 @@ async def material_open(cb: CallbackQuery):
 @router.callback_query(F.data == "mat:back")
 async def materials_back(cb: CallbackQuery):
     await _safe_cb_answer(cb)
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = _t(lang)
     await cb.message.answer(
         f"📚 <b>{_g(t, 'materials_title', 'Materiallar')}</b>\n\n{_g(t, 'materials_choose_cat', 'Kategoriya tanlang:')}",
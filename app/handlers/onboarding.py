@@ -7,7 +7,7 @@ from loguru import logger
 
 from ..locales import L
 from ..config import settings
-from ..storage.db import db
+from ..middlewares import UserContext
 from ..storage.memory import get_lang
 from .main_menu import show_main_menu
 
@@ -36,24 +36,21 @@ def _clean_phone(raw: str) -> str:
 async def start_onboarding(message: Message, state: FSMContext, lang: str | None = None):
     """Start.py yoki lang.py dan chaqiriladi."""
     if not lang:
-        lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+        lang = await get_lang(message.from_user.id, settings.DEFAULT_LANG)
     t = _t(lang)
     await message.answer(t.get("ob_ask_name", t.get("onb_ask_name", "👋 Ismingizni yozing:")))
     await state.set_state(Onb.NAME)
 
 @router.message(Onb.NAME)
-async def take_name(message: Message, state: FSMContext):
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+async def take_name(message: Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang_or(settings.DEFAULT_LANG)
     t = _t(lang)
     name = (message.text or "").strip()
     if not name or len(name) < 2:
         await message.answer(t.get("ob_ask_name", "👋 Ismingizni yozing:"))
         return
 
-    try:
-        db.set_name(message.from_user.id, name)
-    except Exception as e:
-        logger.error(f"db.set_name failed: {e}")
+    user_ctx.set_name(name)
 
     await state.update_data(name=name)
     await message.answer(
@@ -63,8 +60,8 @@ async def take_name(message: Message, state: FSMContext):
     await state.set_state(Onb.PHONE)
 
 @router.message(Onb.PHONE, F.contact)
-async def take_phone_contact(message: Message, state: FSMContext):
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+async def take_phone_contact(message: Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang_or(settings.DEFAULT_LANG)
     t = _t(lang)
     phone = message.contact.phone_number if message.contact else None
     if not phone:
@@ -72,11 +69,8 @@ async def take_phone_contact(message: Message, state: FSMContext):
         return
     phone = _clean_phone(phone)
 
-    try:
-        db.set_phone(message.from_user.id, phone)
-        db.set_onboarded(message.from_user.id, True)
-    except Exception as e:
-        logger.error(f"db.set_phone/onboarded failed: {e}")
+    user_ctx.set_phone(phone)
+    user_ctx.set_onboarded(True)
 
     await state.clear()
     await message.answer(t.get("ob_saved_ok", t.get("onb_saved", "✅ Saqlandi.")))
@@ -84,8 +78,8 @@ async def take_phone_contact(message: Message, state: FSMContext):
     await show_main_menu(message, lang)
 
 @router.message(Onb.PHONE)
-async def take_phone_text(message: Message, state: FSMContext):
-    lang = get_lang(message.from_user.id, settings.DEFAULT_LANG)
+async def take_phone_text(message: Message, state: FSMContext, user_ctx: UserContext):
+    lang = user_ctx.lang_or(settings.DEFAULT_LANG)
     t = _t(lang)
     txt = (message.text or "").strip()
     if not txt:
@@ -99,11 +93,8 @@ async def take_phone_text(message: Message, state: FSMContext):
         await message.answer(t.get("ob_bad_phone", "❗️ Raqam formati noto‘g‘ri."), reply_markup=_share_phone_kb(lang))
         return
 
-    try:
-        db.set_phone(message.from_user.id, phone)
-        db.set_onboarded(message.from_user.id, True)
-    except Exception as e:
-        logger.error(f"db.set_phone/onboarded failed: {e}")
+    user_ctx.set_phone(phone)
+    user_ctx.set_onboarded(True)
 
     await state.clear()
     await message.answer(t.get("ob_saved_ok", t.get("onb_saved", "✅ Saqlandi.")))
@@ -291,14 +291,14 @@ async def _send_photo_resilient(cb: CallbackQuery, file: FSInputFile, *, caption
 # Reply tugma orqali kirish
 @router.message(F.text.in_(PROJECTS_BTNS))
 async def projects_entry(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = L.get(lang, L["uz"])
     await message.answer(t.get("projects_title", "Bizning loyihalar"), reply_markup=_kb_projects(lang))
 
 # Welcome inline tugmasi orqali kirish (bitta funksiya – ikki joydan ko‘rinadi)
 @router.callback_query(F.data == "nav:projects")
 async def nav_projects(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L.get(lang, L["uz"])
     await _safe_cb_answer(cb)
     await cb.message.answer(t.get("projects_title", "Bizning loyihalar"), reply_markup=_kb_projects(lang))
@@ -306,7 +306,7 @@ async def nav_projects(cb: CallbackQuery):
 # Orqaga – ro‘yxatga qaytish
 @router.callback_query(F.data == "prj:back")
 async def projects_back(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L.get(lang, L["uz"])
     await _safe_cb_answer(cb)
     await cb.message.answer(t.get("projects_title", "Bizning loyihalar"), reply_markup=_kb_projects(lang))
@@ -318,7 +318,7 @@ async def project_selected(cb: CallbackQuery):
     if key == "back":
         return
 
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L.get(lang, L["uz"])
 
     title = t.get(f"prj_{key}", "Fresh Line" if key == "fresh_line" else key.replace("_", " ").title())
@@ -123,13 +123,13 @@ def _one_message_caption(title: str, body: str, limit: int = CAPTION_LIMIT) -> s
 # === Handlers ===
 @router.message(F.text.in_(SERVICES_BTNS))
 async def services_entry(message: Message):
-    lang = get_lang(message.from_user.id, "uz")
+    lang = await get_lang(message.from_user.id, "uz")
     t = L.get(lang, L["uz"])
     await message.answer(t["services_intro"], reply_markup=_services_menu_kb(lang))
 
 @router.callback_query(F.data == "svc:back")
 async def services_back(cb: CallbackQuery):
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L.get(lang, L["uz"])
     await cb.answer()
     await cb.message.answer(t["services_intro"], reply_markup=_services_menu_kb(lang))
@@ -147,7 +147,7 @@ async def service_detail(cb: CallbackQuery):
         await cb.answer("...")
         return
 
-    lang = get_lang(cb.from_user.id, "uz")
+    lang = await get_lang(cb.from_user.id, "uz")
     t = L.get(lang, L["uz"])
     title = t.get(f"svc_{key}", key.title())
     body  = t.get(f"svc_{key}_body", t["stub"])
@@ -1,14 +1,14 @@
 import os
 from pathlib import Path
-from aiogram import Router
+from aiogram import F, Router
 from aiogram.filters import CommandStart, CommandObject
-from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import ChatMemberUpdated, Message, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 from loguru import logger
 
 from ..locales import L
 from ..config import settings
-from ..storage.db import db
-from ..storage.memory import get_lang
+from ..middlewares import UserContext
+from ..storage.db import adb
 from .main_menu import get_main_menu_kb, show_main_menu
 from .onboarding import start_onboarding
 
@@ -91,7 +91,7 @@ async def _show_welcome(message: Message, lang: str):
 
 # ===== ASOSIY START HANDLER =====
 @router.message(CommandStart())
-async def start(message: Message, command: CommandObject):
+async def start(message: Message, command: CommandObject, user_ctx: UserContext):
     """
     /start handler - har qanay /start ni ushlaydi
     (deep_link=True ni o'chirish orqali)
@@ -109,21 +109,10 @@ async def start(message: Message, command: CommandObject):
     if payload:
         logger.info(f"   Deep link payload: {payload}")
     
-    # DB'da foydalanuvchini yaratib qo'yamiz (agar bo'lmasa)
-    try:
-        db.upsert_user(
-            user_id=user.id,
-            username=user.username or None,
-            name=(user.full_name or "").strip() or None,
-        )
-        logger.debug(f"   User {user.id} upserted to DB")
-    except Exception as e:
-        logger.error(f"DB upsert_user failed: {e}")
-    
-    # DB'dagi holat
-    u = db.get_user(user.id) or {}
-    saved_lang = (u.get("lang") or "").strip().lower()
-    onboarded = bool(u.get("onboarded", 0))
+    # Foydalanuvchi qatori UserContextMiddleware da yuklangan (yo‘q bo‘lsa update
+    # oxirida yaratiladi, username/ism ham o‘sha yerda yoziladi)
+    saved_lang = user_ctx.lang or ""
+    onboarded = user_ctx.onboarded
     
     logger.info(f"   Saved lang: {saved_lang or 'none'}, Onboarded: {onboarded}")
     
@@ -137,7 +126,7 @@ async def start(message: Message, command: CommandObject):
     if need_lang:
         # Hozircha faqat til oynasini ko'rsatamiz — user tilni bosgandan so'ng
         # lang.py onboardingni chaqiradi (agar onboarded=0 bo'lsa)
-        t0 = L.get(saved_lang or get_lang(user.id, settings.DEFAULT_LANG), L["uz"])
+        t0 = L.get(user_ctx.lang_or(settings.DEFAULT_LANG), L["uz"])
         logger.info(f"   Showing language selection")
         await message.answer(
             t0.get("choose_lang", "Tilni tanlang:"), 
@@ -154,4 +143,16 @@ async def start(message: Message, command: CommandObject):
     
     # 3) Hammasi bor — welcome + menyu
     logger.info(f"   Showing welcome + main menu")
-    await _show_welcome(message, saved_lang or "uz")
\ No newline at end of file
+    await _show_welcome(message, saved_lang or "uz")
+
+
+@router.my_chat_member(F.chat.type == "private")
+async def bot_blocked_or_unblocked(event: ChatMemberUpdated):
+    """Botni bloklash/qayta ochish — tarqatma auditoriyasi (users.blocked_at) darhol yangilanadi."""
+    uid = event.from_user.id
+    status = event.new_chat_member.status
+    if status == "kicked":
+        await adb.mark_unreachable([(uid, "my_chat_member: kicked")])
+    elif status == "member":
+        await adb.clear_unreachable([uid])
+    logger.info(f"👤 {uid} bot status -> {status}")
@@ -182,6 +182,7 @@ L = {
         "aud_rev_high": "$20k+",
         "aud_pick_month": "📅 Oy tanlang:",
         "aud_pick_day": "📆 Kun tanlang:",
+        "aud_day_full": "Bu kunda bo‘sh vaqt qolmagan.",
         "aud_pick_time": "⏰ Vaqt tanlang (08:00–19:00, 1 soat oralig‘ida):",
         "aud_time_manual": "⌨️ Qo‘lda kiritish",
         "aud_enter_time_prompt": "⌨️ Vaqtni <b>HH:MM</b> ko‘rinishida yuboring (masalan 14:00):",
@@ -206,6 +207,8 @@ L = {
         "aud_user_approved": "✅ So‘rovingiz tasdiqlandi!",
         "aud_user_retime": "⏰ Admin vaqtni o‘zgartirishni so‘radi. Iltimos yangi vaqtni HH:MM ko‘rinishida yuboring:",
         "aud_user_canceled": "🛑 So‘rovingiz bekor qilindi.",
+        "aud_remind_day": "⏰ Eslatma: ertaga soat {time} da audit uchrashuvingiz bor.",
+        "aud_remind_hour": "⏰ Eslatma: 1 soatdan so‘ng (soat {time}) audit uchrashuvingiz boshlanadi.",
 
         #materiallar 
         "btn_materials": "Materiallar",
@@ -242,8 +245,19 @@ L = {
         "adm_send_choose": "Qaysi turdagi xabar?",
         "adm_send_one": "1 foydalanuvchi",
         "adm_send_all": "Hammaga",
+        "adm_send_segment": "Segment bo‘yicha",
+        "adm_seg_count": "Qabul qiluvchilar",
+        "adm_seg_any": "Hammasi",
+        "adm_seg_lang": "Til",
+        "adm_seg_onboarded": "Ro‘yxatdan o‘tgan",
+        "adm_seg_active": "Faollik",
+        "adm_seg_days": "{n} kun",
+        "adm_seg_feature": "Bo‘lim",
+        "adm_seg_booked": "Tasdiqlangan bron",
+        "adm_seg_next": "Davom etish",
+        "adm_seg_empty": "Bu segmentda hech kim yo‘q.",
         "adm_ask_user": "ID yoki @username yuboring (yoki xabarini forward qiling):",
-        "adm_send_media": "Rasm yoki video jo‘nating (ixtiyoriy).",
+        "adm_send_media": "Rasm yoki video jo‘nating (ixtiyoriy).\nTayyor xabar (formatlangan matn, hujjat, albom) ham bo‘ladi — aynan o‘zi yuboriladi.",
         "adm_skip_or_send": "Yoki ⏭ O‘tkazib yuborish tugmasini bosing:",
         "skip_btn": "O‘tkazib yuborish",
         "adm_ask_text": "Matn/caption kiriting (ixtiyoriy).",
@@ -251,7 +265,11 @@ L = {
         "edit_btn": "O‘zgartirish",
         "cancel_btn": "Bekor qilish",
         "adm_broadcast_canceled": "Yuborish bekor qilindi.",
+        "adm_broadcast_started": "Tarqatma boshlandi. Yakunlanganda xabar beraman.",
+        "adm_bc_list_btn": "Tarqatmalar",
+        "adm_bc_empty": "Hali tarqatma yo‘q.",
         "adm_broadcast_done": "Tarqatma yakunlandi. ✅: {ok}, ❌: {fail}",
+        "adm_bc_source_gone": "Tarqatma to‘xtatildi: preview xabari o‘chirilgan. Yangisini yuboring.",
         "adm_user_not_found": "Foydalanuvchi topilmadi.",
         "adm_user_show_btn": "Foydalanuvchini ko‘rish",
         "adm_find_prompt": "Forward / @username / user_id yuboring:",
@@ -439,6 +457,7 @@ L = {
         "aud_rev_high": "$20k+",
         "aud_pick_month": "📅 Choose a month:",
         "aud_pick_day": "📆 Choose a day:",
+        "aud_day_full": "This day is fully booked.",
         "aud_pick_time": "⏰ Choose a time (08:00–19:00, every 1h):",
         "aud_time_manual": "⌨️ Enter manually",
         "aud_enter_time_prompt": "⌨️ Send time in <b>HH:MM</b> (e.g. 14:00):",
@@ -461,6 +480,8 @@ L = {
         "aud_user_approved": "✅ Your booking has been approved!",
         "aud_user_retime": "⏰ Admin asked to change time. Please send a new HH:MM:",
         "aud_user_canceled": "🛑 Your booking was canceled.",
+        "aud_remind_day": "⏰ Reminder: your audit meeting is tomorrow at {time}.",
+        "aud_remind_hour": "⏰ Reminder: your audit meeting starts in 1 hour (at {time}).",
 
         #materials
         # --- Materials ---
@@ -499,8 +520,19 @@ L = {
         "adm_send_choose": "What kind of message?",
         "adm_send_one": "One user",
         "adm_send_all": "Broadcast",
+        "adm_send_segment": "By segment",
+        "adm_seg_count": "Recipients",
+        "adm_seg_any": "Any",
+        "adm_seg_lang": "Language",
+        "adm_seg_onboarded": "Onboarded",
+        "adm_seg_active": "Active",
+        "adm_seg_days": "{n} days",
+        "adm_seg_feature": "Section",
+        "adm_seg_booked": "Approved booking",
+        "adm_seg_next": "Continue",
+        "adm_seg_empty": "Nobody matches this segment.",
         "adm_ask_user": "Send ID or @username (or forward his message):",
-        "adm_send_media": "Send a photo/video (optional).",
+        "adm_send_media": "Send a photo/video (optional).\nA ready message (formatted text, document, album) works too — it is sent as is.",
         "adm_skip_or_send": "Or press ⏭ Skip:",
         "skip_btn": "Skip",
         "adm_ask_text": "Send text/caption (optional).",
@@ -508,7 +540,11 @@ L = {
         "edit_btn": "Edit",
         "cancel_btn": "Cancel",
         "adm_broadcast_canceled": "Broadcast canceled.",
+        "adm_broadcast_started": "Broadcast started. I will report when it is done.",
+        "adm_bc_list_btn": "Broadcasts",
+        "adm_bc_empty": "No broadcasts yet.",
         "adm_broadcast_done": "Broadcast finished. ✅: {ok}, ❌: {fail}",
+        "adm_bc_source_gone": "Broadcast paused: the preview message was deleted. Please send a new one.",
         "adm_user_not_found": "User not found.",
         "adm_user_show_btn": "Find user",
         "adm_find_prompt": "Send forward / @username / user_id:",
@@ -691,6 +727,7 @@ L = {
         "aud_rev_high": "$20k+",
         "aud_pick_month": "📅 Выберите месяц:",
         "aud_pick_day": "📆 Выберите день:",
+        "aud_day_full": "На этот день свободного времени нет.",
         "aud_pick_time": "⏰ Выберите время (08:00–19:00, шаг 1ч):",
         "aud_time_manual": "⌨️ Ввести вручную",
         "aud_enter_time_prompt": "⌨️ Отправьте время в формате <b>HH:MM</b> (например 14:00):",
@@ -713,6 +750,8 @@ L = {
         "aud_user_approved": "✅ Ваша бронь одобрена!",
         "aud_user_retime": "⏰ Админ запросил новое время. Отправьте HH:MM:",
         "aud_user_canceled": "🛑 Ваша бронь отменена.",
+        "aud_remind_day": "⏰ Напоминание: завтра в {time} у вас аудит-встреча.",
+        "aud_remind_hour": "⏰ Напоминание: аудит-встреча начнётся через 1 час (в {time}).",
 
         #materials
         # --- Materials ---
@@ -751,8 +790,19 @@ L = {
         "adm_send_choose": "Какой тип сообщения?",
         "adm_send_one": "Одному пользователю",
         "adm_send_all": "Всем (рассылка)",
+        "adm_send_segment": "По сегменту",
+        "adm_seg_count": "Получатели",
+        "adm_seg_any": "Все",
+        "adm_seg_lang": "Язык",
+        "adm_seg_onboarded": "Прошёл регистрацию",
+        "adm_seg_active": "Активность",
+        "adm_seg_days": "{n} дн.",
+        "adm_seg_feature": "Раздел",
+        "adm_seg_booked": "Подтверждённая бронь",
+        "adm_seg_next": "Продолжить",
+        "adm_seg_empty": "В этом сегменте никого нет.",
         "adm_ask_user": "Отправьте ID или @username (или перешлите его сообщение):",
-        "adm_send_media": "Отправьте фото/видео (по желанию).",
+        "adm_send_media": "Отправьте фото/видео (по желанию).\nМожно и готовое сообщение (форматированный текст, документ, альбом) — оно уйдёт как есть.",
         "adm_skip_or_send": "Либо нажмите ⏭ Пропустить:",
         "skip_btn": "Пропустить",
         "adm_ask_text": "Отправьте текст/подпись (по желанию).",
@@ -760,7 +810,11 @@ L = {
         "edit_btn": "Изменить",
         "cancel_btn": "Отменить",
         "adm_broadcast_canceled": "Рассылка отменена.",
+        "adm_broadcast_started": "Рассылка запущена. Сообщу, когда она завершится.",
+        "adm_bc_list_btn": "Рассылки",
+        "adm_bc_empty": "Рассылок пока нет.",
         "adm_broadcast_done": "Рассылка завершена. ✅: {ok}, ❌: {fail}",
+        "adm_bc_source_gone": "Рассылка приостановлена: сообщение-превью удалено. Отправьте новое.",
         "adm_user_not_found": "Пользователь не найден.",
         "adm_user_show_btn": "Посмотреть пользователя",
         "adm_find_prompt": "Отправьте forward / @username / user_id:",
@@ -6,10 +6,19 @@ from loguru import logger
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
-from aiogram.fsm.storage.memory import MemoryStorage
 
 from .config import settings
-from .storage.db import db
+from .storage.db import adb, redact_url
+from .storage.fsm import fsm_storage
+from .storage.kv import kv, REDIS_URL
+from .scheduler import scheduler
+from .fanout import drain as fanout_drain
+from .broadcast_jobs import (
+    runner as broadcast_runner,
+    schedule_reprobe,
+    schedule_resume as schedule_broadcast_resume,
+)
+from .middlewares import UserContextMiddleware
 
 # --- Handlers (bir martalik import) ---
 from .handlers import admin as admin_handlers                  # /admin — BIRINCHI
@@ -65,7 +74,8 @@ async def main():
     safe_token = (settings.BOT_TOKEN[:8] + "…") if settings.BOT_TOKEN else "❌ MISSING"
     logger.info(f"🤖 Token: {safe_token}")
     logger.info(f"👥 Admin IDs: {settings.admin_ids} (count={len(settings.admin_ids)})")
-    logger.info(f"💾 DB URL: {settings.DATABASE_URL}")
+    logger.info(f"💾 DB URL: {redact_url(settings.DATABASE_URL)} (backend={adb.backend})")
+    logger.info(f"🧠 Shared KV: {redact_url(REDIS_URL) if kv.shared else 'off (process-local)'}")
     logger.info(f"🔊 Log level: {settings.LOG_LEVEL}")
     logger.info("=" * 64)
 
@@ -74,8 +84,8 @@ async def main():
 
     # ---------- DB init ----------
     try:
-        db.init()
-        logger.info("✅ DB initialized")
+        await adb.init()
+        logger.info(f"✅ DB initialized ({adb.backend})")
     except Exception as e:
         logger.warning(f"⚠️ DB init skipped: {e}")
 
@@ -84,7 +94,14 @@ async def main():
         token=settings.BOT_TOKEN,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML),
     )
-    dp = Dispatcher(storage=MemoryStorage())
+    # FSM holatlari bazada: deploy bron/onboarding o‘rtasidagi foydalanuvchini tashlab ketmaydi
+    dp = Dispatcher(storage=fsm_storage)
+    dp.update.outer_middleware(fsm_storage.flush_middleware())
+
+    # ---------- Foydalanuvchi konteksti: bitta o‘qish / update ----------
+    user_mw = UserContextMiddleware()
+    dp.message.outer_middleware(user_mw)
+    dp.callback_query.outer_middleware(user_mw)
 
     # ---------- MUHIM: Routerlar tartibi ----------
     # 1) Admin panel — har doim birinchi
@@ -117,7 +134,23 @@ async def main():
     logger.info("🚀 Bot polling starting…")
     allowed_updates = dp.resolve_used_update_types()
     logger.info(f"📡 Allowed updates: {allowed_updates}")
-    await dp.start_polling(bot, allowed_updates=allowed_updates)
+    # ---------- Scheduler (eslatmalar) ----------
+    scheduler.start(bot)
+    await faq_handlers.schedule_link_prune()
+    await schedule_broadcast_resume(bot)
+    await schedule_reprobe()
+
+    try:
+        await dp.start_polling(bot, allowed_updates=allowed_updates)
+    finally:
+        await scheduler.stop()
+        # Checkpoint yoziladi va ijara bo‘shatiladi — qayta ishga tushganda darhol davom etadi
+        await broadcast_runner.stop()
+        await fanout_drain()
+        await fsm_storage.close()
+        await kv.close()
+        await adb.aclose()
+        logger.info("💾 DB closed")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# app/middlewares.py
+"""
+Har bir update uchun foydalanuvchi konteksti (outer middleware).
+
+Foydalanuvchi qatori update boshida BIR MARTA o‘qiladi (storage/cache.py keshi
+orqali — ko‘pincha bazaga umuman tegmaydi) va handlerga `user_ctx` argumenti
+sifatida beriladi. Handler o‘zgartirgan maydonlar update oxirida bitta
+upsert_user bilan yoziladi:
+
+    @router.callback_query(F.data.startswith("lang:"))
+    async def set_language(cb: CallbackQuery, user_ctx: UserContext):
+        user_ctx.set_lang("ru")          # keshda darhol, bazada — update oxirida
+        if not user_ctx.onboarded: ...
+
+REDIS_URL berilsa atributlar umumiy KV da (storage/kv.py) turadi — bir nechta
+worker bir-birining o‘zgarishini darhol ko‘radi.
+
+Bazada yo‘q foydalanuvchi faqat shaxsiy chatda yaratiladi (guruhdagi adminlar
+users jadvaliga — demak, broadcast auditoriyasiga — tushmasin).
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, User
+from loguru import logger
+
+from .storage.cache import user_cache
+from .storage.db import adb
+from .storage.kv import kv, user_key
+
+try:
+    from .config import settings
+except Exception:
+    settings = None  # type: ignore
+
+
+@dataclass
+class UserContext:
+    user_id: int
+    lang: Optional[str] = None
+    onboarded: bool = False
+    phone: Optional[str] = None
+    name: Optional[str] = None
+    username: Optional[str] = None
+    exists: bool = False
+    # update oxirida yoziladigan o‘zgarishlar
+    changes: Dict[str, Any] = field(default_factory=dict)
+
+    def lang_or(self, default: Optional[str] = None) -> str:
+        return self.lang or default or getattr(settings, "DEFAULT_LANG", None) or "uz"
+
+    def _set(self, **fields: Any) -> None:
+        for k, v in fields.items():
+            setattr(self, k, v)
+        self.changes.update(fields)
+        # Shu update ichidagi get_lang()/get_phone() ham yangi qiymatni ko‘rsin
+        user_cache.patch(self.user_id, **fields)
+
+    def set_lang(self, lang: str) -> None:
+        self._set(lang=lang)
+
+    def set_name(self, name: str) -> None:
+        self._set(name=name)
+
+    def set_phone(self, phone: str) -> None:
+        self._set(phone=phone)
+
+    def set_onboarded(self, value: bool = True) -> None:
+        self._set(onboarded=bool(value))
+
+
+async def _fetch_attrs(user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Bitta worker: lokal kesh -> DB. Umumiy KV (REDIS_URL): har update da KV dan
+    (boshqa worker o‘zgartirgan bo‘lishi mumkin) -> DB; natija lokal keshga ham
+    yoziladi, shu update dagi get_lang()/get_phone() uni ko‘rsin.
+    """
+    # since: o‘qish davomida yozuv bo‘lsa eski qator lokal keshga qaytmasin
+    token = user_cache.version()
+    if not kv.shared:
+        hit, attrs = user_cache.lookup(user_id)
+        if not hit:
+            attrs = await adb.get_user_attrs(user_id) or None
+            user_cache.put(user_id, attrs, since=token)
+        return attrs
+    raw = await kv.get(user_key(user_id))
+    if raw is not None:
+        attrs = json.loads(raw) or None
+    else:
+        attrs = await adb.get_user_attrs(user_id) or None
+        ttl = user_cache.ttl if attrs else user_cache.negative_ttl
+        await kv.set(user_key(user_id), json.dumps(attrs, ensure_ascii=False, default=str), ttl=int(ttl))
+    user_cache.put(user_id, attrs, since=token)
+    return attrs
+
+
+async def load_user_context(user: User, *, create: bool = True) -> UserContext:
+    """Kesh -> bitta tor so‘rov (get_user_attrs). create=True — yo‘q bo‘lsa yaratishga belgilaydi."""
+    attrs = await _fetch_attrs(user.id) or {}
+    ctx = UserContext(
+        user_id=user.id,
+        lang=(attrs.get("lang") or "").strip().lower() or None,
+        onboarded=bool(attrs.get("onboarded", 0)),
+        phone=attrs.get("phone"),
+        name=attrs.get("name"),
+        username=attrs.get("username"),
+        exists=bool(attrs),
+    )
+    if not ctx.exists and create:
+        ctx.changes["name"] = (user.full_name or "").strip() or None
+    # username o‘zgargan bo‘lsa yangilaymiz (admin paneldagi qidiruv uchun)
+    if (ctx.exists or create) and (user.username or None) != ctx.username:
+        ctx.changes["username"] = user.username or None
+        ctx.username = user.username or None
+    return ctx
+
+
+async def flush_user_context(ctx: UserContext, *, touch: bool = False) -> None:
+    """
+    O‘zgarishlarni bitta upsert_user bilan yozadi (u last_seen ni ham yangilaydi).
+    touch=True — o‘zgarish bo‘lmasa ham faollik qayd etiladi (bufer orqali, alohida commit yo‘q).
+    """
+    if not ctx.changes:
+        if touch:
+            await adb.touch_last_seen(ctx.user_id)
+        return
+    # changes dagi None — ataylab tozalangan maydon (masalan username olib tashlangan):
+    # upsert_user ga clear orqali NULL sifatida beriladi; o‘rnatilmagan maydonlarga tegilmaydi.
+    # upsert_user shu foydalanuvchi kesh yozuvini o‘zi bekor qiladi.
+    await adb.upsert_user(
+        ctx.user_id,
+        **{k: v for k, v in ctx.changes.items() if v is not None},
+        clear=tuple(k for k, v in ctx.changes.items() if v is None),
+    )
+    if kv.shared:
+        await kv.delete(user_key(ctx.user_id))
+    ctx.changes.clear()
+    ctx.exists = True
+
+
+class UserContextMiddleware(BaseMiddleware):
+    """dp.message / dp.callback_query ga outer middleware sifatida ulanadi."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        if user is None or user.is_bot:
+            return await handler(event, data)
+
+        chat = data.get("event_chat")
+        private = chat is None or chat.type == "private"
+        try:
+            ctx = await load_user_context(user, create=private)
+        except Exception as e:
+            logger.error(f"UserContext load failed for {user.id}: {e}")
+            ctx = UserContext(user_id=user.id)
+        data["user_ctx"] = ctx
+        try:
+            return await handler(event, data)
+        finally:
+            try:
+                # Faollik faqat shaxsiy chatda: guruhdagi adminlar users ga tushmasin
+                await flush_user_context(ctx, touch=private)
+            except Exception as e:
+                logger.error(f"UserContext flush failed for {user.id}: {e}")
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# app/scheduler.py
+"""
+Jarayon ichidagi rejalashtiruvchi (eslatmalar, follow-up lar).
+
+Ishlar scheduled_jobs jadvalida saqlanadi (app/storage/jobs.py), xotirada esa
+faqat yaqin `horizon` soniya ichidagilari min-heap da turadi. Bitta asyncio
+task navbatdagi ish vaqtigacha uxlaydi — har bir ish uchun alohida task yo‘q,
+shuning uchun o‘n minglab rejalashtirilgan ishlar ham arzon.
+
+    from ..scheduler import scheduler
+
+    @scheduler.handler("audit_reminder")
+    async def _remind(bot, payload: dict) -> None: ...
+
+    await scheduler.schedule("audit_reminder", run_at_epoch, {...}, ref="booking:1001")
+    await scheduler.cancel("booking:1001")
+
+Qayta ishga tushganda faqat oynadagi ishlar indeks bo‘yicha o‘qiladi;
+kechikib qolgan (bot o‘chiq bo‘lgan paytdagi) ishlar darhol bajariladi.
+Ish `lease` soniyalik ijara bilan olinadi va handler tugagach done bo‘ladi:
+jarayon handler ichida o‘lsa, ijara tugagach ish qayta bajariladi (kamida bir marta).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import heapq
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from .storage.jobs import JobRepository, jobs
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:  # Python < 3.9
+    ZoneInfo = None  # type: ignore
+
+try:
+    from .config import settings
+except Exception:
+    settings = None  # type: ignore
+
+JobHandler = Callable[[Any, Dict[str, Any]], Awaitable[None]]
+
+
+def local_tz() -> dt.tzinfo:
+    """settings.TIMEZONE (standart Asia/Tashkent); topilmasa — UTC."""
+    name = getattr(settings, "TIMEZONE", None) or "Asia/Tashkent"
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(name)
+        except Exception:
+            logger.warning(f"⚠️ Unknown TIMEZONE '{name}', using UTC")
+    return dt.timezone.utc
+
+
+def local_epoch(year: int, month: int, day: int, hhmm: str) -> int:
+    """Mahalliy (settings.TIMEZONE) sana/vaqt -> UTC epoch soniya."""
+    hh, mm = map(int, hhmm.split(":"))
+    return int(dt.datetime(year, month, day, hh, mm, tzinfo=local_tz()).timestamp())
+
+
+class Scheduler:
+    def __init__(
+        self,
+        repo: JobRepository,
+        *,
+        horizon: int = 600,
+        poll: int = 30,
+        batch: int = 1_000,
+        max_attempts: int = 3,
+        retry_delay: int = 60,
+        lease: int = 600,
+    ):
+        self.repo = repo
+        self.horizon = horizon          # shuncha soniya oldinga yuklanadi
+        self.poll = poll                # boshqa jarayonlar qo‘shgan ishlar uchun qayta o‘qish
+        self.batch = batch
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease              # handler shundan uzoq ishlasa, ish boshqa jarayonda takrorlanishi mumkin
+        self.bot: Any = None
+        self._handlers: Dict[str, JobHandler] = {}
+        self._heap: List[Tuple[int, int]] = []   # (run_at, job_id)
+        self._queued: Set[int] = set()
+        self._loaded_until = 0
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---------------- Public API ----------------
+    def handler(self, kind: str) -> Callable[[JobHandler], JobHandler]:
+        def deco(fn: JobHandler) -> JobHandler:
+            self._handlers[kind] = fn
+            return fn
+        return deco
+
+    async def schedule(
+        self, kind: str, run_at: int, payload: Optional[Dict[str, Any]] = None, *, ref: Optional[str] = None,
+    ) -> int:
+        jid = await self.repo.add(kind, run_at, payload, ref=ref)
+        # Oyna ichida bo‘lsa — darhol heap ga (aks holda keyingi yuklashda olinadi)
+        if run_at <= self._loaded_until:
+            self._push(int(run_at), jid)
+            self._wake.set()
+        return jid
+
+    async def cancel(self, ref: str) -> int:
+        # Heap dagi yozuv qoladi, lekin claim() CAS uni o‘tkazib yuboradi (running lar ham bekor bo‘ladi)
+        return await self.repo.cancel_ref(ref)
+
+    def start(self, bot: Any) -> None:
+        self.bot = bot
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="scheduler")
+            self._task.add_done_callback(_log_crash)
+            logger.info(f"⏰ Scheduler started (horizon={self.horizon}s, poll={self.poll}s)")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # ---------------- Internal ----------------
+    def _push(self, run_at: int, jid: int) -> None:
+        if jid not in self._queued:
+            self._queued.add(jid)
+            heapq.heappush(self._heap, (run_at, jid))
+
+    async def _load(self, now: int) -> None:
+        until = now + self.horizon
+        rows = await self.repo.due_before(until, limit=self.batch)
+        for j in rows:
+            self._push(int(j["run_at"]), int(j["id"]))
+        # batch to‘lsa — oynani oxirgi o‘qilgan ishgacha qisqartiramiz
+        self._loaded_until = until if len(rows) < self.batch else int(rows[-1]["run_at"])
+
+    async def _run(self) -> None:
+        try:
+            await self.repo.purge(int(time.time()) - 30 * 86_400)
+        except Exception as e:
+            logger.warning(f"Scheduler purge skipped: {e}")
+        next_load = 0.0
+        while True:
+            now = time.time()
+            if now >= next_load:
+                try:
+                    await self._load(int(now))
+                except Exception as e:
+                    logger.error(f"Scheduler load failed: {e}")
+                next_load = now + self.poll
+
+            while self._heap and self._heap[0][0] <= time.time():
+                _, jid = heapq.heappop(self._heap)
+                self._queued.discard(jid)
+                try:
+                    await self._execute(jid)
+                except Exception as e:
+                    # Bitta ish (yoki baza xatosi) butun rejalashtiruvchini to‘xtatmasin
+                    logger.exception(f"Scheduler job #{jid} crashed: {e}")
+
+            wait = next_load - time.time()
+            if self._heap:
+                wait = min(wait, self._heap[0][0] - time.time())
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, wait))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _execute(self, jid: int) -> None:
+        try:
+            if not await self.repo.claim(jid, self.lease):
+                return  # bekor qilingan, vaqti surilgan yoki boshqa jarayon oldi
+            job = await self.repo.get(jid)
+        except Exception as e:
+            # pending qolgan yoki ijarasi tugaydigan ishni keyingi yuklash (poll) qayta oladi
+            logger.error(f"Scheduler claim #{jid} failed: {e}")
+            return
+        if not job:
+            return
+        attempts = int(job.get("attempts") or 1)
+        fn = self._handlers.get(job["kind"])
+        if fn is None:
+            logger.warning(f"Scheduler: no handler for job #{jid} kind={job['kind']}")
+            try:
+                await self.repo.fail(jid, f"no handler for {job['kind']}", attempts=attempts)
+            except Exception as e:
+                logger.error(f"Scheduler fail #{jid} not saved: {e}")
+            return
+        try:
+            await fn(self.bot, job["payload"])
+        except Exception as e:
+            if attempts < self.max_attempts:
+                run_at = int(time.time()) + self.retry_delay * attempts
+                logger.warning(f"Job #{jid} ({job['kind']}) failed, retry {attempts}/{self.max_attempts}: {e}")
+                try:
+                    await self.repo.retry(jid, run_at, repr(e), attempts=attempts)
+                except Exception as db_err:
+                    # Ish running da qoladi — ijara tugagach yuklash (poll) uni qayta oladi
+                    logger.error(f"Scheduler retry #{jid} not saved: {db_err}")
+                    return
+                self._push(run_at, jid)
+            else:
+                logger.error(f"Job #{jid} ({job['kind']}) failed permanently: {e}")
+                try:
+                    await self.repo.fail(jid, repr(e), attempts=attempts)
+                except Exception as db_err:
+                    logger.error(f"Scheduler fail #{jid} not saved: {db_err}")
+            return
+        try:
+            if not await self.repo.complete(jid, attempts):
+                logger.warning(f"Job #{jid} ({job['kind']}) finished after its lease was taken over or canceled")
+        except Exception as e:
+            # Ijara tugagach ish yana bajariladi (kamida bir marta)
+            logger.error(f"Scheduler complete #{jid} not saved: {e}")
+
+
+def _log_crash(task: "asyncio.Task") -> None:
+    # _run cheksiz tsikl: tugagan bo‘lsa — bekor qilingan yoki kutilmagan xato
+    if not task.cancelled() and task.exception() is not None:
+        logger.opt(exception=task.exception()).error("⏰ Scheduler task died")
+
+
+scheduler = Scheduler(jobs)
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# app/storage/activity.py
+"""
+Write-behind bufer: foydalanuvchi faolligi (last_seen / last_feature).
+
+Har bir xabar uchun alohida UPDATE + commit o‘rniga tegishlar xotirada
+user_id bo‘yicha birlashtiriladi va fon oqimida bitta tranzaksiyada yoziladi:
+  - har `flush_ms` millisekundda, yoki
+  - navbatda `max_rows` ta foydalanuvchi to‘planganda,
+  - va albatta stop() (shutdown) paytida.
+
+Natijada yozuvlar soni xabarlar soniga emas, faol foydalanuvchilar soniga bog‘liq.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+# (user_id, last_seen, last_feature)
+ActivityRow = Tuple[int, str, Optional[str]]
+
+
+def utc_now_sql() -> str:
+    """SQLite CURRENT_TIMESTAMP bilan bir xil format (UTC)."""
+    return dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class ActivityBuffer:
+    def __init__(
+        self,
+        flush_fn: Callable[[List[ActivityRow]], None],
+        *,
+        flush_ms: int = 2_000,
+        max_rows: int = 500,
+    ):
+        self._flush_fn = flush_fn
+        self.flush_ms = max(50, int(flush_ms))
+        self.max_rows = max(1, int(max_rows))
+        self._pending: Dict[int, Tuple[str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        # Flush bir vaqtda faqat bitta oqimda (fon yoki stop) bajarilsin
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------------- Public API ----------------
+    def touch(self, user_id: int, feature: Optional[str] = None) -> None:
+        ts = utc_now_sql()
+        with self._lock:
+            prev = self._pending.get(user_id)
+            if feature is None and prev is not None:
+                feature = prev[1]
+            self._pending[user_id] = (ts, feature)
+            size = len(self._pending)
+        self._ensure_thread()
+        if size >= self.max_rows:
+            self._wake.set()
+
+    def pending_for(self, user_id: int) -> Optional[Tuple[str, Optional[str]]]:
+        """Hali diskka yozilmagan (last_seen, last_feature) — o‘qishlarda ustiga qo‘yish uchun."""
+        with self._lock:
+            return self._pending.get(user_id)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+            rows = [(uid, ts, feat) for uid, (ts, feat) in batch.items()]
+            try:
+                self._flush_fn(rows)
+            except Exception as e:
+                # Yo‘qotmaslik uchun qaytarib qo‘yamiz (yangiroq tegishlar ustun)
+                logger.error(f"Activity flush failed ({len(rows)} rows): {e}")
+                with self._lock:
+                    for uid, val in batch.items():
+                        self._pending.setdefault(uid, val)
+                return 0
+            return len(rows)
+
+    def stop(self) -> None:
+        """Fon oqimini to‘xtatadi va qolgan tegishlarni yozib qo‘yadi."""
+        self._stopped = True
+        self._wake.set()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=5)
+        self._thread = None
+        self.flush()
+        # Keyingi tegishlar (masalan qayta ulanishdan so‘ng) yana fon oqimini yoqadi
+        self._stopped = False
+
+    # ---------------- Internal ----------------
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or self._stopped:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="activity-flush", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            if self._stopped:
+                break
+            self.flush()
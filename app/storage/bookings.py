@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+# app/storage/bookings.py
+"""
+Audit bronlari ombori (bookings jadvali, migratsiya 006 / PG 002).
+
+SQL ikkala backendda bir xil (`?` parametrlar, RETURNING id), shuning uchun
+repozitoriy faqat `adb` ning past darajali API siga tayanadi:
+
+    from ..storage.bookings import bookings, SlotTaken
+    try:
+        bid = await bookings.reserve(user_id=..., year=2026, month=10, day=18, time="14:00", ...)
+    except SlotTaken:
+        ...  # boshqa vaqt tanlashni so‘raymiz
+    taken = await bookings.taken_slots(2026, 10, 18)   # {"10:00", "14:00"}
+
+Kunlik bandlik — idx_bookings_date_status bo‘yicha bitta indeks SEARCH.
+
+Ikki marta bron qilishdan himoya bazaning o‘zida: idx_bookings_active_slot
+(year, month, day, time) WHERE status IN ('pending','approved') — UNIQUE.
+Bir vaqtda kelgan tasdiqlashlardan faqat bittasi INSERT/UPDATE qiladi,
+qolganlari SlotTaken oladi. Holat o‘tishlari compare-and-set (expect=...).
+
+Kalendar uchun har bir sana booking_slots jadvalida 12 bitli maska sifatida
+saqlanadi (bit i => SLOT_HOURS[i]:00 band). Oy ko‘rinishi — bitta PK diapazon
+o‘qish; holat/vaqt o‘zgarganda faqat o‘sha kunning maskasi qayta hisoblanadi.
+Yozuv va qayta hisob bitta tranzaksiyada (adb.exec_batch), avval kun qatori
+qulflanadi: PostgreSQL da bir kunning o‘zgarishlari navbat bilan o‘tadi va
+keyingisi oldingisining natijasini ko‘radi (eskirgan maska yozilmaydi).
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .db import adb, is_unique_violation
+
+STATUS_PENDING = "pending"
+STATUS_APPROVED = "approved"
+STATUS_RETIME = "retime_requested"
+STATUS_CANCELED = "canceled"
+
+STATUSES = (STATUS_PENDING, STATUS_APPROVED, STATUS_RETIME, STATUS_CANCELED)
+
+# Slotni band qiladigan holatlar (migratsiya 008 dagi UNIQUE indeks predikati bilan bir xil)
+TAKEN_STATUSES = (STATUS_PENDING, STATUS_APPROVED)
+
+
+class SlotTaken(Exception):
+    """Tanlangan (sana, vaqt) boshqa faol bron tomonidan band."""
+
+# Kalendar slotlari: 08:00..19:00 (audit._time_slots bilan bir xil)
+SLOT_HOURS = range(8, 20)
+SLOTS: List[str] = [f"{h:02d}:00" for h in SLOT_HOURS]
+FULL_MASK = (1 << len(SLOTS)) - 1
+
+
+def slot_bit(time: str) -> int:
+    """'14:00' -> 1 << 6; slot bo‘lmagan vaqt (masalan '14:30') -> 0."""
+    try:
+        return 1 << SLOTS.index(time)
+    except ValueError:
+        return 0
+
+
+def mask_slots(mask: int) -> Set[str]:
+    """Maskadagi band slotlar: 0b101 -> {'08:00', '10:00'}."""
+    return {s for i, s in enumerate(SLOTS) if mask >> i & 1}
+
+
+def _in_list(values: Any) -> str:
+    # Faqat modul konstantalari uchun (foydalanuvchi qiymati emas)
+    return ", ".join(f"'{v}'" for v in values)
+
+
+# Kun qatorini yaratadi/qulflaydi (ON CONFLICT DO UPDATE qatorni tranzaksiya oxirigacha band qiladi)
+_LOCK_DAY_SQL = """
+    INSERT INTO booking_slots (year, month, day, mask) VALUES (?, ?, ?, 0)
+    ON CONFLICT (year, month, day) DO UPDATE SET mask = booking_slots.mask
+"""
+
+_LOCK_BOOKING_DAY_SQL = """
+    INSERT INTO booking_slots (year, month, day, mask)
+    SELECT year, month, day, 0 FROM bookings WHERE id = ?
+    ON CONFLICT (year, month, day) DO UPDATE SET mask = booking_slots.mask
+"""
+
+# Bir kunning maskasini bookings dan qayta hisoblaydi (migratsiya 007 bilan bir xil ifoda)
+_REFRESH_DAY_SQL = f"""
+    INSERT INTO booking_slots (year, month, day, mask)
+    SELECT CAST(?1 AS INTEGER), CAST(?2 AS INTEGER), CAST(?3 AS INTEGER),
+           COALESCE(SUM(DISTINCT 1 << (CAST(substr(time, 1, 2) AS INTEGER) - {SLOT_HOURS.start})), 0)
+    FROM bookings
+    WHERE year = ?1 AND month = ?2 AND day = ?3
+      AND status IN ({_in_list(TAKEN_STATUSES)})
+      AND time IN ({_in_list(SLOTS)})
+    ON CONFLICT (year, month, day) DO UPDATE SET mask = excluded.mask
+"""
+
+# Xuddi shu, lekin kun bron id si bo‘yicha (PK) olinadi — oldindan get() shart emas
+_REFRESH_BOOKING_DAY_SQL = f"""
+    INSERT INTO booking_slots (year, month, day, mask)
+    SELECT k.year, k.month, k.day, COALESCE((
+        SELECT SUM(DISTINCT 1 << (CAST(substr(b.time, 1, 2) AS INTEGER) - {SLOT_HOURS.start}))
+        FROM bookings AS b
+        WHERE b.year = k.year AND b.month = k.month AND b.day = k.day
+          AND b.status IN ({_in_list(TAKEN_STATUSES)})
+          AND b.time IN ({_in_list(SLOTS)})
+    ), 0)
+    FROM bookings AS k
+    WHERE k.id = ?
+    ON CONFLICT (year, month, day) DO UPDATE SET mask = excluded.mask
+"""
+
+_COLS = (
+    "id, user_id, chat_id, lang, year, month, day, time, status, "
+    "biz_name, biz_desc, revenue, profile, created_at"
+)
+
+
+def _booking(row: Any) -> Dict[str, Any]:
+    b = dict(row)
+    try:
+        b["profile"] = json.loads(b.get("profile") or "{}")
+    except ValueError:
+        b["profile"] = {}
+    # Eski handler kodi bilan moslik (BOOKINGS dict dagi kalit)
+    b["booking_id"] = b["id"]
+    return b
+
+
+class BookingRepository:
+    def __init__(self, db: Any):
+        self.db = db
+
+    async def reserve(
+        self,
+        *,
+        user_id: int,
+        year: int,
+        month: int,
+        day: int,
+        time: str,
+        chat_id: Optional[int] = None,
+        lang: Optional[str] = None,
+        biz_name: Optional[str] = None,
+        biz_desc: Optional[str] = None,
+        revenue: Optional[str] = None,
+        profile: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """
+        Slotni atomar band qiladi: yangi bron (status=pending) id sini qaytaradi
+        yoki slot band bo‘lsa SlotTaken ko‘taradi (UNIQUE indeks hakam).
+        """
+        date = (int(year), int(month), int(day))
+        try:
+            _, bid, _ = await self.db.exec_batch([
+                (_LOCK_DAY_SQL, date),
+                (
+                    """
+                    INSERT INTO bookings (user_id, chat_id, lang, year, month, day, time, status,
+                                          biz_name, biz_desc, revenue, profile)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    RETURNING id
+                    """,
+                    (
+                        user_id, chat_id, lang, *date, time, STATUS_PENDING,
+                        biz_name, biz_desc, revenue,
+                        json.dumps(profile or {}, ensure_ascii=False, separators=(",", ":")),
+                    ),
+                ),
+                (_REFRESH_DAY_SQL, date),
+            ])
+        except Exception as e:
+            if is_unique_violation(e):
+                raise SlotTaken(f"{year}-{month:02d}-{day:02d} {time}") from e
+            raise
+        return bid
+
+    async def get(self, booking_id: int) -> Optional[Dict[str, Any]]:
+        row = await self.db.query_one(f"SELECT {_COLS} FROM bookings WHERE id = ?", (booking_id,))
+        return _booking(row) if row else None
+
+    async def taken_slots(self, year: int, month: int, day: int) -> Set[str]:
+        marks = ", ".join("?" for _ in TAKEN_STATUSES)
+        rows = await self.db.query_all(
+            f"""
+            SELECT time FROM bookings
+            WHERE year = ? AND month = ? AND day = ? AND status IN ({marks})
+            """,
+            (int(year), int(month), int(day), *TAKEN_STATUSES),
+        )
+        return {str(r["time"]) for r in rows}
+
+    async def is_taken(self, year: int, month: int, day: int, time: str) -> bool:
+        return time in await self.taken_slots(year, month, day)
+
+    async def set_status(
+        self, booking_id: int, status: str, *, expect: Optional[Iterable[str]] = None,
+    ) -> bool:
+        """
+        Holatni o‘zgartiradi. expect berilsa — compare-and-set: faqat joriy holat
+        shulardan biri bo‘lsa yoziladi (ikki admin bir vaqtda bosganda bittasi yutadi).
+        Faol holatga qaytarishda slot band bo‘lsa — SlotTaken.
+        """
+        if status not in STATUSES:
+            raise ValueError(f"Unknown booking status: {status}")
+        sql = "UPDATE bookings SET status = ? WHERE id = ?"
+        params: tuple = (status, booking_id)
+        if expect is not None:
+            expect = tuple(expect)
+            sql += f" AND status IN ({', '.join('?' for _ in expect)})"
+            params += expect
+        try:
+            # Oldingi holatga qarab tanlamaymiz (CAS poygasida u eskirgan bo‘lishi mumkin):
+            # kun qulflanadi, yoziladi va maska shu tranzaksiyada qayta hisoblanadi
+            _, n, _ = await self.db.exec_batch(self._with_day_refresh(booking_id, sql, params))
+        except Exception as e:
+            if is_unique_violation(e):
+                raise SlotTaken(f"booking {booking_id}") from e
+            raise
+        return n > 0
+
+    async def users_with_status(self, user_ids: Iterable[int], status: str) -> Set[int]:
+        """Berilgan foydalanuvchilardan shu holatdagi broni borlari (idx_bookings_user_status)."""
+        ids = [int(u) for u in user_ids]
+        if not ids:
+            return set()
+        rows = await self.db.query_all(
+            f"""
+            SELECT DISTINCT user_id FROM bookings
+            WHERE user_id IN ({', '.join('?' for _ in ids)}) AND status = ?
+            """,
+            (*ids, status),
+        )
+        return {int(r["user_id"]) for r in rows}
+
+    async def pending_retime(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Admin vaqtni o‘zgartirishni so‘ragan eng so‘nggi bron (bo‘lmasa None)."""
+        row = await self.db.query_one(
+            f"""
+            SELECT {_COLS} FROM bookings
+            WHERE user_id = ? AND status = ?
+            ORDER BY id DESC
+            LIMIT 1
+            """,
+            (user_id, STATUS_RETIME),
+        )
+        return _booking(row) if row else None
+
+    async def retime(self, booking_id: int, time: str) -> bool:
+        """
+        Yangi vaqtni yozadi va bronni qayta admin ko‘rigiga (pending) qaytaradi.
+        Yangi slot band bo‘lsa — SlotTaken; bron retime holatida bo‘lmasa — False.
+        """
+        try:
+            _, n, _ = await self.db.exec_batch(self._with_day_refresh(
+                booking_id,
+                "UPDATE bookings SET time = ?, status = ? WHERE id = ? AND status = ?",
+                (time, STATUS_PENDING, booking_id, STATUS_RETIME),
+            ))
+        except Exception as e:
+            if is_unique_violation(e):
+                raise SlotTaken(time) from e
+            raise
+        return n > 0
+
+    # ---------------- Slot bitmaps ----------------
+    @staticmethod
+    def _with_day_refresh(booking_id: int, sql: str, params: tuple) -> List[Tuple[str, tuple]]:
+        """Kun qulfi -> bron yozuvi -> kun maskasi (exec_batch uchun, bitta tranzaksiya)."""
+        bid = (int(booking_id),)
+        return [(_LOCK_BOOKING_DAY_SQL, bid), (sql, params), (_REFRESH_BOOKING_DAY_SQL, bid)]
+
+    async def refresh_day(self, year: int, month: int, day: int) -> None:
+        """Bitta kunning maskasini qayta hisoblaydi (idx_bookings_date_status bo‘yicha)."""
+        await self.db.exec(_REFRESH_DAY_SQL, (int(year), int(month), int(day)))
+
+    async def refresh_booking_day(self, booking_id: int) -> None:
+        """Bron turgan kunning maskasi — bitta INSERT…SELECT (PK + idx_bookings_date_status)."""
+        await self.db.exec(_REFRESH_BOOKING_DAY_SQL, (int(booking_id),))
+
+    async def month_masks(self, year: int, month: int) -> Dict[int, int]:
+        """{kun: maska} — butun oy kalendari bitta PK diapazon o‘qishida."""
+        rows = await self.db.query_all(
+            "SELECT day, mask FROM booking_slots WHERE year = ? AND month = ? AND mask <> 0",
+            (int(year), int(month)),
+        )
+        return {int(r["day"]): int(r["mask"]) for r in rows}
+
+    async def day_mask(self, year: int, month: int, day: int) -> int:
+        row = await self.db.query_one(
+            "SELECT mask FROM booking_slots WHERE year = ? AND month = ? AND day = ?",
+            (int(year), int(month), int(day)),
+        )
+        return int(row["mask"]) if row else 0
+
+
+bookings = BookingRepository(adb)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# app/storage/broadcasts.py
+"""
+Tarqatma ishlari va yetkazish jurnali (broadcast_jobs / broadcast_log,
+migratsiya 012 / PG 008).
+
+Ish auditoriyani user_id keyset tartibida yuradi (db.audience_chunk).
+Checkpoint — `last_user_id`: undan kichik/teng hamma foydalanuvchi ishlangan.
+Checkpoint dan keyingi, lekin allaqachon ishlanganlar (parallel worker lar
+tufayli) broadcast_log da bor — qayta ishga tushishda ular o‘tkazib yuboriladi.
+
+Bir nechta jarayon (PostgreSQL): ishni `owner` + `lease_until` ijarasi bilan
+faqat bittasi bajaradi; checkpoint ijarani uzaytiradi, jarayon o‘lsa ijara
+tugaydi va ishni boshqasi (yoki qayta ishga tushgan o‘zi) davom ettiradi.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .db import adb
+
+BC_RUNNING = "running"
+BC_PAUSED = "paused"
+BC_DONE = "done"
+BC_CANCELED = "canceled"
+
+# broadcast_log.status
+LOG_OK = 1
+LOG_BLOCKED = 2
+LOG_FAILED = 3
+
+# (user_id, status, code)
+LogRow = Tuple[int, int, Optional[int]]
+
+_COLS = (
+    "id, admin_id, chat_id, payload, status, total, last_user_id, ok, blocked, failed, "
+    "owner, lease_until, created_at, finished_at"
+)
+_LOG_CHUNK = 500
+
+
+def _job(row: Any) -> Dict[str, Any]:
+    j = dict(row)
+    try:
+        j["payload"] = json.loads(j.get("payload") or "{}")
+    except ValueError:
+        j["payload"] = {}
+    return j
+
+
+class BroadcastRepository:
+    def __init__(self, db: Any):
+        self.db = db
+
+    async def create(self, *, admin_id: int, chat_id: int, payload: Dict[str, Any], total: int) -> int:
+        return await self.db.insert(
+            """
+            INSERT INTO broadcast_jobs (admin_id, chat_id, payload, total, created_at)
+            VALUES (?, ?, ?, ?, ?) RETURNING id
+            """,
+            (
+                int(admin_id), int(chat_id),
+                json.dumps(payload, ensure_ascii=False, separators=(",", ":")),
+                int(total), int(time.time()),
+            ),
+        )
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = await self.db.query_one(f"SELECT {_COLS} FROM broadcast_jobs WHERE id = ?", (int(job_id),))
+        return _job(row) if row else None
+
+    async def recent(self, limit: int = 5) -> List[Dict[str, Any]]:
+        rows = await self.db.query_all(
+            f"SELECT {_COLS} FROM broadcast_jobs ORDER BY id DESC LIMIT ?", (int(limit),)
+        )
+        return [_job(r) for r in rows]
+
+    # ---------------- Ijara (owner / lease_until) ----------------
+    async def claim(self, job_id: int, owner: str, lease: int) -> bool:
+        """running ish ijarasi bo‘sh (muddati o‘tgan) yoki o‘zimizniki bo‘lsa — olamiz."""
+        now = int(time.time())
+        n = await self.db.exec(
+            """
+            UPDATE broadcast_jobs SET owner = ?, lease_until = ?
+            WHERE id = ? AND status = ? AND (lease_until < ? OR owner = ?)
+            """,
+            (owner, now + int(lease), int(job_id), BC_RUNNING, now, owner),
+        )
+        return n > 0
+
+    async def release(self, job_id: int, owner: str) -> None:
+        """To‘xtatishda: ijarani bo‘shatamiz — qayta ishga tushgan jarayon darhol davom ettiradi."""
+        await self.db.exec(
+            "UPDATE broadcast_jobs SET lease_until = 0 WHERE id = ? AND owner = ?",
+            (int(job_id), owner),
+        )
+
+    async def stale(self, limit: int = 10) -> List[int]:
+        """Egasi yo‘q (ijarasi tugagan) running ishlar (idx_broadcast_jobs_status)."""
+        rows = await self.db.query_all(
+            "SELECT id FROM broadcast_jobs WHERE status = ? AND lease_until < ? ORDER BY lease_until LIMIT ?",
+            (BC_RUNNING, int(time.time()), int(limit)),
+        )
+        return [int(r["id"]) for r in rows]
+
+    # ---------------- Holat ----------------
+    async def set_status(self, job_id: int, status: str, *, expect: Iterable[str]) -> bool:
+        """
+        Compare-and-set. Ijaraga tegilmaydi: pauza/resume dan keyin ham eski egasi
+        oxirgi checkpoint + release qilmaguncha (yoki ijara tugamaguncha) boshqa
+        jarayon ishni ololmaydi — jurnalga tushmagan yuborishlar takrorlanmaydi.
+        """
+        expect = list(expect)
+        n = await self.db.exec(
+            f"""
+            UPDATE broadcast_jobs SET status = ?
+            WHERE id = ? AND status IN ({', '.join('?' for _ in expect)})
+            """,
+            (status, int(job_id), *expect),
+        )
+        return n > 0
+
+    async def finish(self, job_id: int, owner: str) -> bool:
+        """running -> done; hisoblagichlar jurnaldan aniq qayta hisoblanadi."""
+        counts = {LOG_OK: 0, LOG_BLOCKED: 0, LOG_FAILED: 0}
+        for r in await self.db.query_all(
+            "SELECT status, COUNT(*) AS n FROM broadcast_log WHERE job_id = ? GROUP BY status", (int(job_id),)
+        ):
+            counts[int(r["status"])] = int(r["n"])
+        n = await self.db.exec(
+            """
+            UPDATE broadcast_jobs
+            SET status = ?, ok = ?, blocked = ?, failed = ?, finished_at = ?, lease_until = 0
+            WHERE id = ? AND status = ? AND owner = ?
+            """,
+            (
+                BC_DONE, counts[LOG_OK], counts[LOG_BLOCKED], counts[LOG_FAILED], int(time.time()),
+                int(job_id), BC_RUNNING, owner,
+            ),
+        )
+        return n > 0
+
+    # ---------------- Jurnal ----------------
+    async def logged_after(self, job_id: int, after_user_id: int) -> Set[int]:
+        """Checkpoint dan keyin allaqachon ishlanganlar (odatda worker lar sonicha)."""
+        rows = await self.db.query_all(
+            "SELECT user_id FROM broadcast_log WHERE job_id = ? AND user_id > ?",
+            (int(job_id), int(after_user_id)),
+        )
+        return {int(r["user_id"]) for r in rows}
+
+    async def checkpoint(
+        self,
+        job_id: int,
+        owner: str,
+        *,
+        last_user_id: int,
+        rows: Sequence[LogRow],
+        lease: int,
+    ) -> bool:
+        """
+        Jurnal (ko‘p qatorli INSERT, bo‘laklab) -> hisoblagichlar, checkpoint va
+        ijara. False — ish endi running emas (pauza/bekor) yoki boshqa jarayonga o‘tgan.
+        Hammasi bitta tranzaksiyada (exec_batch): jurnal bilan hisoblagich/checkpoint
+        orasida uzilish bo‘lmaydi — qayta ishga tushishda ikki marta sanash ham,
+        jurnalsiz surilgan checkpoint tufayli qayta yuborish ham yo‘q.
+        """
+        jid = int(job_id)
+        statements: List[Tuple[str, tuple]] = []
+        for i in range(0, len(rows), _LOG_CHUNK):
+            chunk = rows[i:i + _LOG_CHUNK]
+            statements.append((
+                "INSERT INTO broadcast_log (job_id, user_id, status, code) VALUES "
+                + ", ".join("(?, ?, ?, ?)" for _ in chunk)
+                + " ON CONFLICT (job_id, user_id) DO NOTHING",
+                tuple(v for uid, st, code in chunk for v in (jid, int(uid), int(st), code)),
+            ))
+        ok = sum(1 for r in rows if r[1] == LOG_OK)
+        blocked = sum(1 for r in rows if r[1] == LOG_BLOCKED)
+        # Hisoblagichlar pauza/bekor qilingandan keyin ham yoziladi (xabar baribir ketgan)
+        statements.append((
+            """
+            UPDATE broadcast_jobs
+            SET ok = ok + ?, blocked = blocked + ?, failed = failed + ?,
+                last_user_id = CASE WHEN last_user_id < ? THEN ? ELSE last_user_id END,
+                lease_until = CASE WHEN status = ? THEN ? ELSE lease_until END
+            WHERE id = ? AND owner = ?
+            """,
+            (
+                ok, blocked, len(rows) - ok - blocked,
+                int(last_user_id), int(last_user_id),
+                BC_RUNNING, int(time.time()) + int(lease),
+                jid, owner,
+            ),
+        ))
+        n = (await self.db.exec_batch(statements))[-1]
+        if not n:
+            return False
+        row = await self.db.query_one("SELECT status FROM broadcast_jobs WHERE id = ?", (jid,))
+        return bool(row) and row["status"] == BC_RUNNING
+
+
+broadcasts = BroadcastRepository(adb)
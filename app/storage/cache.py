@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# app/storage/cache.py
+"""
+Hajmi cheklangan LRU + TTL kesh (foydalanuvchi atributlari uchun).
+
+    from .cache import user_cache
+    hit, value = user_cache.lookup(user_id)      # hit=False — bazadan o‘qish kerak
+    user_cache.put(user_id, {"lang": "uz", ...})
+    user_cache.put(user_id, None)                # negativ kesh: bazada yo‘q
+    user_cache.invalidate(user_id)               # DB.upsert_user shu yerga tegadi
+
+    token = user_cache.version()                 # bazadan o‘qishdan OLDIN
+    row = db.get_user_attrs(user_id)
+    user_cache.put(user_id, row, since=token)    # orada invalidate bo‘lgan bo‘lsa — yozilmaydi
+
+Yozuvlar soni `maxsize` dan oshmaydi (eng eski ishlatilgani chiqariladi),
+har bir yozuv `ttl` soniyadan keyin eskirgan hisoblanadi. Negativ yozuvlar
+qisqaroq yashaydi (`negative_ttl`) — yangi foydalanuvchi tez orada paydo bo‘ladi.
+hits / misses / evictions — stats() orqali (admin/diagnostika uchun).
+
+Versiya: har invalidate hisoblagichni oshiradi. O‘qish boshida olingan `since`
+bilan put() — agar o‘qish davomida shu kalit (yoki butun kesh) bekor qilingan
+bo‘lsa, eski qator keshga qaytmaydi (yozuvchi boshqa thread da ishlaydi).
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+try:
+    from ..config import settings
+except Exception:
+    settings = None  # type: ignore
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 100_000, ttl: float = 3600.0, negative_ttl: float = 300.0):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        # key -> (expires_at, value); value None — negativ yozuv
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        # handlerlar event-loopda, DB yozuvlari esa AsyncDB thread pool ida invalidate qiladi
+        self._lock = threading.Lock()
+        # Versiyalar: key -> oxirgi invalidate raqami (maxsize tagacha);
+        # chiqarib yuborilganlar va clear() — `_floor` dan eski since larni rad etadi
+        self._epoch = 0
+        self._stamps: "OrderedDict[Hashable, int]" = OrderedDict()
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """(topildi, qiymat). Negativ yozuv uchun (True, None)."""
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, item[1]
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def version(self) -> int:
+        """Bazadan o‘qishdan oldin olinadi va put(..., since=...) ga beriladi."""
+        with self._lock:
+            return self._epoch
+
+    def put(self, key: Hashable, value: Any, *, since: Optional[int] = None) -> None:
+        ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            if since is not None and (since < self._floor or self._stamps.get(key, 0) > since):
+                return  # o‘qish davomida bekor qilingan — qiymat eskirgan bo‘lishi mumkin
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def patch(self, key: Hashable, create: bool = False, **fields: Any) -> None:
+        """
+        Mavjud (musbat) dict yozuvni joyida yangilaydi.
+        create=True — yozuv yo‘q/negativ bo‘lsa ham shu maydonlar bilan yaratadi.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and isinstance(item[1], dict):
+                item[1].update(fields)
+                return
+        if create:
+            self.put(key, dict(fields))
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._epoch += 1
+            self._stamps[key] = self._epoch
+            self._stamps.move_to_end(key)
+            while len(self._stamps) > self.maxsize:
+                self._floor = self._stamps.popitem(last=False)[1]
+
+    def forget_missing(self, keys: Iterable[Hashable]) -> None:
+        """
+        Qatorlar yaratilgan bo‘lishi mumkin (faollik flush): shu kalitlarning negativ
+        yozuvlari o‘chadi, davom etayotgan o‘qishlarning put() i rad etiladi.
+        Musbat yozuvlarga tegmaydi — faollik atributlarni o‘zgartirmaydi.
+        """
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is not None and item[1] is None:
+                    del self._data[key]
+            self._epoch += 1
+            self._floor = self._epoch
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._stamps.clear()
+            self._epoch += 1
+            self._floor = self._epoch
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def _setting(name: str, default: Any) -> Any:
+    value = getattr(settings, name, None)
+    return default if value is None else value
+
+
+# Foydalanuvchi atributlari (lang, phone, name, username, onboarded) — memory.py
+user_cache = TTLCache(
+    maxsize=int(_setting("USER_CACHE_SIZE", 100_000)),
+    ttl=float(_setting("USER_CACHE_TTL", 3600)),
+)
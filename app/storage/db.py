@@ -1,10 +1,44 @@
-
+import asyncio
+import functools
 import os
+import queue
+import re
 import sqlite3
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, replace
+from typing import Optional, Dict, Any, List, Callable, Iterable, Iterator, Mapping, Tuple, TypeVar
+
+from .activity import ActivityBuffer, ActivityRow
+from .cache import user_cache
+from .kv import forget_users
+from .migrations import migrate
+from .segments import Segment
+
+# Sozlamalar ixtiyoriy: .env bo‘lmasa ham DB ishlayveradi (bench/skriptlar uchun)
+try:
+    from ..config import settings
+except Exception:
+    settings = None  # type: ignore
 
 DB_PATH = "app/data/bot.sqlite3"
-os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+
+T = TypeVar("T")
+
+# upsert_user / bulk_upsert_users yozadigan profil ustunlari (tartib muhim)
+_PROFILE_FIELDS: Tuple[str, ...] = ("username", "name", "phone", "lang", "onboarded")
+# upsert_user(clear=...) bilan NULL ga tushirish mumkin bo‘lgan ustunlar
+_NULLABLE_FIELDS = frozenset(_PROFILE_FIELDS[:-1])
+
+
+# exec_batch: RETURNING li so‘rov natijasi — id (insert() kabi), qolganlari — rowcount
+_RETURNING_RE = re.compile(r"\bRETURNING\b", re.IGNORECASE)
+
+
+def returns_id(sql: str) -> bool:
+    return bool(_RETURNING_RE.search(sql))
 
 
 def _normalize_phone(raw: str) -> str:
@@ -16,89 +50,387 @@ def _normalize_phone(raw: str) -> str:
     return f"+{digits}" if digits else ""
 
 
+# ---------------- Backend selection ----------------
+_PG_SCHEMES = ("postgres", "postgresql", "postgresql+asyncpg")
+
+
+def parse_database_url(url: Optional[str]) -> Tuple[str, str]:
+    """
+    DATABASE_URL -> (backend, manzil):
+      sqlite:///./app/data/bot.sqlite3   -> ("sqlite", "./app/data/bot.sqlite3")
+      sqlite:///:memory:                 -> ("sqlite", ":memory:")
+      postgresql://u:p@host:5432/db      -> ("postgres", "postgresql://u:p@host:5432/db")
+    Bo‘sh qiymat — standart SQLite fayli.
+    """
+    s = (url or "").strip()
+    if not s:
+        return "sqlite", DB_PATH
+    scheme, sep, rest = s.partition("://")
+    scheme = scheme.lower()
+    if not sep:
+        # Sxemasiz qiymat — SQLite fayl yo‘li deb qabul qilamiz
+        return "sqlite", s
+    if scheme == "sqlite":
+        # sqlite:///relative/or/./path va sqlite:////abs/path
+        path = rest[1:] if rest.startswith("/") else rest
+        return "sqlite", path or DB_PATH
+    if scheme in _PG_SCHEMES:
+        return "postgres", f"postgresql://{rest}"
+    raise ValueError(f"Qo‘llab-quvvatlanmaydigan DATABASE_URL sxemasi: {scheme}")
+
+
+def is_unique_violation(exc: BaseException) -> bool:
+    """UNIQUE cheklovi buzilganmi (SQLite yoki PostgreSQL/asyncpg)."""
+    if isinstance(exc, sqlite3.IntegrityError):
+        return "UNIQUE" in str(exc).upper()
+    return getattr(exc, "sqlstate", None) == "23505"
+
+
+def redact_url(url: Optional[str]) -> str:
+    """Logga chiqarish uchun parolni yashiradi."""
+    s = url or ""
+    head, sep, tail = s.partition("://")
+    if not sep or "@" not in tail:
+        return s
+    creds, _, host = tail.rpartition("@")
+    user = creds.split(":", 1)[0]
+    return f"{head}://{user}:***@{host}" if ":" in creds else s
+
+
+# ---------------- Performance profile ----------------
+@dataclass(frozen=True)
+class SqliteProfile:
+    """
+    Ulanish ochilganda qo‘llanadigan PRAGMA to‘plami.
+    readers > 0 va WAL bo‘lsa, o‘qishlar alohida read-only ulanishlarda bajariladi
+    (yozuvchi commit qilayotganda ham kutmaydi).
+    """
+    journal_mode: str = "WAL"
+    synchronous: str = "NORMAL"
+    cache_size: int = -16_000          # manfiy => KiB (≈16 MB)
+    mmap_size: int = 64 * 1024 * 1024  # bayt
+    temp_store: str = "MEMORY"
+    busy_timeout_ms: int = 5_000
+    readers: int = 2
+
+    @property
+    def wal(self) -> bool:
+        return self.journal_mode.upper() == "WAL"
+
+
+PROFILES: Dict[str, SqliteProfile] = {
+    # Eski xulq: rollback-journal, bitta umumiy ulanish
+    "legacy": SqliteProfile(
+        journal_mode="DELETE", synchronous="FULL", cache_size=-2_000,
+        mmap_size=0, temp_store="DEFAULT", readers=0,
+    ),
+    "wal": SqliteProfile(),
+}
+
+
+def profile_from_settings() -> SqliteProfile:
+    """settings.SQLITE_* dan profil yig‘adi (bo‘lmasa — 'wal')."""
+    if settings is None:
+        return PROFILES["wal"]
+    base = PROFILES.get(str(settings.SQLITE_PROFILE).lower(), PROFILES["wal"])
+    overrides: Dict[str, Any] = {}
+    if settings.SQLITE_CACHE_MB is not None:
+        overrides["cache_size"] = -int(settings.SQLITE_CACHE_MB) * 1024
+    if settings.SQLITE_MMAP_MB is not None:
+        overrides["mmap_size"] = int(settings.SQLITE_MMAP_MB) * 1024 * 1024
+    if settings.SQLITE_READERS is not None:
+        overrides["readers"] = max(0, int(settings.SQLITE_READERS))
+    return replace(base, **overrides) if overrides else base
+
+
+@functools.lru_cache(maxsize=64)
+def _upsert_sql(fields: Tuple[str, ...]) -> str:
+    """Maydonlar kombinatsiyasi uchun bitta INSERT ... ON CONFLICT (keshlanadi)."""
+    cols = ", ".join(("user_id",) + fields)
+    marks = ", ".join("?" for _ in range(len(fields) + 1))
+    sets = ", ".join(f"{f} = excluded.{f}" for f in fields)
+    return (
+        f"INSERT INTO users ({cols}) VALUES ({marks}) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {sets}"
+    )
+
+
+# Faollik vaqti: indeks (migratsiya 003) va so‘rovlarda AYNAN shu ifoda bo‘lishi shart
+_ACTIVITY_EXPR = "COALESCE(last_seen, created_at, '')"
+
+# memory.py keshi uchun profil atributlari (faollik ustunlarisiz — ular tez-tez o‘zgaradi)
+_USER_ATTR_COLS = "user_id, username, name, phone, lang, onboarded, created_at"
+
+_USER_LIST_COLS = (
+    "user_id, username, name, phone, lang, onboarded, last_feature, created_at, last_seen"
+)
+
+
+def encode_cursor(activity: str, key: int) -> str:
+    """
+    (vaqt, id) juftligini callback_data uchun ixcham va ':' siz satrga aylantiradi:
+    '2026-10-18 12:00:00', 42 -> '20261018120000_42'
+    """
+    digits = "".join(ch for ch in (activity or "") if ch.isdigit())
+    return f"{digits or 0}_{int(key)}"
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    digits, _, key = (cursor or "").partition("_")
+    if len(digits) == 14:
+        activity = f"{digits[0:4]}-{digits[4:6]}-{digits[6:8]} {digits[8:10]}:{digits[10:12]}:{digits[12:14]}"
+    else:
+        activity = ""
+    return activity, int(key or 0)
+
+
+def _user_brief(row: sqlite3.Row) -> dict:
+    return {
+        "user_id": row["user_id"],
+        "username": row["username"],
+        "name": row["name"],
+        "phone": row["phone"],
+        "lang": row["lang"],
+        "onboarded": bool(row["onboarded"]) if row["onboarded"] is not None else False,
+        "last_feature": row["last_feature"],
+    }
+
+
+@functools.lru_cache(maxsize=2)
+def _keyset_users_sql(older: bool) -> str:
+    """
+    (activity, user_id) bo‘yicha keyset. Qator-qiymat taqqoslash (a, b) < (?, ?)
+    indeksni SCAN qiladi, shuning uchun ikki aniq SEARCH ga bo‘lamiz:
+    bir xil vaqtdagi qolgan id lar + undan qat’iy eski/yangi vaqtlar.
+    """
+    op, order = ("<", "DESC") if older else (">", "ASC")
+    cols = f"{_USER_LIST_COLS}, {_ACTIVITY_EXPR} AS activity"
+    return f"""
+        SELECT * FROM (
+            SELECT {cols} FROM users
+            WHERE {_ACTIVITY_EXPR} = ?1 AND user_id {op} ?2
+            ORDER BY user_id {order} LIMIT ?3
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT {cols} FROM users
+            WHERE {_ACTIVITY_EXPR} {op} ?1
+            ORDER BY {_ACTIVITY_EXPR} {order}, user_id {order} LIMIT ?3
+        )
+        ORDER BY activity {order}, user_id {order}
+        LIMIT ?3
+    """
+
+
+@functools.lru_cache(maxsize=2)
+def _keyset_materials_sql(older: bool) -> str:
+    """Materiallar uchun xuddi shu ikki-SEARCH keyset (created_at, id)."""
+    op, order = ("<", "DESC") if older else (">", "ASC")
+    return f"""
+        SELECT * FROM (
+            SELECT * FROM materials
+            WHERE category = ?1 AND lang = ?2 AND created_at = ?3 AND id {op} ?4
+            ORDER BY id {order} LIMIT ?5
+        )
+        UNION ALL
+        SELECT * FROM (
+            SELECT * FROM materials
+            WHERE category = ?1 AND lang = ?2 AND created_at {op} ?3
+            ORDER BY created_at {order}, id {order} LIMIT ?5
+        )
+        ORDER BY created_at {order}, id {order}
+        LIMIT ?5
+    """
+
+
+def _user_list_item(r: sqlite3.Row) -> dict:
+    return {
+        "user_id": r["user_id"],
+        "username": r["username"],
+        "name": r["name"],
+        "phone": r["phone"],
+        "lang": r["lang"],
+        "onboarded": bool(r["onboarded"]) if r["onboarded"] is not None else False,
+        "last_feature": r["last_feature"],
+        "created_at": r["created_at"],
+        "last_seen": r["last_seen"],
+    }
+
+
+# None => mavjud qiymat saqlanadi (CRM importida bo‘sh maydonlar ustidan yozmaymiz)
+_BULK_UPSERT_SQL = (
+    "INSERT INTO users (user_id, username, name, phone, lang, onboarded) "
+    "VALUES (?, ?, ?, ?, ?, COALESCE(?, 0)) "
+    "ON CONFLICT(user_id) DO UPDATE SET "
+    + ", ".join(f"{f} = COALESCE(excluded.{f}, users.{f})" for f in _PROFILE_FIELDS[:-1])
+    + ", onboarded = CASE WHEN ?6 IS NULL THEN users.onboarded ELSE excluded.onboarded END"
+)
+
+
 class DB:
-    def __init__(self, path: str = DB_PATH):
+    def __init__(self, path: str = DB_PATH, profile: Optional[SqliteProfile] = None):
         self.path = path
+        self.profile = profile or PROFILES["wal"]
         self._conn: Optional[sqlite3.Connection] = None
+        # Ulanish bir nechta oqimdan (event loop + AsyncDB executori) ishlatiladi
+        self._lock = threading.RLock()
+        # Read-only ulanishlar havzasi (faqat WAL + fayl bazada)
+        self._readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._reader_conns: List[sqlite3.Connection] = []
+        # last_seen / last_feature — write-behind (har xabarga commit qilmaymiz)
+        self.activity = ActivityBuffer(
+            self._flush_activity,
+            flush_ms=getattr(settings, "ACTIVITY_FLUSH_MS", 2_000),
+            max_rows=getattr(settings, "ACTIVITY_FLUSH_ROWS", 500),
+        )
 
     # ---------------- Low-level ----------------
+    def _apply_pragmas(self, conn: sqlite3.Connection, *, writer: bool) -> None:
+        p = self.profile
+        conn.execute(f"PRAGMA busy_timeout = {int(p.busy_timeout_ms)};")
+        if writer:
+            # journal_mode fayl darajasida saqlanadi — faqat yozuvchida o‘rnatamiz
+            conn.execute(f"PRAGMA journal_mode = {p.journal_mode};")
+        conn.execute(f"PRAGMA synchronous = {p.synchronous};")
+        conn.execute(f"PRAGMA cache_size = {int(p.cache_size)};")
+        conn.execute(f"PRAGMA mmap_size = {int(p.mmap_size)};")
+        conn.execute(f"PRAGMA temp_store = {p.temp_store};")
+        if not writer:
+            conn.execute("PRAGMA query_only = ON;")
+
+    @property
+    def readers_enabled(self) -> bool:
+        return self.profile.wal and self.profile.readers > 0 and self.path != ":memory:"
+
     def connect(self) -> sqlite3.Connection:
         if self._conn is None:
-            self._conn = sqlite3.connect(self.path, check_same_thread=False)
-            self._conn.row_factory = sqlite3.Row
-            self._init_schema()   # bog‘langanda bir marta migratsiya
+            with self._lock:
+                if self._conn is None:
+                    if self.path != ":memory:":
+                        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    conn = sqlite3.connect(self.path, check_same_thread=False)
+                    conn.row_factory = sqlite3.Row
+                    self._apply_pragmas(conn, writer=True)
+                    # Sxema dolzarb bo‘lsa — faqat bitta PRAGMA user_version o‘qish
+                    migrate(conn)
+                    self._conn = conn
+                    self._open_readers()
         return self._conn
 
+    def _open_readers(self) -> None:
+        if not self.readers_enabled:
+            return
+        uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+        for _ in range(self.profile.readers):
+            rc = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            rc.row_factory = sqlite3.Row
+            self._apply_pragmas(rc, writer=False)
+            self._reader_conns.append(rc)
+            self._readers.put(rc)
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """Bo‘sh read-only ulanishni beradi; havza bo‘lmasa — yozuvchini (lock bilan)."""
+        conn = self.connect()
+        if not self._reader_conns:
+            with self._lock:
+                yield conn
+            return
+        rc = self._readers.get()
+        try:
+            yield rc
+        finally:
+            self._readers.put(rc)
+
     # Backward compat: ba’zi joylarda self.conn ishlatilgan bo‘lishi mumkin
     @property
     def conn(self) -> sqlite3.Connection:
         return self.connect()
 
     def close(self) -> None:
+        # Avval buferdagi faollikni yozib qo‘yamiz (ulanish hali ochiq)
         if self._conn is not None:
-            self._conn.close()
-            self._conn = None
-
-    def exec(self, sql: str, params: tuple = ()) -> None:
-        with self.connect():
-            self.conn.execute(sql, params)
+            self.activity.stop()
+        with self._lock:
+            for rc in self._reader_conns:
+                rc.close()
+            self._reader_conns.clear()
+            self._readers = queue.LifoQueue()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def exec(self, sql: str, params: tuple = ()) -> int:
+        """Yozuvchi so‘rovni bajaradi va o‘zgargan qatorlar sonini qaytaradi."""
+        conn = self.connect()
+        with self._lock, conn:
+            cur = conn.execute(sql, params)
+            cur.fetchall()  # RETURNING bo‘lsa — commit dan oldin o‘qib bo‘lish shart
+            return cur.rowcount
+
+    def exec_batch(self, statements: Iterable[Tuple[str, tuple]]) -> List[int]:
+        """
+        Bir nechta yozuvchi so‘rov — bitta tranzaksiyada (hammasi yoki hech biri).
+        Har biri uchun rowcount; `RETURNING id` li so‘rov uchun — id (insert() kabi).
+        """
+        conn = self.connect()
+        results: List[int] = []
+        with self._lock, conn:
+            for sql, params in statements:
+                cur = conn.execute(sql, params)
+                rows = cur.fetchall()
+                if returns_id(sql):
+                    results.append(int(rows[0][0]) if rows else 0)
+                else:
+                    results.append(cur.rowcount)
+        return results
+
+    def insert(self, sql: str, params: tuple = ()) -> int:
+        """
+        INSERT bajaradi va yangi qator id sini qaytaradi (lock ichida, poyga yo‘q).
+        `... RETURNING id` ham qabul qilinadi (PostgreSQL backend bilan umumiy SQL).
+        """
+        conn = self.connect()
+        with self._lock, conn:
+            cur = conn.execute(sql, params)
+            rows = cur.fetchall()
+            return int(rows[0][0] if rows else (cur.lastrowid or 0))
 
     def query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
-        cur = self.connect().execute(sql, params)
-        row = cur.fetchone()
-        cur.close()
+        with self._reader() as conn:
+            cur = conn.execute(sql, params)
+            row = cur.fetchone()
+            cur.close()
         return row
 
     def query_all(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
-        cur = self.connect().execute(sql, params)
-        rows = cur.fetchall()
-        cur.close()
+        with self._reader() as conn:
+            cur = conn.execute(sql, params)
+            rows = cur.fetchall()
+            cur.close()
         return rows
 
-    # ---------------- Schema & migrations ----------------
-    def _column_exists(self, table: str, column: str) -> bool:
-        cur = self.connect().execute(f"PRAGMA table_info({table});")
-        cols = [r[1] for r in cur.fetchall()]
-        cur.close()
-        return column in cols
-
-    def _init_schema(self) -> None:
-        # Asosiy jadval
-        self.exec(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id     INTEGER UNIQUE NOT NULL,
-                username    TEXT,
-                name        TEXT,
-                phone       TEXT,
-                lang        TEXT,
-                onboarded   INTEGER DEFAULT 0,
-                created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
-            );
-            """
-        )
-
-        # Yetishmayotgan ustunlarni qo‘shamiz
-        if not self._column_exists("users", "last_feature"):
-            self.exec("ALTER TABLE users ADD COLUMN last_feature TEXT;")
-
-        if not self._column_exists("users", "last_seen"):
-            self.exec("ALTER TABLE users ADD COLUMN last_seen DATETIME;")
-
-        # Indekslar
-        self.exec("CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);")
-        self.exec("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);")
-        self.exec("CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen);")
-
-    # Backward-compatible public API
+    # ---------------- Schema ----------------
     def init(self) -> None:
-        """Old kodlar chaqirsa ham ishlaydi (hech narsa qilmaydi, chunki connect() allaqachon _init_schema() qiladi)."""
+        """Ulanadi va kerakli migratsiyalarni qo‘llaydi (app/storage/migrations.py)."""
         self.connect()
 
     # ---------------- Helpers ----------------
     def get_user(self, user_id: int) -> Dict[str, Any]:
         row = self.query_one("SELECT * FROM users WHERE user_id = ?", (user_id,))
+        if not row:
+            return {}
+        u = dict(row)
+        pending = self.activity.pending_for(user_id)
+        if pending:
+            u["last_seen"] = pending[0]
+            if pending[1] is not None:
+                u["last_feature"] = pending[1]
+        return u
+
+    def get_user_attrs(self, user_id: int) -> Dict[str, Any]:
+        """Faqat profil atributlari (SELECT * emas); yo‘q bo‘lsa {}."""
+        row = self.query_one(f"SELECT {_USER_ATTR_COLS} FROM users WHERE user_id = ?", (user_id,))
         return dict(row) if row else {}
 
     def upsert_user(
@@ -112,31 +444,87 @@ class DB:
         onboarded: Optional[bool] = None,
         last_feature: Optional[str] = None,
         touch_seen: bool = True,
+        clear: Iterable[str] = (),
     ) -> None:
-        # insert bo‘sh yozuv
-        self.exec("INSERT OR IGNORE INTO users (user_id) VALUES (?);", (user_id,))
-
-        sets, vals = [], []
+        # Faollik (last_seen / last_feature) — bufer orqali, alohida commit yo‘q
+        if touch_seen or last_feature is not None:
+            self.activity.touch(user_id, last_feature)
 
+        values: Dict[str, Any] = {}
         if username is not None:
-            sets.append("username = ?"); vals.append(username)
+            values["username"] = username
         if name is not None:
-            sets.append("name = ?"); vals.append(name)
+            values["name"] = name
         if phone is not None:
-            sets.append("phone = ?"); vals.append(_normalize_phone(phone))
+            values["phone"] = _normalize_phone(phone)
         if lang is not None:
-            sets.append("lang = ?"); vals.append(lang)
+            values["lang"] = lang
         if onboarded is not None:
-            sets.append("onboarded = ?"); vals.append(1 if onboarded else 0)
-        if last_feature is not None:
-            sets.append("last_feature = ?"); vals.append(last_feature)
-        if touch_seen:
-            sets.append("last_seen = CURRENT_TIMESTAMP")
+            values["onboarded"] = 1 if onboarded else 0
+        # None — "o‘zgartirmaslik"; NULL ga tushirish kerak bo‘lsa maydon clear da beriladi
+        for f in clear:
+            if f in _NULLABLE_FIELDS and f not in values:
+                values[f] = None
+
+        if not values:
+            # Faqat faollik: qator ham flush paytida yaratiladi
+            return
 
-        if sets:
-            sql = f"UPDATE users SET {', '.join(sets)} WHERE user_id = ?"
-            vals.append(user_id)
-            self.exec(sql, tuple(vals))
+        fields = tuple(f for f in _PROFILE_FIELDS if f in values)
+        self.exec(_upsert_sql(fields), (user_id, *(values[f] for f in fields)))
+        user_cache.invalidate(user_id)
+
+    def bulk_upsert_users(self, profiles: Iterable[Mapping[str, Any]], *, chunk_size: int = 5_000) -> int:
+        """
+        Ko‘p profilni bitta tranzaksiyada yozadi (masalan CRM importi).
+        Har bir element: {"user_id": ..., "username"?, "name"?, "phone"?, "lang"?, "onboarded"?}.
+        None / yo‘q maydonlar mavjud qiymatni o‘zgartirmaydi. Yozilgan qatorlar sonini qaytaradi.
+        """
+        def _row(p: Mapping[str, Any]) -> tuple:
+            phone = p.get("phone")
+            onboarded = p.get("onboarded")
+            return (
+                int(p["user_id"]),
+                p.get("username") or None,
+                p.get("name") or None,
+                _normalize_phone(phone) or None if phone else None,
+                p.get("lang") or None,
+                None if onboarded is None else (1 if onboarded else 0),
+            )
+
+        total = 0
+        conn = self.connect()
+        with self._lock, conn:
+            batch: List[tuple] = []
+            for p in profiles:
+                batch.append(_row(p))
+                if len(batch) >= chunk_size:
+                    conn.executemany(_BULK_UPSERT_SQL, batch)
+                    total += len(batch)
+                    batch = []
+            if batch:
+                conn.executemany(_BULK_UPSERT_SQL, batch)
+                total += len(batch)
+        # Katta importdan keyin bittalab invalidate qilishdan ko‘ra keshni tozalash arzon
+        user_cache.clear()
+        return total
+
+    def _flush_activity(self, rows: List[ActivityRow]) -> None:
+        """ActivityBuffer dan kelgan tegishlarni bitta tranzaksiyada yozadi."""
+        conn = self.connect()
+        with self._lock, conn:
+            conn.executemany(
+                """
+                INSERT INTO users (user_id, last_seen, last_feature) VALUES (?, ?, ?)
+                ON CONFLICT(user_id) DO UPDATE SET
+                    last_seen    = excluded.last_seen,
+                    last_feature = COALESCE(excluded.last_feature, users.last_feature),
+                    blocked_at   = NULL
+                """,
+                rows,
+            )
+        # Qator yaratilgan bo‘lishi mumkin — "bazada yo‘q" yozuvlari endi noto‘g‘ri
+        user_cache.forget_missing(r[0] for r in rows)
 
     # shorthand setterlar
     def set_lang(self, user_id: int, lang: str) -> None:
@@ -168,88 +556,164 @@ class DB:
     def get_all_users(self, offset: int = 0, limit: int = 100) -> List[dict]:
         """
         Foydalanuvchilarni yangi->eski (last_seen, bo‘lmasa created_at) tartibida qaytaradi.
+        Chuqur sahifalar uchun iter_users() dan foydalaning (OFFSET qatorlarni baribir o‘qiydi).
         """
         rows = self.query_all(
-            """
-            SELECT user_id, username, name, phone, lang, onboarded,
-                   last_feature, created_at, last_seen
+            f"""
+            SELECT {_USER_LIST_COLS}
             FROM users
-            ORDER BY COALESCE(last_seen, created_at) DESC
+            ORDER BY {_ACTIVITY_EXPR} DESC, user_id DESC
             LIMIT ? OFFSET ?
             """,
             (limit, offset),
         )
+        return [_user_list_item(r) for r in rows]
+
+    def iter_users(
+        self,
+        *,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[dict]:
+        """
+        Keyset sahifalash (yangi->eski). Har bir element "cursor" maydoniga ega:
+          - after=<oxirgi element cursor> -> keyingi sahifa
+          - before=<birinchi element cursor> -> oldingi sahifa
+        Har qanday chuqurlikdagi sahifa idx_users_activity bo‘yicha cheklangan SEARCH.
+        """
+        if before or after:
+            ts, uid = decode_cursor(before or after)
+            rows = self.query_all(_keyset_users_sql(older=not before), (ts, uid, limit))
+            if before:
+                rows = list(reversed(rows))
+        else:
+            rows = self.query_all(
+                f"""
+                SELECT {_USER_LIST_COLS}, {_ACTIVITY_EXPR} AS activity
+                FROM users
+                ORDER BY {_ACTIVITY_EXPR} DESC, user_id DESC
+                LIMIT ?
+                """,
+                (limit,),
+            )
         res: List[dict] = []
         for r in rows:
-            res.append({
-                "user_id": r["user_id"],
-                "username": r["username"],
-                "name": r["name"],
-                "phone": r["phone"],
-                "lang": r["lang"],
-                "onboarded": bool(r["onboarded"]) if r["onboarded"] is not None else False,
-                "last_feature": r["last_feature"],
-                "created_at": r["created_at"],
-                "last_seen": r["last_seen"],
-            })
+            item = _user_list_item(r)
+            item["cursor"] = encode_cursor(r["activity"], r["user_id"])
+            res.append(item)
         return res
 
+    def audience_chunk(
+        self,
+        after_id: int = 0,
+        limit: int = 1_000,
+        *,
+        segment: Optional[Segment] = None,
+        include_blocked: bool = False,
+    ) -> List[int]:
+        """
+        Tarqatma auditoriyasi: faqat user_id, keyset (user_id > after_id) tartibida.
+        Standart — faqat yetib boradiganlar (blocked_at IS NULL): idx_users_reachable
+        qisman indeksining o‘zidan o‘qiladi (jadval qatorlariga tegmaydi);
+        tartib faollikka bog‘liq emas — tarqatma davomida siljimaydi.
+        `segment` filtrlari shu so‘rovning o‘ziga qo‘shiladi (idx_users_seg_*).
+        """
+        where, params = self._audience_where(segment, include_blocked)
+        rows = self.query_all(
+            f"SELECT user_id FROM users WHERE user_id > ?{where} ORDER BY user_id LIMIT ?",
+            (int(after_id), *params, int(limit)),
+        )
+        return [int(r[0]) for r in rows]
+
+    def count_audience(self, *, segment: Optional[Segment] = None, include_blocked: bool = False) -> int:
+        where, params = self._audience_where(segment, include_blocked)
+        return int(self.query_one(f"SELECT COUNT(*) FROM users WHERE 1 = 1{where}", tuple(params))[0])
+
+    @staticmethod
+    def _audience_where(segment: Optional[Segment], include_blocked: bool) -> Tuple[str, List[Any]]:
+        where, params = (segment or Segment()).where(
+            activity_expr=_ACTIVITY_EXPR, since=lambda ts: ts.strftime("%Y-%m-%d %H:%M:%S"),
+        )
+        return ("" if include_blocked else " AND blocked_at IS NULL") + where, params
+
+    def segment_features(self, limit: int = 8) -> List[Tuple[str, int]]:
+        """Segment tanlash uchun: eng ko‘p uchraydigan last_feature lar (idx_users_seg_feature)."""
+        rows = self.query_all(
+            """
+            SELECT last_feature, COUNT(*) AS n FROM users
+            WHERE blocked_at IS NULL AND last_feature IS NOT NULL
+            GROUP BY last_feature ORDER BY n DESC, last_feature LIMIT ?
+            """,
+            (int(limit),),
+        )
+        return [(r[0], int(r[1])) for r in rows]
+
+    # ---------------- Yetkazib bo‘lmaslik (blocked_at) ----------------
+    def mark_unreachable(self, items: Iterable[Tuple[int, Optional[str]]]) -> int:
+        """Tarqatma natijalaridan: (user_id, xato) — bitta tranzaksiyada."""
+        now = int(time.time())
+        rows = [(now, (err or "")[:200] or None, int(uid)) for uid, err in items]
+        if rows:
+            conn = self.connect()
+            with self._lock, conn:
+                conn.executemany("UPDATE users SET blocked_at = ?, last_error = ? WHERE user_id = ?", rows)
+        return len(rows)
+
+    def clear_unreachable(self, user_ids: Iterable[int]) -> int:
+        rows = [(int(u),) for u in user_ids]
+        if not rows:
+            return 0
+        conn = self.connect()
+        with self._lock, conn:
+            cur = conn.executemany(
+                "UPDATE users SET blocked_at = NULL, last_error = NULL WHERE user_id = ? AND blocked_at IS NOT NULL",
+                rows,
+            )
+            return cur.rowcount
+
+    def unreachable_before(self, ts: int, limit: int = 500) -> List[int]:
+        """`ts` dan oldin bloklanganlar, eng eskisidan (idx_users_blocked)."""
+        rows = self.query_all(
+            "SELECT user_id FROM users WHERE blocked_at < ? ORDER BY blocked_at LIMIT ?", (int(ts), int(limit))
+        )
+        return [int(r[0]) for r in rows]
+
     def find_user_by_username(self, username: str) -> Optional[dict]:
         row = self.query_one(
             """
             SELECT user_id, username, name, phone, lang, onboarded, last_feature
             FROM users
-            WHERE LOWER(username) = LOWER(?)
+            WHERE username = ? COLLATE NOCASE
             """,
-            (username,),
+            (username.lstrip("@"),),
         )
         if not row:
             return None
-        return {
-            "user_id": row["user_id"],
-            "username": row["username"],
-            "name": row["name"],
-            "phone": row["phone"],
-            "lang": row["lang"],
-            "onboarded": bool(row["onboarded"]) if row["onboarded"] is not None else False,
-            "last_feature": row["last_feature"],
-        }
-
-
-    # --- schema ---  (users... dan keyin shu blokni qo'shing)
-    def init(self) -> None:
-        self.exec(
-            """
-            CREATE TABLE IF NOT EXISTS users (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id     INTEGER UNIQUE NOT NULL,
-                username    TEXT,
-                name        TEXT,
-                phone       TEXT,
-                lang        TEXT,
-                onboarded   INTEGER DEFAULT 0,
-                created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
-            );
-            """
-        )
-        # NEW: materials
-        self.exec(
-            """
-            CREATE TABLE IF NOT EXISTS materials (
-                id            INTEGER PRIMARY KEY AUTOINCREMENT,
-                category      TEXT NOT NULL CHECK (category IN ('book','article','video','audio')),
-                lang          TEXT NOT NULL,
-                title         TEXT NOT NULL,
-                description   TEXT,
-                is_paid       INTEGER NOT NULL DEFAULT 0,
-                price_cents   INTEGER NOT NULL DEFAULT 0,
-                source_type   TEXT NOT NULL CHECK (source_type IN ('file_id','url','text')),
-                source_ref    TEXT NOT NULL,
-                created_by    INTEGER,
-                created_at    DATETIME DEFAULT CURRENT_TIMESTAMP
-            );
+        return _user_brief(row)
+
+    def search_users_by_username(self, prefix: str, limit: int = 10) -> List[dict]:
+        """
+        '@abc*' uslubidagi prefiks qidiruv. idx_users_username_ci bo‘yicha diapazon:
+        username >= 'abc' AND username < 'abd' (NOCASE) — 1M+ foydalanuvchida ham O(log n).
+        """
+        lo = (prefix or "").lstrip("@").rstrip("*").lower()
+        if not lo:
+            return []
+        hi = lo[:-1] + chr(ord(lo[-1]) + 1)
+        rows = self.query_all(
             """
+            SELECT user_id, username, name, phone, lang, onboarded, last_feature
+            FROM users
+            WHERE username >= ?1 COLLATE NOCASE AND username < ?2 COLLATE NOCASE
+            ORDER BY username COLLATE NOCASE
+            LIMIT ?3
+            """,
+            (lo, hi, limit),
         )
+        return [_user_brief(r) for r in rows]
+
+
     # ------- MATERIALS API -------
     def add_material(
         self,
@@ -264,7 +728,7 @@ class DB:
         source_ref: str,    # file_id yoki URL yoki text
         created_by: int | None = None,
     ) -> int:
-        self.exec(
+        return self.insert(
             """
             INSERT INTO materials (category, lang, title, description, is_paid, price_cents, source_type, source_ref, created_by)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?);
@@ -277,34 +741,251 @@ class DB:
                 source_type, source_ref, created_by
             )
         )
-        row = self.query_one("SELECT last_insert_rowid() as id")
-        return int(row["id"]) if row else 0
 
     def get_material(self, mat_id: int) -> dict | None:
         r = self.query_one("SELECT * FROM materials WHERE id=?", (mat_id,))
         return dict(r) if r else None
 
-    def list_materials(self, *, category: str, lang: str, offset: int = 0, limit: int = 10) -> list[dict]:
-        cur = self.connect().execute(
-            """
-            SELECT * FROM materials
-            WHERE category = ? AND lang = ?
-            ORDER BY created_at DESC, id DESC
-            LIMIT ? OFFSET ?;
-            """,
-            (category, lang, limit, offset)
-        )
-        return [dict(x) for x in cur.fetchall()]
+    def list_materials(
+        self,
+        *,
+        category: str,
+        lang: str,
+        offset: int = 0,
+        limit: int = 10,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> list[dict]:
+        """
+        (category, lang) bo‘yicha yangi->eski. after/before berilsa — keyset
+        (idx_materials_cat_lang_created bo‘yicha SEARCH), aks holda eski OFFSET.
+        Har bir element "cursor" maydoniga ega.
+        """
+        if before or after:
+            ts, mid = decode_cursor(before or after)
+            rows = self.query_all(
+                _keyset_materials_sql(older=not before), (category, lang, ts, mid, limit)
+            )
+            if before:
+                rows = list(reversed(rows))
+        else:
+            rows = self.query_all(
+                """
+                SELECT * FROM materials
+                WHERE category = ? AND lang = ?
+                ORDER BY created_at DESC, id DESC
+                LIMIT ? OFFSET ?;
+                """,
+                (category, lang, limit, offset)
+            )
+        res: list[dict] = []
+        for x in rows:
+            item = dict(x)
+            item["cursor"] = encode_cursor(item.get("created_at") or "", item["id"])
+            res.append(item)
+        return res
 
     def count_materials(self, *, category: str, lang: str) -> int:
+        # O(1): triggerlar yuritadigan hisoblagich (COUNT(*) emas)
         r = self.query_one(
-            "SELECT COUNT(*) as c FROM materials WHERE category=? AND lang=?",
+            "SELECT n FROM material_counts WHERE category=? AND lang=?",
             (category, lang)
         )
-        return int(r["c"] if r else 0)
+        return int(r["n"] if r else 0)
+
+
+
+class AsyncDB:
+    """
+    DB ustidan async fasad: har bir so‘rov alohida (bitta) executor oqimida bajariladi,
+    shuning uchun sekin fsync event loopni to‘xtatmaydi va dispatcher boshqa
+    chatlarga xizmat qilishda davom etadi.
+
+    API DB bilan bir xil, faqat metodlar `await` qilinadi:
+        u = await adb.get_user(uid)
+        await adb.upsert_user(uid, lang="uz")
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, sync_db: DB):
+        self.sync = sync_db
+        # SQLite yozuvchisi bitta — shuning uchun bitta oqim yetarli (va xavfsiz)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+        # O‘qishlar uchun alohida oqimlar: yozuv navbatida turib qolmaydi
+        readers = sync_db.profile.readers if sync_db.readers_enabled else 0
+        self._read_executor = (
+            ThreadPoolExecutor(max_workers=readers, thread_name_prefix="sqlite-ro")
+            if readers else self._executor
+        )
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Ixtiyoriy sinxron funksiyani DB (yozuvchi) oqimida bajaradi (repozitoriylar uchun)."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    async def read(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Faqat o‘qiydigan funksiyani read-only oqimlardan birida bajaradi."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, functools.partial(fn, *args, **kwargs))
+
+    def close(self) -> None:
+        if self._read_executor is not self._executor:
+            self._read_executor.shutdown(wait=True)
+        self._executor.shutdown(wait=True)
+        self.sync.close()
+
+    async def aclose(self) -> None:
+        """PostgresDB bilan bir xil yopish interfeysi (main() shuni chaqiradi)."""
+        await asyncio.to_thread(self.close)
+
+    # ---------------- Low-level ----------------
+    async def exec(self, sql: str, params: tuple = ()) -> int:
+        return await self.run(self.sync.exec, sql, params)
+
+    async def exec_batch(self, statements: Iterable[Tuple[str, tuple]]) -> List[int]:
+        return await self.run(self.sync.exec_batch, list(statements))
+
+    async def insert(self, sql: str, params: tuple = ()) -> int:
+        return await self.run(self.sync.insert, sql, params)
+
+    async def query_one(self, sql: str, params: tuple = ()) -> Optional[sqlite3.Row]:
+        return await self.read(self.sync.query_one, sql, params)
+
+    async def query_all(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        return await self.read(self.sync.query_all, sql, params)
+
+    async def init(self) -> None:
+        await self.run(self.sync.init)
+
+    # ---------------- Users ----------------
+    async def get_user(self, user_id: int) -> Dict[str, Any]:
+        return await self.read(self.sync.get_user, user_id)
+
+    async def get_user_attrs(self, user_id: int) -> Dict[str, Any]:
+        return await self.read(self.sync.get_user_attrs, user_id)
+
+    async def upsert_user(self, user_id: int, **fields: Any) -> None:
+        await self.run(self.sync.upsert_user, user_id, **fields)
+
+    async def bulk_upsert_users(self, profiles: Iterable[Mapping[str, Any]], *, chunk_size: int = 5_000) -> int:
+        profiles = list(profiles)
+        n = await self.run(self.sync.bulk_upsert_users, profiles, chunk_size=chunk_size)
+        await forget_users(p["user_id"] for p in profiles)
+        return n
+
+    async def set_lang(self, user_id: int, lang: str) -> None:
+        await self.run(self.sync.set_lang, user_id, lang)
+
+    async def set_name(self, user_id: int, name: str) -> None:
+        await self.run(self.sync.set_name, user_id, name)
+
+    async def set_phone(self, user_id: int, phone: str) -> None:
+        await self.run(self.sync.set_phone, user_id, phone)
+
+    async def set_username(self, user_id: int, username: Optional[str]) -> None:
+        await self.run(self.sync.set_username, user_id, username)
+
+    async def set_onboarded(self, user_id: int, value: bool = True) -> None:
+        await self.run(self.sync.set_onboarded, user_id, value)
+
+    async def set_last_feature(self, user_id: int, feature: str) -> None:
+        await self.run(self.sync.set_last_feature, user_id, feature)
+
+    async def touch_last_seen(self, user_id: int) -> None:
+        await self.run(self.sync.touch_last_seen, user_id)
+
+    async def is_onboarded(self, user_id: int) -> bool:
+        return await self.read(self.sync.is_onboarded, user_id)
+
+    # ---------------- Admin panel ----------------
+    async def get_all_users(self, offset: int = 0, limit: int = 100) -> List[dict]:
+        return await self.read(self.sync.get_all_users, offset, limit)
+
+    async def iter_users(
+        self, *, after: Optional[str] = None, before: Optional[str] = None, limit: int = 100,
+    ) -> List[dict]:
+        return await self.read(self.sync.iter_users, after=after, before=before, limit=limit)
+
+    async def audience_chunk(
+        self,
+        after_id: int = 0,
+        limit: int = 1_000,
+        *,
+        segment: Optional[Segment] = None,
+        include_blocked: bool = False,
+    ) -> List[int]:
+        return await self.read(
+            self.sync.audience_chunk, after_id, limit, segment=segment, include_blocked=include_blocked,
+        )
+
+    async def count_audience(self, *, segment: Optional[Segment] = None, include_blocked: bool = False) -> int:
+        return await self.read(self.sync.count_audience, segment=segment, include_blocked=include_blocked)
+
+    async def segment_features(self, limit: int = 8) -> List[Tuple[str, int]]:
+        return await self.read(self.sync.segment_features, limit)
+
+    async def mark_unreachable(self, items: Iterable[Tuple[int, Optional[str]]]) -> int:
+        return await self.run(self.sync.mark_unreachable, list(items))
+
+    async def clear_unreachable(self, user_ids: Iterable[int]) -> int:
+        return await self.run(self.sync.clear_unreachable, list(user_ids))
 
+    async def unreachable_before(self, ts: int, limit: int = 500) -> List[int]:
+        return await self.read(self.sync.unreachable_before, ts, limit)
 
+    async def find_user_by_username(self, username: str) -> Optional[dict]:
+        return await self.read(self.sync.find_user_by_username, username)
+
+    async def search_users_by_username(self, prefix: str, limit: int = 10) -> List[dict]:
+        return await self.read(self.sync.search_users_by_username, prefix, limit)
+
+    # ---------------- Materials ----------------
+    async def add_material(self, **fields: Any) -> int:
+        return await self.run(self.sync.add_material, **fields)
+
+    async def get_material(self, mat_id: int) -> dict | None:
+        return await self.read(self.sync.get_material, mat_id)
+
+    async def list_materials(
+        self,
+        *,
+        category: str,
+        lang: str,
+        offset: int = 0,
+        limit: int = 10,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+    ) -> list[dict]:
+        return await self.read(
+            self.sync.list_materials,
+            category=category, lang=lang, offset=offset, limit=limit, after=after, before=before,
+        )
 
-# Global instansiya
-db = DB()
-db.init()  
+    async def count_materials(self, *, category: str, lang: str) -> int:
+        return await self.read(self.sync.count_materials, category=category, lang=lang)
+
+
+# ---------------- Global instansiyalar ----------------
+# Backend DATABASE_URL bo‘yicha tanlanadi; ulanish va migratsiya — birinchi
+# so‘rovda yoki main() dagi `await adb.init()` da.
+#   db  — sinxron SQLite DB (PostgreSQL rejimida None: mahalliy fayl ishlatilmaydi)
+#   adb — handlerlar uchun async API (AsyncDB yoki PostgresDB)
+BACKEND, DB_TARGET = parse_database_url(getattr(settings, "DATABASE_URL", None))
+
+db: Optional[DB]
+adb: Any
+if BACKEND == "postgres":
+    from .postgres import PostgresDB
+
+    db = None
+    adb = PostgresDB(
+        DB_TARGET,
+        min_size=getattr(settings, "PG_POOL_MIN", 1),
+        max_size=getattr(settings, "PG_POOL_MAX", 10),
+        flush_ms=getattr(settings, "ACTIVITY_FLUSH_MS", 2_000),
+        max_rows=getattr(settings, "ACTIVITY_FLUSH_ROWS", 500),
+    )
+else:
+    db = DB(path=DB_TARGET, profile=profile_from_settings())
+    adb = AsyncDB(db)
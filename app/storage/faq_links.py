@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+# app/storage/faq_links.py
+"""
+FAQ savoli (guruhdagi xabar) -> foydalanuvchi bog‘lanishlari (migratsiya 010 / PG 006).
+
+Oldin faq.QUESTION_LINK cheksiz dict edi: xotira o‘sib borardi, qayta ishga
+tushganda esa eski savollarga reply ishlamay qolardi. Endi bog‘lanish
+faq_links jadvalida (PK (chat_id, message_id)), oldida kichik LRU turadi:
+
+    from ..storage.faq_links import faq_links
+    await faq_links.put(chat_id, message_id, user_id=..., first_name=..., lang=...)
+    link = await faq_links.get(chat_id, message_id)    # None — yo‘q yoki muddati o‘tgan
+
+Har bir yozuv `ttl` soniya yashaydi; get() muddati o‘tganini qaytarmaydi,
+prune() esa idx_faq_links_expires bo‘yicha ularni o‘chiradi (rejalashtiruvchi
+orqali davriy chaqiriladi).
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .db import adb
+from .kv import kv
+
+try:
+    from ..config import settings
+except Exception:
+    settings = None  # type: ignore
+
+# Standart: 30 kun (adminlar odatda shu muddat ichida javob beradi)
+DEFAULT_TTL = 30 * 86_400
+CACHE_SIZE = 2_048
+
+Key = Tuple[int, int]
+
+
+def _kv_key(key: Key) -> str:
+    return f"faq:{key[0]}:{key[1]}"
+
+
+class FaqLinkRepository:
+    def __init__(self, db: Any, *, ttl: int = DEFAULT_TTL, cache_size: int = CACHE_SIZE, store: Any = None):
+        self.db = db
+        # Umumiy KV (REDIS_URL) — worker lar orasida ikkinchi daraja kesh
+        self.store = store if store is not None and store.shared else None
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Key, Dict[str, Any]]" = OrderedDict()
+
+    def _remember(self, key: Key, link: Dict[str, Any]) -> None:
+        self._cache[key] = link
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def put(
+        self,
+        chat_id: int,
+        message_id: int,
+        *,
+        user_id: int,
+        first_name: Optional[str] = None,
+        lang: Optional[str] = None,
+    ) -> None:
+        expires_at = int(time.time()) + self.ttl
+        await self.db.exec(
+            """
+            INSERT INTO faq_links (chat_id, message_id, user_id, first_name, lang, expires_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (chat_id, message_id) DO UPDATE SET
+                user_id = excluded.user_id, first_name = excluded.first_name,
+                lang = excluded.lang, expires_at = excluded.expires_at
+            """,
+            (int(chat_id), int(message_id), int(user_id), first_name, lang, expires_at),
+        )
+        link = {"user_id": int(user_id), "first_name": first_name, "lang": lang, "expires_at": expires_at}
+        key = (int(chat_id), int(message_id))
+        self._remember(key, link)
+        if self.store is not None:
+            await self.store.set(_kv_key(key), json.dumps(link, ensure_ascii=False), ttl=self.ttl)
+
+    async def get(self, chat_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        key = (int(chat_id), int(message_id))
+        now = int(time.time())
+        link = self._cache.get(key)
+        if link is None and self.store is not None:
+            raw = await self.store.get(_kv_key(key))
+            if raw:
+                link = json.loads(raw)
+                self._remember(key, link)
+        if link is None:
+            row = await self.db.query_one(
+                """
+                SELECT user_id, first_name, lang, expires_at FROM faq_links
+                WHERE chat_id = ? AND message_id = ?
+                """,
+                key,
+            )
+            if not row:
+                return None
+            link = dict(row)
+            self._remember(key, link)
+        else:
+            self._cache.move_to_end(key)
+        if int(link["expires_at"]) <= now:
+            self._cache.pop(key, None)
+            return None
+        return link
+
+    async def prune(self, now: Optional[int] = None) -> int:
+        """Muddati o‘tgan bog‘lanishlarni o‘chiradi; o‘chirilganlar sonini qaytaradi."""
+        now = int(time.time()) if now is None else int(now)
+        for key in [k for k, v in self._cache.items() if int(v["expires_at"]) <= now]:
+            del self._cache[key]
+        return await self.db.exec("DELETE FROM faq_links WHERE expires_at <= ?", (now,))
+
+
+faq_links = FaqLinkRepository(
+    adb, ttl=int(getattr(settings, "FAQ_LINK_TTL_DAYS", 30) or 30) * 86_400, store=kv,
+)
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# app/storage/fsm.py
+"""
+Bazaga yoziladigan aiogram FSM storage (MemoryStorage o‘rniga; migratsiya 011 / PG 007).
+
+Deploy/qayta ishga tushishda foydalanuvchi bron yoki onboarding o‘rtasida
+qolib ketmaydi. SQL ikkala backendda bir xil (`adb` ning past darajali API si):
+
+    from .storage.fsm import fsm_storage
+    dp = Dispatcher(storage=fsm_storage)
+    dp.update.outer_middleware(fsm_storage.flush_middleware())
+
+- Yozuvlarni birlashtirish: set_state / update_data faqat xotiradagi "dirty"
+  buferga tushadi; update oxirida (flush_middleware) har bir kalit uchun
+  bitta UPSERT/DELETE — handler ichida nechta update_data bo‘lmasin.
+- TTL: har bir yozuv `ttl` soniya yashaydi; tashlab ketilgan holatlar o‘qishda
+  bo‘sh hisoblanadi va davriy ravishda idx_fsm_states_expires bo‘yicha o‘chiriladi.
+- Ixcham format: data — bo‘sh joysiz JSON, holat ham data ham bo‘sh bo‘lsa qator o‘chiriladi.
+- O‘qish keshi (LRU, `cache_size`) faqat bitta jarayon uchun xavfsiz — PostgreSQL
+  (bir nechta worker) rejimida o‘chirilgan.
+
+REDIS_URL berilsa (storage/kv.py) o‘rniga KVStorage ishlatiladi — xuddi shu
+bufer, lekin flush bitta Redis pipeline, TTL esa kalitning EXPIRE i.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Set, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DEFAULT_DESTINY, StateType, StorageKey
+from aiogram.types import TelegramObject
+from loguru import logger
+
+from .db import adb
+from .kv import kv
+
+try:
+    from ..config import settings
+except Exception:
+    settings = None  # type: ignore
+
+# (state, data)
+Record = Tuple[Optional[str], Dict[str, Any]]
+_EMPTY: Record = (None, {})
+
+_UPSERT_SQL = """
+    INSERT INTO fsm_states (key, state, data, expires_at) VALUES (?, ?, ?, ?)
+    ON CONFLICT (key) DO UPDATE SET
+        state = excluded.state, data = excluded.data, expires_at = excluded.expires_at
+"""
+
+
+def _storage_key(key: StorageKey) -> str:
+    """StorageKey -> 'bot:chat:user' (+ thread/business/destiny faqat bo‘lsa)."""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    if key.thread_id or key.business_connection_id or key.destiny != DEFAULT_DESTINY:
+        parts += [str(key.thread_id or ""), key.business_connection_id or "", key.destiny]
+    return ":".join(parts)
+
+
+def _state_str(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _dumps(data: Mapping[str, Any]) -> Optional[str]:
+    if not data:
+        return None
+    # default=str: JSON ga tushmaydigan qiymat (datetime va h.k.) flush ni yiqitmasin
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def _loads(raw: Optional[str]) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+class _BufferedStorage(BaseStorage):
+    """Umumiy qism: dirty bufer, LRU o‘qish keshi, update oxirida flush."""
+
+    def __init__(self, *, ttl: int, cache_size: int):
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self._dirty: Dict[str, Record] = {}
+        # Yozilayotgan (persist tugamagan) yozuvlar: shu orada _load eski holatni o‘qimasin
+        self._inflight: Dict[str, Record] = {}
+        self._flushes = 0   # tugagan persist lar soni (o‘qish bilan poyga uchun)
+        self._cache: "OrderedDict[str, Record]" = OrderedDict()
+
+    # ---------------- BaseStorage ----------------
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        k = _storage_key(key)
+        _, data = await self._load(k)
+        self._dirty[k] = (_state_str(state), data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._load(_storage_key(key)))[0]
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        k = _storage_key(key)
+        state, _ = await self._load(k)
+        self._dirty[k] = (state, copy.deepcopy(dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return copy.deepcopy((await self._load(_storage_key(key)))[1])
+
+    async def close(self) -> None:
+        await self.flush()
+
+    # ---------------- Write-behind ----------------
+    async def flush(self) -> int:
+        """Yig‘ilgan o‘zgarishlarni yozadi; yozilgan kalitlar soni."""
+        if not self._dirty:
+            await self._after_flush()
+            return 0
+        batch, self._dirty = self._dirty, {}
+        self._inflight.update(batch)
+        try:
+            failed = await self._persist(batch)
+        except BaseException:
+            failed = set(batch)
+            raise
+        finally:
+            for k, rec in batch.items():
+                if k in failed:
+                    # keyingi flush da qayta urinamiz (shu orada yangisi kelmagan bo‘lsa)
+                    self._dirty.setdefault(k, rec)
+                else:
+                    self._remember(k, rec)
+                if self._inflight.get(k) is rec:
+                    del self._inflight[k]
+            self._flushes += 1
+        await self._after_flush()
+        return len(batch) - len(failed)
+
+    def flush_middleware(self) -> "FSMFlushMiddleware":
+        return FSMFlushMiddleware(self)
+
+    # ---------------- Backend ----------------
+    async def _fetch(self, k: str) -> Record:
+        raise NotImplementedError
+
+    async def _persist(self, batch: Dict[str, Record]) -> Set[str]:
+        """Yozadi; yozilmay qolgan kalitlarni qaytaradi."""
+        raise NotImplementedError
+
+    async def _after_flush(self) -> None:
+        pass
+
+    # ---------------- Internal ----------------
+    def _remember(self, k: str, rec: Record) -> None:
+        if self.cache_size <= 0:
+            return
+        self._cache[k] = rec
+        self._cache.move_to_end(k)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def _load(self, k: str) -> Record:
+        rec = self._pending(k)
+        if rec is not None:
+            return rec
+        rec = self._cache.get(k)
+        if rec is not None:
+            self._cache.move_to_end(k)
+            return rec
+        gen = self._flushes
+        rec = await self._fetch(k)
+        # O‘qish paytida shu kalitga yozuv bo‘lgan bo‘lsa — bazadagi (eski) qiymat emas, u
+        newer = self._pending(k) or self._cache.get(k)
+        if newer is not None:
+            return newer
+        if self._flushes != gen:
+            # orada flush tugadi (kesh o‘chiq bo‘lishi mumkin) — yozilganini qayta o‘qiymiz
+            rec = await self._fetch(k)
+        self._remember(k, rec)
+        return rec
+
+    def _pending(self, k: str) -> Optional[Record]:
+        rec = self._dirty.get(k)
+        return rec if rec is not None else self._inflight.get(k)
+
+
+class DBStorage(_BufferedStorage):
+    """fsm_states jadvali (SQLite / PostgreSQL)."""
+
+    def __init__(
+        self,
+        db: Any,
+        *,
+        ttl: int = 7 * 86_400,
+        cache_size: int = 10_000,
+        prune_every: int = 3600,
+    ):
+        super().__init__(ttl=ttl, cache_size=cache_size)
+        self.db = db
+        self.prune_every = prune_every
+        self._next_prune = 0.0
+
+    async def prune(self, now: Optional[int] = None) -> int:
+        """Muddati o‘tgan holatlarni o‘chiradi."""
+        now = int(time.time()) if now is None else int(now)
+        return await self.db.exec("DELETE FROM fsm_states WHERE expires_at <= ?", (now,))
+
+    async def _fetch(self, k: str) -> Record:
+        row = await self.db.query_one(
+            "SELECT state, data, expires_at FROM fsm_states WHERE key = ?", (k,)
+        )
+        if not row or int(row["expires_at"]) <= time.time():
+            return _EMPTY
+        return (row["state"], _loads(row["data"]))
+
+    async def _persist(self, batch: Dict[str, Record]) -> Set[str]:
+        # Kalit boshiga bitta so‘rov (odatda update da bitta kalit)
+        expires_at = int(time.time()) + self.ttl
+        failed: Set[str] = set()
+        for k, (state, data) in batch.items():
+            try:
+                if state is None and not data:
+                    await self.db.exec("DELETE FROM fsm_states WHERE key = ?", (k,))
+                else:
+                    await self.db.exec(_UPSERT_SQL, (k, state, _dumps(data), expires_at))
+            except Exception as e:
+                logger.error(f"FSM flush failed for {k}: {e}")
+                failed.add(k)
+        return failed
+
+    async def _after_flush(self) -> None:
+        now = time.time()
+        if now < self._next_prune:
+            return
+        self._next_prune = now + self.prune_every
+        try:
+            n = await self.prune(int(now))
+            if n:
+                logger.info(f"🧹 FSM states expired: {n}")
+        except Exception as e:
+            logger.warning(f"FSM prune skipped: {e}")
+
+
+class KVStorage(_BufferedStorage):
+    """
+    storage/kv.py ustida (REDIS_URL): bir nechta worker bitta holatni ko‘radi.
+    Yozish — bitta pipeline (SET ... EX ttl / DEL), muddatni Redis o‘zi o‘chiradi.
+    Lokal kesh yo‘q: boshqa worker yozgan holat darhol ko‘rinadi.
+    """
+
+    def __init__(self, store: Any, *, ttl: int = 7 * 86_400):
+        super().__init__(ttl=ttl, cache_size=0)
+        self.store = store
+
+    async def _fetch(self, k: str) -> Record:
+        raw = await self.store.get(f"fsm:{k}")
+        if not raw:
+            return _EMPTY
+        try:
+            state, data = json.loads(raw)
+        except ValueError:
+            return _EMPTY
+        return (state, data if isinstance(data, dict) else {})
+
+    async def _persist(self, batch: Dict[str, Record]) -> Set[str]:
+        items = {
+            f"fsm:{k}": None if state is None and not data
+            else json.dumps([state, data or None], ensure_ascii=False, separators=(",", ":"), default=str)
+            for k, (state, data) in batch.items()
+        }
+        try:
+            await self.store.set_many(items, ttl=self.ttl)
+        except Exception as e:
+            logger.error(f"FSM flush failed ({len(batch)} keys): {e}")
+            return set(batch)
+        return set()
+
+
+class FSMFlushMiddleware(BaseMiddleware):
+    """dp.update outer middleware: update tugagach storage buferini yozadi."""
+
+    def __init__(self, storage: _BufferedStorage):
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        try:
+            return await handler(event, data)
+        finally:
+            await self.storage.flush()
+
+
+_FSM_TTL = int(getattr(settings, "FSM_STATE_TTL_DAYS", 7) or 7) * 86_400
+
+if kv.shared:
+    fsm_storage: _BufferedStorage = KVStorage(kv, ttl=_FSM_TTL)
+else:
+    fsm_storage = DBStorage(
+        adb,
+        ttl=_FSM_TTL,
+        # Bir nechta worker bazani bo‘lishadi — lokal kesh eskirib qolishi mumkin
+        cache_size=0 if getattr(adb, "backend", "sqlite") == "postgres" else 10_000,
+    )
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+# app/storage/jobs.py
+"""
+Rejalashtirilgan ishlar ombori (scheduled_jobs, migratsiya 009, 015 / PG 005, 011).
+
+Vaqt — UTC epoch soniyalar. Rejalashtiruvchi (app/scheduler.py) bazadan faqat
+yaqin oynadagi ishlarni o‘qiydi: idx_jobs_status_run_at bo‘yicha diapazon,
+shuning uchun o‘n minglab kelajakdagi ishlar ishga tushishni sekinlashtirmaydi.
+
+Bajarish — ijara bilan "kamida bir marta": claim() ishni pending -> running ga
+compare-and-set qiladi va run_at ni ijara tugash vaqtiga suradi (bir nechta
+jarayondan faqat bittasi oladi). Handler tugagach complete() -> done. Jarayon
+o‘lsa ish running bo‘lib qoladi va ijara tugagach due_before() uni yana beradi.
+attempts — "fencing" belgisi: ijarasi o‘tib ketgan eski egasi yangisining
+natijasini ustidan yozmaydi.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+from .db import adb
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"     # run_at — ijara tugash vaqti
+JOB_DONE = "done"
+JOB_CANCELED = "canceled"
+JOB_FAILED = "failed"
+
+_COLS = "id, kind, run_at, payload, ref, status, attempts"
+
+
+def _job(row: Any) -> Dict[str, Any]:
+    j = dict(row)
+    try:
+        j["payload"] = json.loads(j.get("payload") or "{}")
+    except ValueError:
+        j["payload"] = {}
+    return j
+
+
+class JobRepository:
+    def __init__(self, db: Any):
+        self.db = db
+
+    async def add(
+        self, kind: str, run_at: int, payload: Optional[Dict[str, Any]] = None, *, ref: Optional[str] = None,
+    ) -> int:
+        return await self.db.insert(
+            "INSERT INTO scheduled_jobs (kind, run_at, payload, ref) VALUES (?, ?, ?, ?) RETURNING id",
+            (kind, int(run_at), json.dumps(payload or {}, ensure_ascii=False, separators=(",", ":")), ref),
+        )
+
+    async def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        row = await self.db.query_one(f"SELECT {_COLS} FROM scheduled_jobs WHERE id = ?", (job_id,))
+        return _job(row) if row else None
+
+    async def due_before(self, until: int, *, limit: int = 1_000) -> List[Dict[str, Any]]:
+        """`until` gacha bajarilishi kerak bo‘lgan pending ishlar va ijarasi tugaydigan running lar."""
+        rows = await self.db.query_all(
+            f"""
+            SELECT {_COLS} FROM scheduled_jobs
+            WHERE status IN (?, ?) AND run_at <= ?
+            ORDER BY run_at
+            LIMIT ?
+            """,
+            (JOB_PENDING, JOB_RUNNING, int(until), int(limit)),
+        )
+        return [_job(r) for r in rows]
+
+    async def claim(self, job_id: int, lease: int) -> bool:
+        """
+        Vaqti kelgan pending (yoki ijarasi tugagan running) -> running (CAS), run_at —
+        hozir + lease. True — ish shu jarayonga tegdi.
+        """
+        now = int(time.time())
+        n = await self.db.exec(
+            """
+            UPDATE scheduled_jobs SET status = ?, run_at = ?, attempts = attempts + 1
+            WHERE id = ? AND status IN (?, ?) AND run_at <= ?
+            """,
+            (JOB_RUNNING, now + int(lease), job_id, JOB_PENDING, JOB_RUNNING, now),
+        )
+        return n > 0
+
+    async def complete(self, job_id: int, attempts: int) -> bool:
+        """running -> done. False — ijara o‘tib ketgan va ishni boshqasi olgan (yoki bekor qilingan)."""
+        return await self._finish(job_id, attempts, "status = ?", (JOB_DONE,))
+
+    async def retry(self, job_id: int, run_at: int, error: str, *, attempts: int) -> bool:
+        return await self._finish(
+            job_id, attempts, "status = ?, run_at = ?, last_error = ?", (JOB_PENDING, int(run_at), error[:500]),
+        )
+
+    async def fail(self, job_id: int, error: str, *, attempts: int) -> bool:
+        return await self._finish(job_id, attempts, "status = ?, last_error = ?", (JOB_FAILED, error[:500]))
+
+    async def _finish(self, job_id: int, attempts: int, sets: str, params: tuple) -> bool:
+        # Faqat o‘z ijarasidagi ish (attempts — fencing): eski egasi yangisini buzmaydi
+        n = await self.db.exec(
+            f"UPDATE scheduled_jobs SET {sets} WHERE id = ? AND status = ? AND attempts = ?",
+            (*params, job_id, JOB_RUNNING, int(attempts)),
+        )
+        return n > 0
+
+    async def cancel_ref(self, ref: str) -> int:
+        """
+        Shu ref ga tegishli pending ishlarni bekor qiladi (masalan 'booking:1001').
+        running lar ham: o‘lgan jarayondan qolgan ish ijara tugagach qayta ishga tushmasin.
+        """
+        return await self.db.exec(
+            "UPDATE scheduled_jobs SET status = ? WHERE ref = ? AND status IN (?, ?)",
+            (JOB_CANCELED, ref, JOB_PENDING, JOB_RUNNING),
+        )
+
+    async def purge(self, older_than: int) -> int:
+        """Tugagan/bekor qilingan eski ishlarni o‘chiradi (jadval o‘smasligi uchun)."""
+        return await self.db.exec(
+            "DELETE FROM scheduled_jobs WHERE status IN (?, ?, ?) AND run_at < ?",
+            (JOB_DONE, JOB_CANCELED, JOB_FAILED, int(older_than)),
+        )
+
+
+jobs = JobRepository(adb)
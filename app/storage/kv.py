@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+# app/storage/kv.py
+"""
+Kalit-qiymat qatlami: FSM, foydalanuvchi atributlari va FAQ bog‘lanishlari uchun
+bitta interfeys. REDIS_URL bo‘yicha tanlanadi:
+
+    REDIS_URL yo‘q          -> LocalKV  (jarayon ichidagi LRU+TTL, bitta worker uchun)
+    redis://host:6379/0     -> RedisKV  (bir nechta worker bitta holatni ko‘radi)
+    fakeredis://            -> RedisKV  fakeredis ustida (lokal sinov uchun)
+
+    from .kv import kv
+    await kv.set("faq:-100:42", json_str, ttl=86400)
+    await kv.set_many({"a": "1", "b": None}, ttl=60)   # None — o‘chirish; bitta pipeline
+    values = await kv.get_many(["a", "b"])              # bitta MGET
+    n = await kv.append("album:1:42", part, ttl=60)     # ro‘yxatga qo‘shish (RPUSH), yangi uzunlik
+    parts = await kv.get_list("album:1:42")
+
+Qiymatlar — satr (chaqiruvchi o‘zi JSON qiladi). RedisKV barcha kalitlarga
+REDIS_PREFIX qo‘shadi. `kv.shared` — holat jarayonlar orasida umumiymi.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Mapping, Optional, Tuple
+
+from loguru import logger
+
+# Ixtiyoriy: faqat REDIS_URL berilganda kerak
+try:
+    from redis import asyncio as aioredis  # type: ignore
+except Exception:
+    aioredis = None  # type: ignore
+
+try:
+    from ..config import settings
+except Exception:
+    settings = None  # type: ignore
+
+
+class LocalKV:
+    """Jarayon ichidagi LRU+TTL (umumiy emas)."""
+
+    shared = False
+
+    def __init__(self, maxsize: int = 100_000):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def _put(self, key: str, value: str, ttl: Optional[int]) -> None:
+        self._data[key] = (time.monotonic() + ttl if ttl else float("inf"), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        if item[0] <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item[1]
+
+    async def get_many(self, keys: Iterable[str]) -> List[Optional[str]]:
+        return [await self.get(k) for k in keys]
+
+    async def set(self, key: str, value: str, *, ttl: Optional[int] = None) -> None:
+        self._put(key, value, ttl)
+
+    async def set_many(self, items: Mapping[str, Optional[str]], *, ttl: Optional[int] = None) -> None:
+        for k, v in items.items():
+            if v is None:
+                self._data.pop(k, None)
+            else:
+                self._put(k, v, ttl)
+
+    async def append(self, key: str, value: str, *, ttl: Optional[int] = None) -> int:
+        # Ro‘yxat JSON satr sifatida; get() to‘xtamaydi — event-loop ichida atomar
+        items = json.loads(await self.get(key) or "[]")
+        items.append(value)
+        self._put(key, json.dumps(items), ttl)
+        return len(items)
+
+    async def get_list(self, key: str) -> List[str]:
+        return json.loads(await self.get(key) or "[]")
+
+    async def delete(self, *keys: str) -> None:
+        for k in keys:
+            self._data.pop(k, None)
+
+    async def close(self) -> None:
+        self._data.clear()
+
+
+class RedisKV:
+    """Redis protokoli (redis-server, KeyDB, Dragonfly yoki fakeredis)."""
+
+    shared = True
+
+    def __init__(self, client: Any, *, prefix: str = "mcb"):
+        self.client = client
+        self.prefix = f"{prefix}:" if prefix else ""
+
+    @classmethod
+    def from_url(cls, url: str, *, prefix: str = "mcb") -> "RedisKV":
+        if url.startswith("fakeredis://"):
+            import fakeredis  # type: ignore  # faqat sinov uchun
+            return cls(fakeredis.FakeAsyncRedis(decode_responses=True), prefix=prefix)
+        if aioredis is None:
+            raise RuntimeError("REDIS_URL berilgan, lekin 'redis' paketi o‘rnatilmagan (pip install redis)")
+        return cls(aioredis.from_url(url, decode_responses=True), prefix=prefix)
+
+    def _k(self, key: str) -> str:
+        return self.prefix + key
+
+    async def get(self, key: str) -> Optional[str]:
+        return await self.client.get(self._k(key))
+
+    async def get_many(self, keys: Iterable[str]) -> List[Optional[str]]:
+        keys = [self._k(k) for k in keys]
+        return list(await self.client.mget(keys)) if keys else []
+
+    async def set(self, key: str, value: str, *, ttl: Optional[int] = None) -> None:
+        await self.client.set(self._k(key), value, ex=ttl or None)
+
+    async def set_many(self, items: Mapping[str, Optional[str]], *, ttl: Optional[int] = None) -> None:
+        """Barcha SET/DEL — bitta pipeline (bitta round trip)."""
+        if not items:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for k, v in items.items():
+            if v is None:
+                pipe.delete(self._k(k))
+            else:
+                pipe.set(self._k(k), v, ex=ttl or None)
+        await pipe.execute()
+
+    async def append(self, key: str, value: str, *, ttl: Optional[int] = None) -> int:
+        """RPUSH (+ EXPIRE) bitta MULTI da — bir nechta worker bir ro‘yxatga yozadi."""
+        pipe = self.client.pipeline(transaction=True)
+        pipe.rpush(self._k(key), value)
+        if ttl:
+            pipe.expire(self._k(key), int(ttl))
+        return int((await pipe.execute())[0])
+
+    async def get_list(self, key: str) -> List[str]:
+        return list(await self.client.lrange(self._k(key), 0, -1))
+
+    async def delete(self, *keys: str) -> None:
+        if keys:
+            await self.client.delete(*(self._k(k) for k in keys))
+
+    async def close(self) -> None:
+        try:
+            await self.client.aclose()
+        except AttributeError:  # redis < 5
+            await self.client.close()
+
+
+def user_key(user_id: int) -> str:
+    """Foydalanuvchi atributlari nusxasi (middlewares.UserContext) kaliti."""
+    return f"user:{user_id}"
+
+
+async def forget_users(user_ids: Iterable[int], *, chunk_size: int = 1_000) -> None:
+    """Ommaviy yozuvdan keyin umumiy KV dagi atribut nusxalarini bo‘laklab o‘chiradi."""
+    if not kv.shared:
+        return
+    keys = [user_key(int(u)) for u in user_ids]
+    for i in range(0, len(keys), chunk_size):
+        await kv.delete(*keys[i:i + chunk_size])
+
+
+def make_kv(url: Optional[str], *, prefix: str = "mcb") -> Any:
+    if not url:
+        return LocalKV()
+    return RedisKV.from_url(url, prefix=prefix)
+
+
+REDIS_URL: Optional[str] = getattr(settings, "REDIS_URL", None) or None
+
+try:
+    kv = make_kv(REDIS_URL, prefix=getattr(settings, "REDIS_PREFIX", None) or "mcb")
+except Exception as e:
+    logger.error(f"⚠️ Redis unavailable ({e}); falling back to process-local KV")
+    kv = LocalKV()
@@ -1,66 +1,113 @@
 # -*- coding: utf-8 -*-
 # app/storage/memory.py
 """
-In-memory soddalashtirilgan kesh.
+Foydalanuvchi atributlari keshi (til, telefon, profil) — DB ustidan yupqa qatlam.
 Asosiy saqlash — app/storage/db.py dagi SQLite (bo‘lsa). Bo‘lmasa ham ishlaydi.
+
+Kesh — storage/cache.py dagi hajmi cheklangan LRU+TTL (USER_CACHE_SIZE,
+USER_CACHE_TTL). Miss bo‘lganda bitta tor so‘rov (get_user_attrs, SELECT * emas)
+bajariladi va natija — bazada yo‘q foydalanuvchi ham (negativ yozuv) — keshlanadi.
+DB.upsert_user yozgandan keyin shu foydalanuvchi yozuvini o‘zi bekor qiladi.
+
+O‘quvchilar (get_lang, get_phone, get_profile, is_onboarded) — async: miss
+`adb` orqali o‘qiladi (SQLite da executor thread, PG da asyncpg), event-loop
+bloklanmaydi. Ko‘pincha middleware shu update uchun keshni to‘ldirgan bo‘ladi:
+
+    lang = await get_lang(message.from_user.id, "uz")
+
+Yozuvchilar (set_lang, set_profile, ...) sinxron qoldi — PostgreSQL backendda
+sinxron DB yo‘q, u yerda ular faqat keshga yozadi (handlerlar `user_ctx` / `adb` dan foydalanadi).
 """
 
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
+
+from .cache import user_cache
+
+
+class _DummyDB:
+    def get_user(self, user_id: int) -> dict: return {}
+    def get_user_attrs(self, user_id: int) -> dict: return {}
+    def set_lang(self, user_id: int, lang: str) -> None: ...
+    def set_phone(self, user_id: int, phone: str) -> None: ...
+    def upsert_user(self, user_id: int, **kwargs) -> None: ...
+    def is_onboarded(self, user_id: int) -> bool: return False
+    def set_onboarded(self, user_id: int, value: bool = True) -> None: ...
+
 
 # Ixtiyoriy DB: bor-bo‘lmasin yiqilmasin
 try:
-    from .db import db  # kutilyotgan API: get_user, set_lang, set_phone, upsert_user, is_onboarded, set_onboarded
+    from .db import db  # kutilyotgan API: get_user_attrs, set_lang, set_phone, upsert_user, set_onboarded
+except Exception:
+    db = None
+try:
+    from .db import adb  # o‘qish: await adb.get_user_attrs (ikkala backend)
 except Exception:
-    class _DummyDB:
-        def get_user(self, user_id: int) -> dict: return {}
-        def set_lang(self, user_id: int, lang: str) -> None: ...
-        def set_phone(self, user_id: int, phone: str) -> None: ...
-        def upsert_user(self, user_id: int, **kwargs) -> None: ...
-        def is_onboarded(self, user_id: int) -> bool: return False
-        def set_onboarded(self, user_id: int, value: bool = True) -> None: ...
+    adb = None
+if db is None:
     db = _DummyDB()
 
-# --- Til kesh (ixtiyoriy) ---
-_LANGS: Dict[int, str] = {}
+# DB yo‘q (PG backend / import xatosi) — yozilgan qiymatlarning yagona manbai kesh
+_CACHE_ONLY = isinstance(db, _DummyDB)
+
+
+async def _attrs(user_id: int) -> Dict[str, Any]:
+    """Keshdan yoki adb orqali bitta tor so‘rov bilan; bazada yo‘q bo‘lsa {} (negativ keshlanadi)."""
+    token = user_cache.version()
+    hit, u = user_cache.lookup(user_id)
+    if not hit:
+        if adb is None:
+            # Baza umuman yo‘q: "yo‘q" deb keshlamaymiz — faqat yozilgan qiymatlar turadi
+            return {}
+        try:
+            u = await adb.get_user_attrs(user_id) or None
+        except Exception:
+            return {}  # xatoni keshlamaymiz
+        # O‘qish davomida upsert_user (writer thread) invalidate qilgan bo‘lsa — keshlamaymiz
+        user_cache.put(user_id, u, since=token)
+    return u or {}
 
+
+def _remember(user_id: int, written: bool, **fields: Any) -> None:
+    # Yozuv muvaffaqiyatli bo‘lsa DB.upsert_user keshni o‘zi bekor qilgan;
+    # aks holda (yoki DB yo‘q bo‘lsa) qiymatni keshda ushlab turamiz
+    user_cache.patch(user_id, create=_CACHE_ONLY or not written, **fields)
+
+
+def cache_stats() -> Dict[str, Any]:
+    """hits / misses / size — diagnostika uchun."""
+    return user_cache.stats()
+
+# --- Til ---
 def set_lang(user_id: int, lang: str) -> None:
-    _LANGS[user_id] = lang
     try:
         db.set_lang(user_id, lang)
+        written = True
     except Exception:
-        pass
-
-def get_lang(user_id: int, default: str = "uz") -> str:
-    try:
-        return _LANGS.get(user_id) or db.get_user(user_id).get("lang") or default
-    except Exception:
-        return _LANGS.get(user_id, default)
+        written = False
+    _remember(user_id, written, lang=lang)
 
-# --- Telefon (kesh) ---
-_PHONES: Dict[int, str] = {}
+async def get_lang(user_id: int, default: str = "uz") -> str:
+    return (await _attrs(user_id)).get("lang") or default
 
+# --- Telefon ---
 def set_phone(user_id: int, phone: str) -> None:
     if phone:
-        _PHONES[user_id] = phone
         try:
             db.set_phone(user_id, phone)
+            written = True
         except Exception:
-            pass
+            written = False
+        _remember(user_id, written, phone=phone)
 
-def get_phone(user_id: int, default: Optional[str] = None) -> Optional[str]:
-    try:
-        return _PHONES.get(user_id) or db.get_user(user_id).get("phone") or default
-    except Exception:
-        return _PHONES.get(user_id, default)
+async def get_phone(user_id: int, default: Optional[str] = None) -> Optional[str]:
+    return (await _attrs(user_id)).get("phone") or default
 
 # --- Profil API (DB-ustidan yupqa o‘rama) ---
 _ALLOWED_DB_FIELDS = {"name", "phone", "username", "onboarded", "lang"}
 
-def get_profile(user_id: int) -> dict:
-    try:
-        return db.get_user(user_id) or {}
-    except Exception:
-        return {}
+async def get_profile(user_id: int) -> dict:
+    # Nusxa: chaqiruvchi o‘zgartirsa kesh buzilmasin
+    return dict(await _attrs(user_id))
 
 def set_profile(user_id: int, **kwargs) -> None:
     # DB’ga faqat tanlangan maydonlarni yuboramiz (aks holda upsert_user xafa bo‘ladi)
@@ -69,17 +116,18 @@ def set_profile(user_id: int, **kwargs) -> None:
         return
     try:
         db.upsert_user(user_id, **payload)
+        written = True
     except Exception:
-        pass
+        written = False
+    _remember(user_id, written, **payload)
 
-def is_onboarded(user_id: int) -> bool:
-    try:
-        return bool(db.is_onboarded(user_id))
-    except Exception:
-        return False
+async def is_onboarded(user_id: int) -> bool:
+    return bool((await _attrs(user_id)).get("onboarded", 0))
 
 def set_onboarded(user_id: int, value: bool = True) -> None:
     try:
         db.set_onboarded(user_id, value)
+        written = True
     except Exception:
-        pass
+        written = False
+    _remember(user_id, written, onboarded=1 if value else 0)
@@ -0,0 +1,485 @@
+# -*- coding: utf-8 -*-
+# app/storage/migrations.py
+"""
+Versiyalangan sxema migratsiyalari (PRAGMA user_version).
+
+Har bir migratsiya tartib raqami bilan ro‘yxatdan o‘tadi va o‘z tranzaksiyasida
+bajariladi; muvaffaqiyatli bo‘lsa user_version shu raqamga ko‘tariladi.
+Sxema dolzarb bo‘lsa, ishga tushish — bitta `PRAGMA user_version` o‘qish.
+
+Yangi migratsiya qo‘shish:
+
+    @migration(7, "example table")
+    def _m007_example(conn):
+        conn.execute("CREATE TABLE ...")
+
+Eslatma: qo‘llanib bo‘lingan migratsiyani o‘zgartirmang — yangisini qo‘shing.
+PostgreSQL backend uchun mos migratsiya postgres.PG_MIGRATIONS ga qo‘shiladi.
+1..5 migratsiyalar user_version paydo bo‘lishidan oldingi bazalarda ham
+xavfsiz (IF NOT EXISTS / ustun tekshiruvi), chunki ular 0-versiyadan boshlanadi.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+from loguru import logger
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+
+
+MIGRATIONS: Dict[int, Migration] = {}
+
+
+def migration(version: int, name: str):
+    def deco(fn: Callable[[sqlite3.Connection], None]):
+        if version in MIGRATIONS:
+            raise ValueError(f"Migration {version} already registered: {MIGRATIONS[version].name}")
+        MIGRATIONS[version] = Migration(version, name, fn)
+        return fn
+    return deco
+
+
+def latest_version() -> int:
+    return max(MIGRATIONS) if MIGRATIONS else 0
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return int(conn.execute("PRAGMA user_version;").fetchone()[0])
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Kerakli migratsiyalarni tartib bilan qo‘llaydi va yakuniy versiyani qaytaradi."""
+    current = current_version(conn)
+    if current >= latest_version():
+        return current
+
+    pending: List[Migration] = [MIGRATIONS[v] for v in sorted(MIGRATIONS) if v > current]
+    for m in pending:
+        t0 = time.perf_counter()
+        conn.execute("BEGIN;")
+        try:
+            m.apply(conn)
+            # PRAGMA qiymatiga parametr berib bo‘lmaydi — int() bilan xavfsiz
+            conn.execute(f"PRAGMA user_version = {int(m.version)};")
+            conn.execute("COMMIT;")
+        except Exception:
+            conn.execute("ROLLBACK;")
+            logger.exception(f"❌ Migration {m.version:03d} '{m.name}' failed")
+            raise
+        logger.info(f"🧱 Migration {m.version:03d} '{m.name}': {(time.perf_counter() - t0) * 1000:.1f} ms")
+        current = m.version
+    return current
+
+
+# ---------------- Helpers ----------------
+def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table});").fetchall()]
+    return column in cols
+
+
+# ---------------- Migrations ----------------
+@migration(1, "users table")
+def _m001_users(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id     INTEGER UNIQUE NOT NULL,
+            username    TEXT,
+            name        TEXT,
+            phone       TEXT,
+            lang        TEXT,
+            onboarded   INTEGER DEFAULT 0,
+            created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    # Eski bazalarda yetishmayotgan ustunlar
+    if not _column_exists(conn, "users", "last_feature"):
+        conn.execute("ALTER TABLE users ADD COLUMN last_feature TEXT;")
+    if not _column_exists(conn, "users", "last_seen"):
+        conn.execute("ALTER TABLE users ADD COLUMN last_seen DATETIME;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_user_id ON users(user_id);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_last_seen ON users(last_seen);")
+
+
+@migration(2, "materials table")
+def _m002_materials(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS materials (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            category      TEXT NOT NULL CHECK (category IN ('book','article','video','audio')),
+            lang          TEXT NOT NULL,
+            title         TEXT NOT NULL,
+            description   TEXT,
+            is_paid       INTEGER NOT NULL DEFAULT 0,
+            price_cents   INTEGER NOT NULL DEFAULT 0,
+            source_type   TEXT NOT NULL CHECK (source_type IN ('file_id','url','text')),
+            source_ref    TEXT NOT NULL,
+            created_by    INTEGER,
+            created_at    DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+
+
+@migration(3, "users activity index")
+def _m003_users_activity(conn: sqlite3.Connection) -> None:
+    # Ifoda db._ACTIVITY_EXPR bilan aynan bir xil bo‘lishi shart
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_activity "
+        "ON users(COALESCE(last_seen, created_at, '') DESC, user_id DESC);"
+    )
+
+
+@migration(4, "users username NOCASE index")
+def _m004_username_ci(conn: sqlite3.Connection) -> None:
+    conn.execute("DROP INDEX IF EXISTS idx_users_username;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_username_ci ON users(username COLLATE NOCASE);")
+
+
+@migration(5, "materials catalog index and counters")
+def _m005_materials_catalog(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_materials_cat_lang_created "
+        "ON materials(category, lang, created_at DESC, id DESC);"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS material_counts (
+            category  TEXT NOT NULL,
+            lang      TEXT NOT NULL,
+            n         INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (category, lang)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_materials_count_ins AFTER INSERT ON materials
+        BEGIN
+            INSERT INTO material_counts (category, lang, n) VALUES (NEW.category, NEW.lang, 1)
+            ON CONFLICT(category, lang) DO UPDATE SET n = n + 1;
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_materials_count_del AFTER DELETE ON materials
+        BEGIN
+            UPDATE material_counts SET n = n - 1
+            WHERE category = OLD.category AND lang = OLD.lang;
+        END;
+        """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_materials_count_upd AFTER UPDATE OF category, lang ON materials
+        WHEN OLD.category IS NOT NEW.category OR OLD.lang IS NOT NEW.lang
+        BEGIN
+            UPDATE material_counts SET n = n - 1
+            WHERE category = OLD.category AND lang = OLD.lang;
+            INSERT INTO material_counts (category, lang, n) VALUES (NEW.category, NEW.lang, 1)
+            ON CONFLICT(category, lang) DO UPDATE SET n = n + 1;
+        END;
+        """
+    )
+    # Mavjud materiallardan hisoblagichlarni (qayta) to‘ldiramiz — idempotent
+    conn.execute("DELETE FROM material_counts;")
+    conn.execute(
+        """
+        INSERT INTO material_counts (category, lang, n)
+        SELECT category, lang, COUNT(*) FROM materials GROUP BY category, lang;
+        """
+    )
+
+
+@migration(6, "bookings table")
+def _m006_bookings(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS bookings (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id     INTEGER NOT NULL,
+            chat_id     INTEGER,
+            lang        TEXT,
+            year        INTEGER NOT NULL,
+            month       INTEGER NOT NULL,
+            day         INTEGER NOT NULL,
+            time        TEXT NOT NULL,
+            status      TEXT NOT NULL DEFAULT 'pending'
+                        CHECK (status IN ('pending','approved','retime_requested','canceled')),
+            biz_name    TEXT,
+            biz_desc    TEXT,
+            revenue     TEXT,
+            profile     TEXT,
+            created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    # Kun bo‘yicha band slotlar — bitta indeks SEARCH (time oxirida: covering)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_bookings_date_status "
+        "ON bookings(year, month, day, status, time);"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bookings_user_status ON bookings(user_id, status);")
+    # Eski BOOKING_SEQ raqamlash 1001 dan boshlanardi — davom ettiramiz
+    conn.execute(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'bookings', 1000 "
+        "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'bookings');"
+    )
+
+
+@migration(7, "booking slot bitmaps")
+def _m007_booking_slots(conn: sqlite3.Connection) -> None:
+    # Har bir sana uchun 12 bitli maska: bit i => (08 + i):00 sloti band
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS booking_slots (
+            year   INTEGER NOT NULL,
+            month  INTEGER NOT NULL,
+            day    INTEGER NOT NULL,
+            mask   INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month, day)
+        ) WITHOUT ROWID;
+        """
+    )
+    # Mavjud tasdiqlangan bronlardan to‘ldiramiz (bookings.refresh_day bilan bir xil ifoda)
+    conn.execute("DELETE FROM booking_slots;")
+    conn.execute(
+        """
+        INSERT INTO booking_slots (year, month, day, mask)
+        SELECT year, month, day, SUM(DISTINCT 1 << (CAST(substr(time, 1, 2) AS INTEGER) - 8))
+        FROM bookings
+        WHERE status = 'approved'
+          AND time IN ('08:00','09:00','10:00','11:00','12:00','13:00',
+                       '14:00','15:00','16:00','17:00','18:00','19:00')
+        GROUP BY year, month, day;
+        """
+    )
+
+
+@migration(8, "unique active booking slot")
+def _m008_booking_slot_unique(conn: sqlite3.Connection) -> None:
+    # Avvalgi dict davridan qolgan to‘qnashuvlar: har bir slotda bittasi qoladi
+    # (tasdiqlangani, bo‘lmasa eng birinchisi), qolganlari bekor qilinadi
+    conn.execute(
+        """
+        UPDATE bookings SET status = 'canceled'
+        WHERE status IN ('pending','approved')
+          AND id <> (
+              SELECT b2.id FROM bookings AS b2
+              WHERE b2.year = bookings.year AND b2.month = bookings.month
+                AND b2.day = bookings.day AND b2.time = bookings.time
+                AND b2.status IN ('pending','approved')
+              ORDER BY (b2.status = 'approved') DESC, b2.id
+              LIMIT 1
+          );
+        """
+    )
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_bookings_active_slot "
+        "ON bookings(year, month, day, time) WHERE status IN ('pending','approved');"
+    )
+    # Endi pending ham slotni band qiladi — maskalarni qayta hisoblaymiz
+    conn.execute("DELETE FROM booking_slots;")
+    conn.execute(
+        """
+        INSERT INTO booking_slots (year, month, day, mask)
+        SELECT year, month, day, SUM(DISTINCT 1 << (CAST(substr(time, 1, 2) AS INTEGER) - 8))
+        FROM bookings
+        WHERE status IN ('pending','approved')
+          AND time IN ('08:00','09:00','10:00','11:00','12:00','13:00',
+                       '14:00','15:00','16:00','17:00','18:00','19:00')
+        GROUP BY year, month, day;
+        """
+    )
+
+
+@migration(9, "scheduled jobs")
+def _m009_scheduled_jobs(conn: sqlite3.Connection) -> None:
+    # run_at — UTC epoch soniyalar (backendlar orasida bir xil, vaqt zonasidan mustaqil)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS scheduled_jobs (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind        TEXT NOT NULL,
+            run_at      INTEGER NOT NULL,
+            payload     TEXT,
+            ref         TEXT,
+            status      TEXT NOT NULL DEFAULT 'pending'
+                        CHECK (status IN ('pending','done','canceled','failed')),
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            last_error  TEXT,
+            created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON scheduled_jobs(status, run_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ref ON scheduled_jobs(ref) WHERE ref IS NOT NULL;")
+
+
+@migration(10, "faq reply links")
+def _m010_faq_links(conn: sqlite3.Connection) -> None:
+    # Guruhdagi savol xabari -> foydalanuvchi; expires_at — UTC epoch (TTL bo‘yicha tozalanadi)
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS faq_links (
+            chat_id     INTEGER NOT NULL,
+            message_id  INTEGER NOT NULL,
+            user_id     INTEGER NOT NULL,
+            first_name  TEXT,
+            lang        TEXT,
+            expires_at  INTEGER NOT NULL,
+            PRIMARY KEY (chat_id, message_id)
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_faq_links_expires ON faq_links(expires_at);")
+
+
+@migration(11, "fsm states")
+def _m011_fsm_states(conn: sqlite3.Connection) -> None:
+    # aiogram FSM holatlari (storage/fsm.py); expires_at — UTC epoch
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fsm_states (
+            key         TEXT PRIMARY KEY,
+            state       TEXT,
+            data        TEXT,
+            expires_at  INTEGER NOT NULL
+        ) WITHOUT ROWID;
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fsm_states_expires ON fsm_states(expires_at);")
+
+
+@migration(12, "broadcast jobs")
+def _m012_broadcast_jobs(conn: sqlite3.Connection) -> None:
+    # Tarqatma ishlari (app/broadcast.py); vaqtlar — UTC epoch.
+    # last_user_id — checkpoint: shu user_id gacha (keyset tartibida) hammasi ishlangan.
+    # lease_until — ishni bajarayotgan jarayonning ijarasi (owner); tugasa boshqasi oladi.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_jobs (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            admin_id      INTEGER NOT NULL,
+            chat_id       INTEGER NOT NULL,
+            payload       TEXT NOT NULL,
+            status        TEXT NOT NULL DEFAULT 'running'
+                          CHECK (status IN ('running','paused','done','canceled')),
+            total         INTEGER NOT NULL DEFAULT 0,
+            last_user_id  INTEGER NOT NULL DEFAULT 0,
+            ok            INTEGER NOT NULL DEFAULT 0,
+            blocked       INTEGER NOT NULL DEFAULT 0,
+            failed        INTEGER NOT NULL DEFAULT 0,
+            owner         TEXT,
+            lease_until   INTEGER NOT NULL DEFAULT 0,
+            created_at    INTEGER NOT NULL,
+            finished_at   INTEGER
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_broadcast_jobs_status ON broadcast_jobs(status, lease_until);")
+    # Har bir qabul qiluvchi uchun ixcham yozuv: status 1=ok 2=blocked 3=failed, code — Telegram xato kodi
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS broadcast_log (
+            job_id   INTEGER NOT NULL,
+            user_id  INTEGER NOT NULL,
+            status   INTEGER NOT NULL,
+            code     INTEGER,
+            PRIMARY KEY (job_id, user_id)
+        ) WITHOUT ROWID;
+        """
+    )
+
+
+@migration(13, "users deliverability")
+def _m013_users_deliverability(conn: sqlite3.Connection) -> None:
+    # blocked_at — UTC epoch: bot bloklangan / chat topilmadi (tarqatma natijasi yoki my_chat_member)
+    if not _column_exists(conn, "users", "blocked_at"):
+        conn.execute("ALTER TABLE users ADD COLUMN blocked_at INTEGER;")
+    if not _column_exists(conn, "users", "last_error"):
+        conn.execute("ALTER TABLE users ADD COLUMN last_error TEXT;")
+    # Tarqatma auditoriyasi (audience_chunk) — faqat yetib boradiganlar. blocked_at ustuni
+    # ham indeksda: aks holda SQLite shartni tekshirish uchun har qatorda jadvalga qaytadi
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_reachable ON users(user_id, blocked_at) WHERE blocked_at IS NULL;"
+    )
+    # Qayta tekshirish (reprobe) uchun: eng eski bloklanganlar
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_blocked ON users(blocked_at) WHERE blocked_at IS NOT NULL;")
+
+
+@migration(14, "users segment indexes")
+def _m014_users_segments(conn: sqlite3.Connection) -> None:
+    # Segmentli tarqatma (storage/segments.py): tenglik filtri + user_id tartibi — keyset
+    # bo‘laklar va COUNT(*) indeksning o‘zidan, saralashsiz (blocked_at — qoplash uchun)
+    for name, col in (("lang", "lang"), ("onboarded", "onboarded"), ("feature", "last_feature")):
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_users_seg_{name} "
+            f"ON users({col}, user_id, blocked_at) WHERE blocked_at IS NULL;"
+        )
+    # Faollik oynasi: ifoda db._ACTIVITY_EXPR bilan aynan bir xil bo‘lishi shart
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_users_seg_active "
+        "ON users(COALESCE(last_seen, created_at, ''), user_id, blocked_at) WHERE blocked_at IS NULL;"
+    )
+
+
+@migration(15, "scheduled jobs lease")
+def _m015_scheduled_jobs_lease(conn: sqlite3.Connection) -> None:
+    # 'running' holati (run_at — ijara tugash vaqti). SQLite CHECK ni o‘zgartira olmaydi —
+    # jadval qayta quriladi (id lar saqlanadi, AUTOINCREMENT ketma-ketligi ham)
+    conn.execute(
+        """
+        CREATE TABLE scheduled_jobs_new (
+            id          INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind        TEXT NOT NULL,
+            run_at      INTEGER NOT NULL,
+            payload     TEXT,
+            ref         TEXT,
+            status      TEXT NOT NULL DEFAULT 'pending'
+                        CHECK (status IN ('pending','running','done','canceled','failed')),
+            attempts    INTEGER NOT NULL DEFAULT 0,
+            last_error  TEXT,
+            created_at  DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO scheduled_jobs_new (id, kind, run_at, payload, ref, status, attempts, last_error, created_at)
+        SELECT id, kind, run_at, payload, ref, status, attempts, last_error, created_at FROM scheduled_jobs;
+        """
+    )
+    # O‘chirilgan eng katta id lar qayta berilmasin
+    conn.execute(
+        """
+        UPDATE sqlite_sequence
+        SET seq = (SELECT MAX(seq) FROM sqlite_sequence WHERE name IN ('scheduled_jobs', 'scheduled_jobs_new'))
+        WHERE name = 'scheduled_jobs_new';
+        """
+    )
+    conn.execute(
+        """
+        INSERT INTO sqlite_sequence (name, seq)
+        SELECT 'scheduled_jobs_new', seq FROM sqlite_sequence
+        WHERE name = 'scheduled_jobs'
+          AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = 'scheduled_jobs_new');
+        """
+    )
+    conn.execute("DROP TABLE scheduled_jobs;")
+    conn.execute("ALTER TABLE scheduled_jobs_new RENAME TO scheduled_jobs;")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_run_at ON scheduled_jobs(status, run_at);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ref ON scheduled_jobs(ref) WHERE ref IS NOT NULL;")
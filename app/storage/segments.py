@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# app/storage/segments.py
+"""
+Tarqatma segmenti: users jadvali ustidagi filtrlar (migratsiya 014 / PG 010).
+
+    seg = Segment(lang="ru", active_days=7, booked=True)
+    where, params = seg.where(activity_expr="COALESCE(last_seen, created_at, '')", since=...)
+    # -> " AND lang = ? AND COALESCE(...) >= ? AND user_id IN (SELECT ... FROM bookings ...)"
+
+Har bir filtr bitta WHERE shartiga aylanadi — segment bitta SQL so‘rov:
+  - lang / onboarded / last_feature — (ustun, user_id) qisman indekslari:
+    tenglik + user_id tartibi, keyset bo‘laklar saralashsiz o‘qiladi;
+  - active_days — faollik ifodasi bo‘yicha qisman indeks (diapazon);
+  - booked — user_id IN (tasdiqlangan bronlar), idx_bookings_user_status.
+Modul db.py / postgres.py ga bog‘liq emas (ikkalasi ham shu yerdan import qiladi).
+Ish payload ida lug‘at sifatida saqlanadi (to_dict / from_dict).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Mapping, Optional, Tuple
+
+BOOKING_APPROVED = "approved"  # bookings.STATUS_APPROVED (bookings.py db.py ni import qiladi)
+
+
+@dataclass(frozen=True)
+class Segment:
+    lang: Optional[str] = None
+    onboarded: Optional[bool] = None
+    active_days: Optional[int] = None   # oxirgi N kun ichida faol (last_seen, bo‘lmasa created_at)
+    feature: Optional[str] = None       # users.last_feature
+    booked: bool = False                # tasdiqlangan broni bor
+
+    def __bool__(self) -> bool:
+        return bool(self.to_dict())
+
+    @classmethod
+    def from_dict(cls, d: Optional[Mapping[str, Any]]) -> "Segment":
+        d = d or {}
+        onboarded = d.get("onboarded")
+        days = d.get("active_days")
+        return cls(
+            lang=d.get("lang") or None,
+            onboarded=None if onboarded is None else bool(onboarded),
+            active_days=int(days) if days else None,
+            feature=d.get("feature") or None,
+            booked=bool(d.get("booked")),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Faqat berilgan filtrlar (payload / FSM uchun)."""
+        d = {k: v for k, v in asdict(self).items() if v is not None}
+        if not self.booked:
+            d.pop("booked")
+        return d
+
+    @property
+    def key(self) -> str:
+        """Kesh kaliti: bir xil segment — bir xil satr."""
+        return json.dumps(self.to_dict(), sort_keys=True, separators=(",", ":"))
+
+    def cutoff(self) -> Optional[dt.datetime]:
+        """active_days chegarasi (naive UTC — vaqt ustunlari ham UTC)."""
+        if not self.active_days:
+            return None
+        now = dt.datetime.now(dt.timezone.utc).replace(tzinfo=None, microsecond=0)
+        return now - dt.timedelta(days=int(self.active_days))
+
+    def where(
+        self, *, activity_expr: str, since: Callable[[dt.datetime], Any],
+    ) -> Tuple[str, List[Any]]:
+        """
+        " AND ..." qismi va parametrlari (`?` — PostgreSQL da _pg_sql almashtiradi).
+        `since` — chegara vaqtini backend formatiga o‘giradi (SQLite: satr, PG: datetime).
+        """
+        sql: List[str] = []
+        params: List[Any] = []
+        if self.lang:
+            sql.append("lang = ?")
+            params.append(self.lang)
+        if self.onboarded is not None:
+            sql.append("onboarded = ?")
+            params.append(1 if self.onboarded else 0)
+        if self.feature:
+            sql.append("last_feature = ?")
+            params.append(self.feature)
+        cutoff = self.cutoff()
+        if cutoff is not None:
+            sql.append(f"{activity_expr} >= ?")
+            params.append(since(cutoff))
+        if self.booked:
+            # IN (..) — so‘rovni bronlar (odatda foydalanuvchilardan ancha kam) boshqaradi:
+            # idx_bookings_user_status bo‘yicha o‘qib, users ga user_id bilan kiradi
+            sql.append("user_id IN (SELECT b.user_id FROM bookings AS b WHERE b.status = ?)")
+            params.append(BOOKING_APPROVED)
+        return "".join(f" AND {s}" for s in sql), params
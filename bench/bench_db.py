@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+# bench/bench_db.py
+"""
+SQLite qatlami uchun oddiy benchmark (pytest emas, qo‘lda ishga tushiriladi):
+
+    python -m bench.bench_db            # barcha ssenariylar
+    python -m bench.bench_db reads      # faqat bittasi
+
+Har bir ssenariy vaqtinchalik faylda ishlaydi va natijani stdout ga chiqaradi.
+`reserve` ssenariysi BENCH_PG_URL=postgresql://... berilsa PostgreSQL da ham
+ishlaydi (jadval ma’lumotlari o‘chiriladi — alohida test bazasidan foydalaning).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict
+
+from app.storage.bookings import BookingRepository, SlotTaken
+from app.storage.db import DB, AsyncDB, PROFILES, SqliteProfile, encode_cursor
+
+
+def _fresh_db(tmp: str, profile: SqliteProfile, name: str) -> DB:
+    d = DB(os.path.join(tmp, f"{name}.sqlite3"), profile=profile)
+    d.init()
+    return d
+
+
+def _seed(d: DB, users: int = 5_000, materials: int = 500) -> None:
+    for uid in range(1, users + 1):
+        d.upsert_user(uid, username=f"user{uid}", name=f"User {uid}", lang=random.choice(["uz", "ru", "en"]))
+    for i in range(materials):
+        d.add_material(
+            category=random.choice(["book", "article", "video", "audio"]),
+            lang=random.choice(["uz", "ru", "en"]),
+            title=f"Material {i}", description=None, is_paid=False, price_cents=0,
+            source_type="text", source_ref="x",
+        )
+
+
+# ---------------- Scenarios ----------------
+def _pct(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * q))]
+
+
+def bench_reads(seconds: float = 3.0, reader_threads: int = 4, writes_per_sec: int = 200) -> None:
+    """
+    Yozuvchi doimiy oqimda upsert_user qilayotganda o‘qishlar/sek va kechikish
+    (legacy: bitta umumiy ulanish vs wal: yozuvchi + read-only havza).
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ("legacy", "wal"):
+            profile = PROFILES[name]
+            if name == "wal":
+                profile = SqliteProfile(readers=reader_threads)
+            d = _fresh_db(tmp, profile, name)
+            _seed(d)
+
+            stop = threading.Event()
+            reads = [0] * reader_threads
+            lat: list[list[float]] = [[] for _ in range(reader_threads)]
+            writes = [0]
+
+            def writer() -> None:
+                pause = 1.0 / writes_per_sec
+                while not stop.is_set():
+                    d.upsert_user(random.randint(1, 5_000), name="w")
+                    writes[0] += 1
+                    time.sleep(pause)
+
+            def reader(i: int) -> None:
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    d.get_all_users(0, 9)
+                    d.list_materials(category="book", lang="uz", limit=7)
+                    d.get_user(random.randint(1, 5_000))
+                    lat[i].append((time.perf_counter() - t0) * 1000)
+                    reads[i] += 3
+
+            threads = [threading.Thread(target=writer)]
+            threads += [threading.Thread(target=reader, args=(i,)) for i in range(reader_threads)]
+            for t in threads:
+                t.start()
+            time.sleep(seconds)
+            stop.set()
+            for t in threads:
+                t.join()
+            d.close()
+
+            all_lat = [x for xs in lat for x in xs]
+            print(
+                f"[reads] {name:<7} reads/sec={sum(reads) / seconds:>9.0f}  "
+                f"writes/sec={writes[0] / seconds:>6.0f}  "
+                f"p50={_pct(all_lat, 0.50):6.2f}ms  p99={_pct(all_lat, 0.99):6.2f}ms"
+            )
+
+
+def bench_upserts(rows: int = 20_000) -> None:
+    """CRM importi: har biri alohida upsert_user vs bulk_upsert_users (bitta tranzaksiya)."""
+    profiles = [
+        {"user_id": uid, "username": f"crm{uid}", "name": f"CRM {uid}", "phone": f"+99890{uid:07d}", "lang": "uz"}
+        for uid in range(1, rows + 1)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        d = _fresh_db(tmp, PROFILES["wal"], "loop")
+        t0 = time.perf_counter()
+        for p in profiles:
+            d.upsert_user(p["user_id"], touch_seen=False, **{k: v for k, v in p.items() if k != "user_id"})
+        loop_s = time.perf_counter() - t0
+        d.close()
+
+        d = _fresh_db(tmp, PROFILES["wal"], "bulk")
+        t0 = time.perf_counter()
+        d.bulk_upsert_users(profiles)
+        bulk_s = time.perf_counter() - t0
+        d.close()
+
+    print(f"[upserts] loop  rows={rows}  {loop_s:7.2f}s  ({rows / loop_s:>9.0f} rows/sec)")
+    print(f"[upserts] bulk  rows={rows}  {bulk_s:7.2f}s  ({rows / bulk_s:>9.0f} rows/sec)")
+
+
+def bench_paging(users: int = 200_000, page_size: int = 9) -> None:
+    """Admin ro‘yxati: chuqur sahifa LIMIT/OFFSET vs keyset (iter_users)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        d = _fresh_db(tmp, PROFILES["wal"], "paging")
+        d.bulk_upsert_users({"user_id": uid, "name": f"U{uid}"} for uid in range(1, users + 1))
+        d.exec("ANALYZE;")
+        for depth in (0, users // 10, users // 2, users - page_size):
+            t0 = time.perf_counter()
+            rows = d.get_all_users(depth, page_size)
+            off_ms = (time.perf_counter() - t0) * 1000
+            # keyset: oldingi sahifaning oxirgi elementidan davom etamiz
+            prev = d.get_all_users(max(0, depth - 1), 1) if depth else []
+            cursor = encode_cursor(prev[0]["last_seen"] or prev[0]["created_at"], prev[0]["user_id"]) if prev else None
+            t0 = time.perf_counter()
+            d.iter_users(after=cursor, limit=page_size)
+            key_ms = (time.perf_counter() - t0) * 1000
+            print(f"[paging] depth={depth:>7}  offset={off_ms:8.2f}ms  keyset={key_ms:6.2f}ms  ({len(rows)} rows)")
+        d.close()
+
+
+def bench_audience(users: int = 200_000) -> None:
+    """Tarqatma auditoriyasi: get_all_users(0, 10_000) ro‘yxati vs iter_audience oqimi (vaqt, xotira)."""
+    import tracemalloc
+
+    from app.broadcast import iter_audience
+
+    async def stream(adb) -> int:
+        return sum([1 async for _ in iter_audience(adb)])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        d = _fresh_db(tmp, PROFILES["wal"], "audience")
+        d.bulk_upsert_users({"user_id": uid, "name": f"U{uid}", "lang": "uz"} for uid in range(1, users + 1))
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        rows = d.get_all_users(0, 10_000)
+        list_ms = (time.perf_counter() - t0) * 1000
+        list_kb = tracemalloc.get_traced_memory()[1] // 1024
+        del rows
+        tracemalloc.reset_peak()
+        adb = AsyncDB(d)
+        t0 = time.perf_counter()
+        n = asyncio.run(stream(adb))
+        stream_ms = (time.perf_counter() - t0) * 1000
+        stream_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+        print(
+            f"[audience] list(10k of {users})={list_ms:7.1f}ms peak={list_kb}KB  "
+            f"stream({n})={stream_ms:7.1f}ms peak={stream_kb}KB"
+        )
+        adb.close()
+
+
+async def _reserve_storm(repo: BookingRepository, confirms: int, slots: int) -> tuple[int, int, float]:
+    """`confirms` ta bir vaqtdagi tasdiqlash `slots` ta slot uchun; (yutgan, SlotTaken, s)."""
+    async def confirm(i: int) -> bool:
+        slot = i % slots
+        try:
+            await repo.reserve(user_id=10_000 + i, year=2030, month=1, day=1 + slot // 12,
+                               time=f"{8 + slot % 12:02d}:00")
+            return True
+        except SlotTaken:
+            return False
+
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(confirm(i) for i in range(confirms)))
+    return sum(results), results.count(False), time.perf_counter() - t0
+
+
+def bench_reserve(confirms: int = 500, slots: int = 24) -> None:
+    """
+    Stress: yuzlab bir vaqtdagi aud_confirm — har bir slotni aniq bitta bron olishi shart.
+    Yutqazganlar SlotTaken oladi; natija baza bilan solishtiriladi.
+    """
+    async def run(name: str, adb, cleanup) -> None:
+        await adb.init()
+        await cleanup(adb)
+        repo = BookingRepository(adb)
+        won, lost, secs = await _reserve_storm(repo, confirms, slots)
+        rows = await adb.query_all(
+            "SELECT day, time, COUNT(*) AS n FROM bookings WHERE year = 2030 AND status = 'pending' "
+            "GROUP BY day, time"
+        )
+        dup = [r for r in rows if r["n"] != 1]
+        masks = [await repo.day_mask(2030, 1, d) for d in range(1, 1 + slots // 12)]
+        mask_ok = all(m == (1 << 12) - 1 for m in masks)
+        ok = won == slots and lost == confirms - slots and len(rows) == slots and not dup and mask_ok
+        print(
+            f"[reserve] {name:<8} confirms={confirms} slots={slots}  won={won} slot_taken={lost}  "
+            f"{secs * 1000:7.1f}ms  {'OK' if ok else 'FAIL: double booking / lost reservation'}"
+        )
+        await adb.aclose()
+        if not ok:
+            raise SystemExit(1)
+
+    async def noop(_adb) -> None:
+        return None
+
+    async def pg_cleanup(pg) -> None:
+        await pg.exec("DELETE FROM bookings WHERE year = 2030")
+        await pg.exec("DELETE FROM booking_slots WHERE year = 2030")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(run("sqlite", AsyncDB(_fresh_db(tmp, PROFILES["wal"], "reserve")), noop))
+
+    pg_url = os.environ.get("BENCH_PG_URL")
+    if pg_url:
+        from app.storage.postgres import PostgresDB
+        asyncio.run(run("postgres", PostgresDB(pg_url, max_size=20), pg_cleanup))
+
+
+def bench_broadcast(users: int = 3_000, limit: int = 300, rate: float = 250.0) -> None:
+    """
+    Soxta Telegram: soniyasiga `limit` tadan ko‘p so‘rovga 429 (retry_after=1),
+    50–150ms kechikish, ~2% bloklagan, ~1% vaqtinchalik tarmoq xatosi.
+    Tezlik real limitdan 10 baravar katta — ssenariy bir necha soniyada tugaydi.
+    """
+    from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+    from aiogram.methods import SendMessage
+
+    from app.broadcast import Broadcaster, TokenBucket
+
+    method = SendMessage(chat_id=0, text="x")
+    blocked = set(random.sample(range(1, users + 1), users // 50))
+    window: list[float] = []
+    calls = {"n": 0, "429": 0}
+
+    async def send(uid: int) -> None:
+        calls["n"] += 1
+        now = time.monotonic()
+        while window and window[0] <= now - 1.0:
+            window.pop(0)
+        if len(window) >= limit:
+            calls["429"] += 1
+            raise TelegramRetryAfter(method, "Too Many Requests", 1)
+        window.append(now)
+        await asyncio.sleep(random.uniform(0.05, 0.15))
+        if uid in blocked:
+            raise TelegramForbiddenError(method, "bot was blocked by the user")
+        if random.random() < 0.01:
+            raise TelegramNetworkError(method, "connection reset")
+
+    async def run() -> None:
+        b = Broadcaster(bucket=TokenBucket(rate), workers=64, backoff=0.05)
+        st = await b.run(range(1, users + 1), send)
+        ok = st.total == users and st.blocked == len(blocked) and st.ok + st.failed == users - len(blocked)
+        print(
+            f"[broadcast] users={users} limit={limit}/s bucket={rate:.0f}/s  {st.elapsed:6.2f}s "
+            f"{st.rate:6.1f}/s  ok={st.ok} blocked={st.blocked} failed={st.failed} retried={st.retried} "
+            f"429={calls['429']}  {'OK' if ok else 'FAIL: lost recipients'}"
+        )
+        if not ok:
+            raise SystemExit(1)
+
+    asyncio.run(run())
+
+
+SCENARIOS: Dict[str, Callable[[], None]] = {
+    "reads": bench_reads,
+    "upserts": bench_upserts,
+    "paging": bench_paging,
+    "audience": bench_audience,
+    "reserve": bench_reserve,
+    "broadcast": bench_broadcast,
+}
+
+
+def main(argv: list[str]) -> None:
+    names = argv or list(SCENARIOS)
+    for n in names:
+        SCENARIOS[n]()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])